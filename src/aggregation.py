@@ -0,0 +1,304 @@
+import logging
+from collections import defaultdict
+from output import match_table_row
+from teammates import teammate_index, pair_key, MIN_GAMES_TOGETHER
+from rollups import rollup_index, rollup_fact
+
+logger = logging.getLogger(__name__)
+
+# Additive per-champion totals; win rate, KDA, CS/min and damage share are derived from them
+CHAMPION_TOTALS = ("games", "wins", "kills", "deaths", "assists", "cs", "damage", "team_damage", "seconds")
+PARTNER_TOTALS = ("total", "wins", "kills", "deaths", "assists")
+
+LANE_MAPPING = {
+    "TOP": "TOP",
+    "JUNGLE": "JUNGLE",
+    "MIDDLE": "MID",
+    "MID": "MID",
+    "BOTTOM": "ADC",
+    "UTILITY": "SUPPORT"
+}
+LANES = ("TOP", "JUNGLE", "MID", "ADC", "SUPPORT")
+
+# An aggregator is any object with add(record), which sees every record once, and
+# result(results), called after the pass in registration order with the results of the
+# aggregators registered before it.
+class AggregationEngine:
+    def __init__(self, aggregators=None, names=None):
+        self.aggregators = list(aggregators if aggregators is not None else default_aggregators(names))
+
+    def register(self, name, aggregator):
+        self.aggregators.append((name, aggregator))
+        return aggregator
+
+    def add(self, record):
+        for name, aggregator in self.aggregators:
+            try:
+                aggregator.add(record)
+            except Exception as e:
+                logger.exception(f"Exception in aggregator {name} for match {record.match_id}")
+
+    def add_all(self, records):
+        for record in records:
+            self.add(record)
+        return self
+
+    def results(self, results=None):
+        results = {} if results is None else results
+        for name, aggregator in self.aggregators:
+            try:
+                results[name] = aggregator.result(results)
+            except Exception as e:
+                logger.exception(f"Exception in aggregator {name}")
+                results[name] = None
+        return results
+
+class QueueDistribution:
+    def __init__(self):
+        self.game_modes = defaultdict(int)
+
+    def add(self, record):
+        self.game_modes[record.queue_id] += 1
+
+    def result(self, results):
+        return self.game_modes
+
+class SoloDuoClassifier:
+    # Duo detection looks teams up in the teammate co-occurrence index (teammates.py). The
+    # teams of every queue are collected during the pass and added to the index first, so
+    # the games of this pass count as well. Teammates the payload did not name are looked
+    # up in names (resolved before the pass); unknown ones are shown by PUUID.
+    def __init__(self, names=None, index=teammate_index, summarize=None):
+        self.names = names if names is not None else {}
+        self.index = index
+        self.summarize = summarize or summarize_classification
+        self.ranked_entries = {}
+        self.teams = []
+
+    def add(self, record):
+        if not record.tracked:
+            return
+        self.teams.append((record.match_id, (record.puuid,) + record.team_puuids, record.win, record.creation))
+        if record.is_ranked_solo:
+            self.ranked_entries[record.match_id] = {
+                "creation": record.creation,
+                "win": record.win,
+                "kills": record.kills,
+                "deaths": record.deaths,
+                "assists": record.assists,
+                "participant_id": record.participant_id,
+                "opponent_id": record.opponent_id,
+                "teammates": [name or self.names.get(teammate_puuid, teammate_puuid) for teammate_puuid, name in record.teammates()],
+                "puuid": record.puuid,
+                "teammate_puuids": list(record.team_puuids),
+            }
+
+    def result(self, results):
+        self.index.add_teams(self.teams)
+        classified = classify_ranked_entries(self.ranked_entries, self.index, self.summarize)
+        classified["party_stats"], classified["party_sizes"] = count_party_sizes(self.teams, self.index)
+        return classified
+
+class ChampionStats:
+    def __init__(self):
+        self.champion_stats = defaultdict(lambda: dict.fromkeys(CHAMPION_TOTALS, 0))
+
+    def add(self, record):
+        if not record.is_ranked_solo or not record.tracked:
+            return
+        stats = self.champion_stats[record.champion]
+        stats["games"] += 1
+        if record.win:
+            stats["wins"] += 1
+        stats["kills"] += record.kills
+        stats["deaths"] += record.deaths
+        stats["assists"] += record.assists
+        stats["cs"] += record.cs
+        stats["damage"] += record.damage
+        stats["team_damage"] += record.team_damage
+        stats["seconds"] += record.duration
+
+    def result(self, results):
+        return finalize_champion_stats(self.champion_stats)
+
+class LaneStats:
+    def __init__(self):
+        self.lane_stats = {lane: {"games": 0, "wins": 0} for lane in LANES}
+
+    def add(self, record):
+        if not record.is_ranked_solo or not record.tracked:
+            return
+        lane_raw = record.position.upper()
+        lane = LANE_MAPPING.get(lane_raw, lane_raw)
+        if lane in self.lane_stats:
+            self.lane_stats[lane]["games"] += 1
+            if record.win:
+                self.lane_stats[lane]["wins"] += 1
+
+    def result(self, results):
+        return finalize_lane_stats(self.lane_stats)
+
+class MatchTableRows:
+    def __init__(self, classification_key="solo_duo"):
+        self.classification_key = classification_key
+        self.rows = []
+
+    def add(self, record):
+        if record.is_ranked_solo:
+            self.rows.append((record.creation, match_table_row(record, "N/A")))
+
+    def result(self, results):
+        classification = (results.get(self.classification_key) or {}).get("match_classification", {})
+        rows = []
+        for creation, row in sorted(self.rows, key=lambda item: item[0], reverse=True):
+            row[3] = classification.get(row[0], "N/A")
+            rows.append(row)
+        return rows
+
+class Rollups:
+    # Feeds the daily/weekly rollups (rollups.py) and returns the weekly trend of the player.
+    # The party dimension comes from the classification, so this runs after solo_duo.
+    def __init__(self, classification_key="solo_duo", index=rollup_index):
+        self.classification_key = classification_key
+        self.index = index
+        self.records = []
+
+    def add(self, record):
+        if record.tracked:
+            self.records.append(record)
+
+    def result(self, results):
+        solo_duo = results.get(self.classification_key) or {}
+        classification = solo_duo.get("match_classification", {})
+        party_sizes = solo_duo.get("party_sizes", {})
+        facts = []
+        for record in self.records:
+            if record.is_ranked_solo:
+                party = "duo" if classification.get(record.match_id, "").startswith("DuoQ:") else "solo"
+            else:
+                party = party_label(party_sizes.get(record.match_id, 1))
+            lane = LANE_MAPPING.get(record.position.upper(), record.position.upper())
+            facts.append(rollup_fact(record, lane, party))
+        self.index.add(facts)
+        puuids = {record.puuid for record in self.records}
+        return self.index.trend(puuids.pop(), "week") if len(puuids) == 1 else []
+
+def party_label(size):
+    return "solo" if size == 1 else "duo" if size == 2 else "premade"
+
+def default_aggregators(names=None):
+    return [
+        ("game_modes", QueueDistribution()),
+        ("solo_duo", SoloDuoClassifier(names)),
+        ("champion_stats", ChampionStats()),
+        ("lane_stats", LaneStats()),
+        ("match_table_rows", MatchTableRows()),
+        ("weekly_trend", Rollups()),
+    ]
+
+def count_party_sizes(teams, index=teammate_index):
+    # Games and wins by the number of premade players on the tracked player's team (1 = solo),
+    # in every queue; flex and normal games are where 3-5 player premades show up
+    party_stats = {}
+    party_sizes = {}
+    for match_id, puuids, win, creation in teams:
+        party, games = index.party(puuids[0], puuids[1:])
+        party_sizes[match_id] = len(party) + 1
+        stats = party_stats.setdefault(len(party) + 1, {"games": 0, "wins": 0})
+        stats["games"] += 1
+        if win:
+            stats["wins"] += 1
+    return finalize_party_stats(party_stats), party_sizes
+
+def classify_ranked_entries(ranked_entries, index=teammate_index, summarize=None):
+    teammates_per_match = {match_id: entry["teammates"] for match_id, entry in ranked_entries.items()}
+    ranked_matches = list(ranked_entries)
+    try:
+        ranked_matches = sorted(ranked_matches, key=lambda mid: ranked_entries[mid]["creation"], reverse=True)
+    except Exception as e:
+        logger.exception("Exception sorting ranked_matches")
+
+    # Ranked Solo/Duo allows one partner at most: the teammate with the most games together
+    # with the player (over everything in the index), if they reach MIN_GAMES_TOGETHER
+    match_classification = {}
+    for match_id in ranked_matches:
+        entry = ranked_entries[match_id]
+        puuid = entry["puuid"]
+        games = index.games_together([puuid] + entry["teammate_puuids"])
+        candidates = [(games.get(pair_key(puuid, teammate_puuid), 0), name)
+                      for teammate_puuid, name in zip(entry["teammate_puuids"], teammates_per_match[match_id])]
+        candidates = [c for c in candidates if c[0] >= MIN_GAMES_TOGETHER]
+        if candidates:
+            candidate = max(candidates, key=lambda c: c[0])[1]
+            match_classification[match_id] = f"DuoQ: {candidate}"
+        else:
+            match_classification[match_id] = "SoloQ"
+
+    results = (summarize or summarize_classification)(ranked_entries, ranked_matches, match_classification)
+    results["ranked_entries"] = ranked_entries
+    results["match_classification"] = match_classification
+    return results
+
+def summarize_classification(ranked_entries, ranked_matches, match_classification):
+    # Solo/duo counts and per-partner totals of the classified ranked games; columnar.py
+    # computes the same with group-bys
+    match_outcomes = {match_id: entry["win"] for match_id, entry in ranked_entries.items()}
+    duo_matches = [m for m in ranked_matches if match_classification[m].startswith("DuoQ:")]
+    solo_matches = [m for m in ranked_matches if match_classification[m] == "SoloQ"]
+
+    duo_queue_count = len(duo_matches)
+    solo_queue_count = len(solo_matches)
+    solo_wins = sum(1 for m in solo_matches if match_outcomes.get(m, False))
+    duo_wins = sum(1 for m in duo_matches if match_outcomes.get(m, False))
+    duo_win_ratio = (duo_wins / duo_queue_count * 100) if duo_queue_count > 2 else None
+
+    duo_partner_stats = defaultdict(lambda: dict.fromkeys(PARTNER_TOTALS, 0))
+    for match_id in duo_matches:
+        candidate = match_classification[match_id].split(": ")[1]
+        entry = ranked_entries[match_id]
+        stats = duo_partner_stats[candidate]
+        stats["total"] += 1
+        if match_outcomes.get(match_id, False):
+            stats["wins"] += 1
+        for key in ("kills", "deaths", "assists"):
+            stats[key] += entry.get(key, 0)
+    for stats in duo_partner_stats.values():
+        stats["kda"] = kda(stats)
+    duo_partner_ratios = {partner: (stats["wins"] / stats["total"] * 100 if stats["total"] > 0 else 0)
+                          for partner, stats in duo_partner_stats.items()}
+
+    results = {
+        "solo_queue": solo_queue_count,
+        "solo_wins": solo_wins,
+        "solo_total": solo_queue_count,
+        "solo_win_ratio": (solo_wins / solo_queue_count * 100) if solo_queue_count > 0 else 0.0,
+        "duo_queue": duo_queue_count,
+        "duo_wins": duo_wins,
+        "duo_total": duo_queue_count,
+        "duo_win_ratio": duo_win_ratio,
+        "duo_partner_stats": dict(duo_partner_stats),
+        "duo_partner_ratios": duo_partner_ratios,
+        "total_ranked": len(ranked_matches),
+    }
+    return results
+
+def kda(stats):
+    return (stats["kills"] + stats["assists"]) / (stats["deaths"] if stats["deaths"] > 0 else 1)
+
+def finalize_champion_stats(champion_stats):
+    for champ, stats in champion_stats.items():
+        stats["win_rate"] = (stats["wins"] / stats["games"] * 100) if stats["games"] > 0 else 0.0
+        stats["kda"] = kda(stats)
+        stats["cs_per_min"] = stats["cs"] / (stats["seconds"] / 60) if stats.get("seconds") else 0.0
+        stats["damage_share"] = stats["damage"] / stats["team_damage"] * 100 if stats.get("team_damage") else 0.0
+    return champion_stats
+
+def finalize_party_stats(party_stats):
+    for size, stats in party_stats.items():
+        stats["win_rate"] = (stats["wins"] / stats["games"] * 100) if stats["games"] > 0 else 0.0
+    return party_stats
+
+def finalize_lane_stats(lane_stats):
+    for lane, stats in lane_stats.items():
+        stats["win_rate"] = (stats["wins"] / stats["games"] * 100) if stats["games"] > 0 else 0.0
+    return lane_stats
@@ -1,30 +1,101 @@
 import re
 import time
+import itertools
+import contextlib
+import threading
 import concurrent.futures
+from queue import PriorityQueue
 from collections import defaultdict
 from datetime import datetime
 import logging
 from tqdm import tqdm
-from riot_api import safe_get, get_duo_partner_full_name, get_summoner_full_name_by_puuid
+from records import extract_record, RANKED_SOLO_QUEUE
+from payloads import decode_match, slim_size
+from timelines import extract_frames, early_game_stats, TIMELINE_CHUNK_SIZE
+from teammates import teammate_index
+from rollups import rollup_index
+from cache import BoundedCache, inflight
+from telemetry import telemetry
+from aggregation import AggregationEngine, ChampionStats, LaneStats
+from riot_api import (safe_get, set_api_key, get_summoner_full_name_by_puuid,
+                      resolve_summoner_names, known_summoner_names, missing_summoner_names, MATCH_HISTORY_WORKERS,
+                      detail_workers, PIPELINE_QUEUE_PER_WORKER, PRIORITY_RANKED, PRIORITY_NAMES, PRIORITY_OTHER,
+                      PRIORITY_STOP, NAME_TTL, FAILED_NAME_TTL, api_url)
+from rate_limiter import rate_limiter
+from concurrency import concurrency
+from regions import resolve_routing, match_region, account_region
 
 logger = logging.getLogger(__name__)
 
-# Globale Cache-Dictionaries
-duo_partner_cache = {}
-summoner_cache = {}
+# Globale Caches (bounded, thread-safe; configured from [Cache] in main.py)
+duo_partner_cache = BoundedCache("duo_partner")
+summoner_cache = BoundedCache("summoner", ttl=NAME_TTL)
+failed_name_cache = BoundedCache("failed_name", ttl=FAILED_NAME_TTL)
+timeline_cache = BoundedCache("timeline")
+
+# "python" feeds every record through the aggregators; "columnar" computes the statistics
+# with pandas group-bys over one frame of the records (columnar.py), for long histories
+STATS_ENGINES = ("python", "columnar")
+stats_engine = "python"
+
+QUEUE_NAMES = {
+    400: "Normal Draft",
+    420: "Ranked Solo/Duo",
+    430: "Normal Blind",
+    440: "Ranked Flex",
+    450: "ARAM",
+    700: "Clash",
+    830: "Co-op vs AI (Intro)",
+    840: "Co-op vs AI (Beginner)",
+    850: "Co-op vs AI (Intermediate)",
+    900: "URF",
+    1020: "One for All",
+    1300: "Nexus Blitz",
+    1400: "Ultimate Spellbook",
+    1900: "URF",
+}
+
+def match_id_params(count, start, start_time=None, queue=None):
+    params = {"count": count, "start": start}
+    if start_time is not None:
+        params["startTime"] = start_time
+    if queue is not None:
+        params["queue"] = queue
+        if queue == RANKED_SOLO_QUEUE:
+            params["type"] = "ranked"
+    return params
 
 class RiotAnalyzer:
-    def __init__(self, api_key, network_timeout=10, max_retries=5):
+    def __init__(self, api_key, network_timeout=10, max_retries=5, match_store=None, name_ttl=NAME_TTL,
+                 region="europe", platform=None, journal=None):
         self.api_key = api_key
+        # Regional cluster (account-v1, match-v5) and platform of the analysed players; match
+        # details are always fetched from the cluster named by the match ID prefix
+        self.region, self.platform = resolve_routing(region, platform)
         self.headers = {"X-Riot-Token": api_key}
-        self.match_cache = {}
+        set_api_key(api_key)
+        self.match_cache = BoundedCache("match")
+        telemetry.watch_cache(self.match_cache)
+        self.match_store = match_store
+        # The teammate index and the rollups are kept in the match store when there is one
+        teammate_index.attach(match_store)
+        rollup_index.attach(match_store)
+        self.name_ttl = name_ttl
         self.network_timeout = network_timeout
         self.max_retries = max_retries
+        # FetchJournal of the current run (journal.py), set once the players are known
+        self.journal = journal
+
+    def get_account_by_riot_id(self, name, tag, region=None):
+        region = account_region(region or self.region)
+        return inflight.do(("account", region, name.lower(), tag.lower()), self._get_account_by_riot_id, name, tag, region)
 
-    def get_account_by_riot_id(self, name, tag, region="europe"):
+    def _get_account_by_riot_id(self, name, tag, region):
         try:
-            url = f"https://{region}.api.riotgames.com/riot/account/v1/accounts/by-riot-id/{name}/{tag}"
+            url = api_url(region, f"/riot/account/v1/accounts/by-riot-id/{name}/{tag}")
             response = safe_get(url, headers=self.headers, max_retries=self.max_retries, timeout=self.network_timeout)
+            if response is None:
+                return None
             if response.status_code == 200:
                 return response.json()
             else:
@@ -35,35 +106,67 @@ class RiotAnalyzer:
             logger.exception("Exception in get_account_by_riot_id")
             return None
 
-    def get_match_history(self, puuid, count, region="europe"):
+    def get_match_history(self, puuid, count, region=None, start_time=None, queue=None):
         matches = []
-        num_requests = (count + 99) // 100
-        start_indices = [i * 100 for i in range(num_requests)]
         try:
-            with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                future_to_batch = {
-                    executor.submit(self._get_match_batch, puuid, min(100, count - start), start, region): start 
-                    for start in start_indices
-                }
-                for future in concurrent.futures.as_completed(future_to_batch):
-                    batch = future.result()
-                    if batch:
-                        matches.extend(batch)
-                    if len(matches) >= count:
-                        matches = matches[:count]
-                        break
-            return matches
+            for batch in self._iter_match_pages(puuid, count, region or self.region, start_time, queue):
+                matches.extend(batch)
         except Exception as e:
             logger.exception("Exception in get_match_history")
-            return matches
+        return matches[:count]
+
+    def get_match_histories(self, players, count, queue=None):
+        # Lists the histories of several (puuid, region) players; each region gets its own
+        # workers, so the listing of one region does not wait for another
+        matches_by_puuid = {}
+        by_region = defaultdict(list)
+        for puuid, region in players:
+            by_region[region or self.region].append(puuid)
+        with contextlib.ExitStack() as stack:
+            future_to_puuid = {}
+            for region, puuids in by_region.items():
+                executor = stack.enter_context(concurrent.futures.ThreadPoolExecutor(max_workers=MATCH_HISTORY_WORKERS))
+                for puuid in puuids:
+                    future_to_puuid[executor.submit(self.get_match_history, puuid, count, region, None, queue)] = puuid
+            for future, puuid in future_to_puuid.items():
+                matches_by_puuid[puuid] = future.result()
+        return matches_by_puuid
+
+    def _iter_match_pages(self, puuid, count, region, start_time=None, queue=None):
+        # Yields the ID pages in order, newest matches first, even though they are requested concurrently
+        if start_time is not None:
+            # Only a few matches are newer than start_time, so page sequentially and stop at the first short page
+            for start in range(0, count, 100):
+                batch = self._get_match_batch(puuid, min(100, count - start), start, region, start_time, queue)
+                yield batch
+                if len(batch) < min(100, count - start):
+                    return
+            return
+        with concurrent.futures.ThreadPoolExecutor(max_workers=MATCH_HISTORY_WORKERS) as executor:
+            futures = [executor.submit(self._get_match_batch, puuid, min(100, count - start), start, region, None, queue)
+                       for start in range(0, count, 100)]
+            for future in futures:
+                yield future.result()
 
-    def _get_match_batch(self, puuid, count, start, region):
+    def _get_match_batch(self, puuid, count, start, region, start_time=None, queue=None):
+        url = api_url(region, f"/lol/match/v5/matches/by-puuid/{puuid}/ids")
+        params = match_id_params(count, start, start_time, queue)
+        return inflight.do(("ids", url, tuple(sorted(params.items()))), self._fetch_match_batch, puuid, url, params)
+
+    def _fetch_match_batch(self, puuid, url, params):
         try:
-            url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/by-puuid/{puuid}/ids"
-            params = {"count": count, "start": start}
+            if self.journal is not None:
+                journaled = self.journal.page(puuid, params)
+                if journaled is not None:
+                    return journaled
             response = safe_get(url, headers=self.headers, params=params, timeout=self.network_timeout)
+            if response is None:
+                return []
             if response.status_code == 200:
-                return response.json()
+                batch = response.json()
+                if self.journal is not None:
+                    self.journal.add_page(puuid, params, batch)
+                return batch
             else:
                 logger.error(f"Error retrieving match batch: {response.status_code}")
                 return []
@@ -71,11 +174,227 @@ class RiotAnalyzer:
             logger.exception("Exception in _get_match_batch")
             return []
 
+    def count_matches_by_queue(self, puuid, start_time, queues=None, region=None):
+        # Game mode distribution from ID pages alone (one request per queue and 100 games)
+        # instead of downloading every non-ranked match body
+        queues = list(queues or QUEUE_NAMES)
+        region = region or self.region
+        counts = {}
+
+        def count_queue(queue_id):
+            total = 0
+            while True:
+                batch = self._get_match_batch(puuid, 100, total, region, start_time, queue_id)
+                total += len(batch)
+                if len(batch) < 100:
+                    return total
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=MATCH_HISTORY_WORKERS) as executor:
+                for queue_id, total in zip(queues, executor.map(count_queue, queues)):
+                    if total:
+                        counts[queue_id] = total
+        except Exception as e:
+            logger.exception("Exception in count_matches_by_queue")
+        return counts
+
     def process_matches(self, matches, puuid):
-        match_data_dict = {}
+        with telemetry.stage("match_details"):
+            match_records = self.fetch_match_records(matches, puuid)
+        return self.summarize_records(match_records)
+
+    def process_history(self, puuid, count, region=None, queue=None):
+        # get_match_history + process_matches as one pipeline; returns (match IDs, results)
+        with telemetry.stage("match_pipeline"):
+            matches, match_records, names = self.fetch_history_records(puuid, count, region or self.region, queue)
+        results = self.summarize_records(match_records, names)
+        mark_partial(results, matches)
+        return matches, results
+
+    def summarize_records(self, match_records, names=None):
+        with telemetry.stage("names"):
+            names = self.resolve_teammate_names(match_records, names)
+        with telemetry.stage("analysis"):
+            return summarize_matches(match_records, names=names)
+
+    def resolve_teammate_names(self, match_records, names=None):
+        # The classification needs names only for ranked teammates the payload did not name;
+        # names holds those already resolved (by the pipeline)
+        names = dict(names or {})
+        names.update(resolve_summoner_names(unnamed_teammates(match_records) - names.keys(), name_store=self.match_store,
+                                            ttl=self.name_ttl, region=self.region))
+        return names
+
+    def fetch_history_records(self, puuid, count, region=None, queue=None):
+        # Each ID page is handed to the detail workers as soon as it arrives, so match
+        # downloads start while later pages are still being listed. The bounded queue keeps
+        # the ID producer at most PIPELINE_QUEUE_PER_WORKER matches per worker ahead.
+        # Without a queue filter the ranked IDs are listed as well (one extra request per
+        # 100 games) and queued first, page by page; the other IDs follow at a lower priority.
+        # Workers take the most useful queued item (PRIORITY_* in riot_api.py): ranked details
+        # newest first, then the teammate names they need, then all other details. A worker
+        # only picks an item once it holds a concurrency slot, so no item waits in a worker
+        # that is waiting for the rate limiter.
+        workers_count = detail_workers()
+        pending = PriorityQueue(maxsize=PIPELINE_QUEUE_PER_WORKER * workers_count)
+        available = threading.Semaphore(0)
+        region = region or self.region
+        slot_url = api_url(region, "/lol/match/v5/matches")
+        matches = []
+        listed = set()
+        records = []
+        ranked_records = []
+        resolved_names = {}
+        known_names = {}
+        state = {"listed": False, "ranked_open": 0, "finished": False}
+        lock = threading.Lock()
+        order = itertools.count()
+        progress = tqdm(total=count, desc="Processing Matches", unit="Match")
+
+        def put(item):
+            pending.put(item)
+            available.release()
+
+        def finish_if_done():
+            # Once every ID is listed and every ranked detail is in, queue the missing
+            # teammate names and then the stop markers behind everything else
+            with lock:
+                if state["finished"] or not state["listed"] or state["ranked_open"]:
+                    return
+                state["finished"] = True
+                teammates = unnamed_teammates([r for r in ranked_records if r.match_id in listed])
+                known = known_summoner_names(teammates, self.match_store, self.name_ttl)
+                known_names.update(known)
+                missing = missing_summoner_names(teammates, known=known)
+            for teammate_puuid in missing:
+                put((PRIORITY_NAMES, next(order), teammate_puuid))
+            for _ in range(workers_count):
+                put((PRIORITY_STOP, next(order), None))
+
+        def queue_ranked(match_id):
+            with lock:
+                state["ranked_open"] += 1
+            put((PRIORITY_RANKED, next(order), match_id))
+
+        def produce():
+            try:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=MATCH_HISTORY_WORKERS) as executor:
+                    starts = range(0, count, 100)
+                    ranked_pages = [] if queue is not None else [
+                        executor.submit(self._get_match_batch, puuid, min(100, count - start), start, region, None,
+                                        RANKED_SOLO_QUEUE)
+                        for start in starts]
+                    pages = [executor.submit(self._get_match_batch, puuid, min(100, count - start), start, region, None, queue)
+                             for start in starts]
+                    # The last `count` ranked games can reach further back than the last `count`
+                    # games; the ones outside the history are dropped once it is listed
+                    ranked = set()
+                    for future in ranked_pages:
+                        for match_id in future.result():
+                            ranked.add(match_id)
+                            queue_ranked(match_id)
+                    for future in pages:
+                        for match_id in future.result()[:count - len(matches)]:
+                            matches.append(match_id)
+                            listed.add(match_id)
+                            if queue == RANKED_SOLO_QUEUE:
+                                queue_ranked(match_id)
+                            elif match_id not in ranked:
+                                put((PRIORITY_OTHER, next(order), match_id))
+            except Exception as e:
+                logger.exception("Exception while listing match IDs")
+            finally:
+                progress.total = len(matches)
+                progress.refresh()
+                with lock:
+                    state["listed"] = True
+                finish_if_done()
+
+        def consume():
+            while True:
+                available.acquire()
+                with concurrency.slot(slot_url):
+                    priority, position, item = pending.get_nowait()
+                    if priority == PRIORITY_STOP:
+                        return
+                    if priority == PRIORITY_NAMES:
+                        name = get_summoner_full_name_by_puuid(item, region)
+                        if name != item:
+                            with lock:
+                                resolved_names[item] = name
+                        continue
+                    record = None
+                    if not state["listed"] or item in listed:
+                        record = self.journaled_record(puuid, item)
+                        try:
+                            if record is None:
+                                match_data = self.get_match_details(item)
+                                if match_data and "info" in match_data:
+                                    record = extract_record(match_data, puuid, item)
+                                    self.journal_record(puuid, record)
+                        except Exception as e:
+                            logger.exception(f"Error processing match {item}")
+                with lock:
+                    if record is not None:
+                        records.append(record)
+                    if priority == PRIORITY_RANKED:
+                        state["ranked_open"] -= 1
+                        if record is not None:
+                            ranked_records.append(record)
+                if record is not None:
+                    progress.update(1)
+                if priority == PRIORITY_RANKED:
+                    finish_if_done()
+
         try:
-            with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-                future_to_match = {executor.submit(self.get_match_details, match_id): match_id for match_id in matches}
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers_count + 1) as executor:
+                workers = [executor.submit(produce)] + [executor.submit(consume) for _ in range(workers_count)]
+                while True:
+                    try:
+                        concurrent.futures.wait(workers)
+                        break
+                    except KeyboardInterrupt:
+                        # Ctrl+C stops sending requests; the report is built from what has arrived
+                        logger.warning("Interrupted, finishing with the matches fetched so far")
+                        rate_limiter.cancel()
+        finally:
+            progress.close()
+        if self.match_store is not None and resolved_names:
+            self.match_store.put_names(resolved_names)
+        records = [record for record in records if record.match_id in listed]
+        logger.info(f"Successfully retrieved {len(records)} of {len(matches)} match details.")
+        return matches, records, dict(known_names, **resolved_names)
+
+    def fetch_match_records(self, matches, puuid):
+        return self.fetch_shared_match_records({puuid: matches})[puuid]
+
+    def fetch_shared_match_records(self, matches_by_puuid):
+        # Every unique match is downloaded once, even if it appears in several players'
+        # histories; each payload is turned into one record per player and then dropped
+        owners = defaultdict(list)
+        for puuid, matches in matches_by_puuid.items():
+            for match_id in matches:
+                owners[match_id].append(puuid)
+        records_by_puuid = {puuid: [] for puuid in matches_by_puuid}
+        fetched = 0
+        by_region = defaultdict(list)
+        for match_id, puuids in owners.items():
+            journaled = [self.journaled_record(puuid, match_id) for puuid in puuids]
+            if all(record is not None for record in journaled):
+                fetched += 1
+                for puuid, record in zip(puuids, journaled):
+                    records_by_puuid[puuid].append(record)
+                continue
+            by_region[match_region(match_id, self.region)].append(match_id)
+        try:
+            # Each region gets its own workers, so a batch spanning several regions fetches
+            # from all of them at once, each within its own rate limits
+            with contextlib.ExitStack() as stack:
+                future_to_match = {}
+                for region, region_matches in by_region.items():
+                    executor = stack.enter_context(concurrent.futures.ThreadPoolExecutor(max_workers=detail_workers()))
+                    for match_id in region_matches:
+                        future_to_match[executor.submit(self.get_match_details, match_id, region)] = match_id
                 for future in tqdm(concurrent.futures.as_completed(future_to_match),
                                    total=len(future_to_match),
                                    desc="Processing Matches",
@@ -84,102 +403,50 @@ class RiotAnalyzer:
                     try:
                         match_data = future.result()
                         if match_data and "info" in match_data:
-                            match_data_dict[match_id] = match_data
+                            fetched += 1
+                            for puuid in owners[match_id]:
+                                record = extract_record(match_data, puuid, match_id)
+                                self.journal_record(puuid, record)
+                                records_by_puuid[puuid].append(record)
                     except Exception as e:
                         logger.exception(f"Error processing match {match_id}")
-            logger.info(f"Successfully retrieved {len(match_data_dict)} match details.")
+            logger.info(f"Successfully retrieved {fetched} of {len(owners)} unique match details.")
         except Exception as e:
             logger.exception("Exception in process_matches")
-        
-        game_modes = defaultdict(int)
-        ranked_matches = []
-        match_outcomes = {}
-        teammates_per_match = {}
+        return records_by_puuid
 
-        try:
-            for match_id, match_data in match_data_dict.items():
-                queue_id = match_data["info"].get("queueId", 0)
-                game_modes[queue_id] += 1
-                if queue_id == 420:
-                    participant_data = next((p for p in match_data["info"]["participants"] if p["puuid"] == puuid), None)
-                    if participant_data:
-                        win = participant_data.get("win", False)
-                        match_outcomes[match_id] = win
-                        ranked_matches.append(match_id)
-                        teammates = [
-                            p.get("summonerName") or get_summoner_full_name_by_puuid(p["puuid"])
-                            for p in match_data["info"]["participants"]
-                            if p["teamId"] == participant_data["teamId"] and p["puuid"] != puuid
-                        ]
-                        teammates_per_match[match_id] = teammates
-        except Exception as e:
-            logger.exception("Exception while processing matches")
+    def journaled_record(self, puuid, match_id):
+        return self.journal.record(puuid, match_id) if self.journal is not None else None
 
+    def journal_record(self, puuid, record):
+        if self.journal is not None:
+            self.journal.add_record(puuid, record)
+
+    def get_match_details(self, match_id, region=None):
+        # Analyses running side by side (service.py) wait for a download already in flight
+        return inflight.do(("match", match_id), self._get_match_details, match_id, region)
+
+    def _get_match_details(self, match_id, region=None):
+        cached = self.match_cache.get(match_id)
+        if cached is not None:
+            return cached
+        if self.match_store is not None:
+            stored = self.match_store.get(match_id, decode=decode_match)
+            if stored is not None:
+                return stored
         try:
-            ranked_matches = sorted(ranked_matches, key=lambda mid: match_data_dict[mid]["info"].get("gameCreation", 0), reverse=True)
-        except Exception as e:
-            logger.exception("Exception sorting ranked_matches")
-
-        overall_freq = defaultdict(int)
-        for match_id in ranked_matches:
-            for teammate in teammates_per_match.get(match_id, []):
-                overall_freq[teammate] += 1
-
-        match_classification = {}
-        for match_id in ranked_matches:
-            candidates = [t for t in teammates_per_match.get(match_id, []) if overall_freq[t] >= 2]
-            if candidates:
-                candidate = max(candidates, key=lambda t: overall_freq[t])
-                match_classification[match_id] = f"DuoQ: {candidate}"
-            else:
-                match_classification[match_id] = "SoloQ"
-
-        duo_matches = [m for m in ranked_matches if match_classification[m].startswith("DuoQ:")]
-        solo_matches = [m for m in ranked_matches if match_classification[m] == "SoloQ"]
-
-        duo_queue_count = len(duo_matches)
-        solo_queue_count = len(solo_matches)
-        solo_wins = sum(1 for m in solo_matches if match_outcomes.get(m, False))
-        duo_wins = sum(1 for m in duo_matches if match_outcomes.get(m, False))
-        duo_win_ratio = (duo_wins / duo_queue_count * 100) if duo_queue_count > 2 else None
-
-        duo_partner_stats = defaultdict(lambda: {"total": 0, "wins": 0})
-        for match_id in duo_matches:
-            candidate = match_classification[match_id].split(": ")[1]
-            duo_partner_stats[candidate]["total"] += 1
-            if match_outcomes.get(match_id, False):
-                duo_partner_stats[candidate]["wins"] += 1
-        duo_partner_ratios = {partner: (stats["wins"] / stats["total"] * 100 if stats["total"] > 0 else 0)
-                              for partner, stats in duo_partner_stats.items()}
-
-        results = {
-            "solo_queue": solo_queue_count,
-            "solo_wins": solo_wins,
-            "solo_total": solo_queue_count,
-            "solo_win_ratio": (solo_wins / solo_queue_count * 100) if solo_queue_count > 0 else 0,
-            "duo_queue": duo_queue_count,
-            "duo_wins": duo_wins,
-            "duo_total": duo_queue_count,
-            "duo_win_ratio": duo_win_ratio,
-            "duo_partner_stats": dict(duo_partner_stats),
-            "duo_partner_ratios": duo_partner_ratios,
-            "game_modes": game_modes,
-            "total_ranked": len(ranked_matches),
-            "fetched_matches": len(match_data_dict),
-            "match_data_list": list(match_data_dict.values()),
-            "match_classification": match_classification
-        }
-        return results
-
-    def get_match_details(self, match_id, region="europe"):
-        if match_id in self.match_cache:
-            return self.match_cache[match_id]
-        try:
-            url = f"https://{region}.api.riotgames.com/lol/match/v5/matches/{match_id}"
+            url = api_url(match_region(match_id, region or self.region), f"/lol/match/v5/matches/{match_id}")
             response = safe_get(url, headers=self.headers)
+            if response is None:
+                return None
             if response.status_code == 200:
-                match_data = response.json()
-                self.match_cache[match_id] = match_data
+                # Only the fields the analysis reads are kept in memory; with a match store the
+                # raw payload lives on disk, compressed as received
+                match_data = decode_match(response.content)
+                if self.match_store is not None and "info" in match_data:
+                    self.match_store.put_raw(match_id, response.content)
+                else:
+                    self.match_cache.set(match_id, match_data, size=slim_size(match_data))
                 return match_data
             else:
                 logger.error(f"Error retrieving match {match_id}: {response.status_code}")
@@ -188,58 +455,108 @@ class RiotAnalyzer:
             logger.exception(f"Exception in get_match_details for match {match_id}")
             return None
 
-def analyze_champion_stats(match_data_list, puuid):
-    champion_stats = defaultdict(lambda: {"games": 0, "wins": 0, "kills": 0, "deaths": 0, "assists": 0})
-    try:
-        for match in match_data_list:
-            if match["info"].get("queueId") != 420:
-                continue
-            participant = next((p for p in match["info"]["participants"] if p["puuid"] == puuid), None)
-            if participant:
-                champ = participant.get("championName", "Unknown")
-                champion_stats[champ]["games"] += 1
-                if participant.get("win", False):
-                    champion_stats[champ]["wins"] += 1
-                champion_stats[champ]["kills"] += participant.get("kills", 0)
-                champion_stats[champ]["deaths"] += participant.get("deaths", 0)
-                champion_stats[champ]["assists"] += participant.get("assists", 0)
-        for champ, stats in champion_stats.items():
-            stats["win_rate"] = (stats["wins"] / stats["games"] * 100) if stats["games"] > 0 else 0
-            stats["kda"] = (stats["kills"] + stats["assists"]) / (stats["deaths"] if stats["deaths"] > 0 else 1)
-    except Exception as e:
-        logger.exception("Exception in analyze_champion_stats")
-    return champion_stats
-
-def analyze_lane_performance(match_data_list, puuid):
-    lane_stats = {
-        "TOP": {"games": 0, "wins": 0},
-        "JUNGLE": {"games": 0, "wins": 0},
-        "MID": {"games": 0, "wins": 0},
-        "ADC": {"games": 0, "wins": 0},
-        "SUPPORT": {"games": 0, "wins": 0}
-    }
-    mapping = {
-        "TOP": "TOP",
-        "JUNGLE": "JUNGLE",
-        "MIDDLE": "MID",
-        "MID": "MID",
-        "BOTTOM": "ADC",
-        "UTILITY": "SUPPORT"
-    }
-    try:
-        for match in match_data_list:
-            if match["info"].get("queueId") != 420:
-                continue
-            participant = next((p for p in match["info"]["participants"] if p["puuid"] == puuid), None)
-            if participant:
-                lane_raw = participant.get("individualPosition", "UNKNOWN").upper()
-                lane = mapping.get(lane_raw, lane_raw)
-                if lane in lane_stats:
-                    lane_stats[lane]["games"] += 1
-                    if participant.get("win", False):
-                        lane_stats[lane]["wins"] += 1
-        for lane, stats in lane_stats.items():
-            stats["win_rate"] = (stats["wins"] / stats["games"] * 100) if stats["games"] > 0 else 0
-    except Exception as e:
-        logger.exception("Exception in analyze_lane_performance")
-    return lane_stats
+    def add_early_game_stats(self, results, region=None):
+        # Opt-in ([Statistics] timeline_metrics): timelines are only fetched here, and only for
+        # ranked Solo/Duo games with a lane opponent to compare with
+        entries = results.get("ranked_entries") or {}
+        match_ids = [match_id for match_id, entry in entries.items() if entry.get("opponent_id") is not None]
+        frames_by_match = {}
+        if match_ids:
+            with telemetry.stage("timelines"):
+                with concurrent.futures.ThreadPoolExecutor(max_workers=detail_workers()) as executor:
+                    frames = executor.map(lambda match_id: self.get_timeline_frames(match_id, region), match_ids)
+                    frames_by_match = {match_id: f for match_id, f in zip(match_ids, frames) if f}
+        results["early_game"] = early_game_stats(entries, results["match_classification"], frames_by_match)
+
+    def get_timeline_frames(self, match_id, region=None):
+        return inflight.do(("timeline", match_id), self._get_timeline_frames, match_id, region)
+
+    def _get_timeline_frames(self, match_id, region=None):
+        cached = timeline_cache.get(match_id)
+        if cached is not None:
+            return cached
+        if self.match_store is not None:
+            stored = self.match_store.get_timeline_frames(match_id)
+            if stored is not None:
+                timeline_cache.set(match_id, stored)
+                return stored
+        try:
+            url = api_url(match_region(match_id, region or self.region), f"/lol/match/v5/matches/{match_id}/timeline")
+            response = safe_get(url, headers=self.headers, stream=True)
+            if response is None:
+                return None
+            with response:
+                if response.status_code != 200:
+                    logger.error(f"Error retrieving timeline of match {match_id}: {response.status_code}")
+                    return None
+                # The body is parsed while it downloads; only the values of the compared minutes
+                # are kept, in memory and in the match store
+                chunks = response.iter_content(TIMELINE_CHUNK_SIZE)
+                frames = extract_frames(chunks)
+                # The rest is read and discarded, so the connection goes back to the pool
+                for chunk in chunks:
+                    pass
+            if self.match_store is not None:
+                self.match_store.put_timeline_frames(match_id, frames)
+            timeline_cache.set(match_id, frames)
+            return frames
+        except Exception as e:
+            logger.exception(f"Exception in get_timeline_frames for match {match_id}")
+            return None
+
+def unnamed_teammates(match_records):
+    return {teammate_puuid
+            for record in match_records if record.is_ranked_solo and record.tracked
+            for teammate_puuid, name in record.teammates() if not name}
+
+def mark_partial(results, matches):
+    # A cancelled run or one that hit its deadline still gets a report, flagged as partial
+    results["skipped_matches"] = len(matches) - results["fetched_matches"]
+    results["partial"] = rate_limiter.cancelled() and results["skipped_matches"] > 0
+
+def set_stats_engine(name):
+    global stats_engine
+    if name not in STATS_ENGINES:
+        logger.warning(f"Unknown statistics engine '{name}', expected one of {', '.join(STATS_ENGINES)}")
+        name = "python"
+    if name == "columnar":
+        try:
+            import columnar
+        except ImportError as e:
+            logger.warning(f"The columnar statistics engine needs pandas ({e}); using the python engine")
+            name = "python"
+    stats_engine = name
+
+def create_aggregation_engine(names=None):
+    if stats_engine == "columnar":
+        # pandas takes a while to import, so it is only loaded for the columnar engine
+        from columnar import ColumnarEngine
+        return ColumnarEngine(names=names)
+    return AggregationEngine(names=names)
+
+def summarize_matches(match_records, extra_aggregators=(), names=None):
+    # One pass over the records feeds every aggregator (see aggregation.py). names are the
+    # teammate names resolved for these records; the pass itself sends no requests.
+    engine = create_aggregation_engine(names)
+    for name, aggregator in extra_aggregators:
+        engine.register(name, aggregator)
+    aggregated = engine.add_all(match_records).results()
+    results = dict(aggregated.pop("solo_duo"))
+    results.update(aggregated)
+    results["fetched_matches"] = len(match_records)
+    results["match_records"] = list(match_records)
+    return results
+
+def analyze_champion_stats(match_records):
+    if stats_engine == "columnar":
+        from columnar import champion_stats, records_frame
+        return champion_stats(records_frame(match_records))
+    engine = AggregationEngine([("champion_stats", ChampionStats())])
+    return engine.add_all(match_records).results()["champion_stats"]
+
+def analyze_lane_performance(match_records):
+    if stats_engine == "columnar":
+        from columnar import lane_stats, records_frame
+        return lane_stats(records_frame(match_records))
+    engine = AggregationEngine([("lane_stats", LaneStats())])
+    return engine.add_all(match_records).results()["lane_stats"]
@@ -0,0 +1,416 @@
+import time
+import asyncio
+import itertools
+import contextlib
+import contextvars
+import logging
+from tqdm import tqdm
+from rate_limiter import rate_limiter, RequestCancelled, routing_key
+from telemetry import telemetry
+from concurrency import concurrency
+from analyzer import (summarize_matches, summoner_cache, failed_name_cache, match_id_params, unnamed_teammates,
+                      mark_partial)
+from riot_api import (riot_id_from_account, api_url, known_summoner_names, missing_summoner_names, PRIORITY_RANKED,
+                      PRIORITY_NAMES, PRIORITY_OTHER, PRIORITY_STOP)
+from records import extract_record, RANKED_SOLO_QUEUE
+from regions import match_region, account_region
+from payloads import loads, decode_match, slim_size
+from cache import inflight
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+# Requests in flight at once; the shared rate limiter still decides when each one is sent
+DEFAULT_CONCURRENCY = 100
+
+# Region semaphores the current task already holds (see AsyncFetchEngine._hold)
+held_semaphores = contextvars.ContextVar("held_semaphores", default=frozenset())
+
+async def async_safe_get(session, url, params=None, max_retries=5, timeout=10, decode=loads):
+    attempt = 0
+    wait_time = 1
+    while attempt < max_retries:
+        try:
+            async with concurrency.async_slot(url):
+                queued_at = time.monotonic()
+                sent_at = await rate_limiter.acquire_async(url)
+                telemetry.record_sleep(url, sent_at - queued_at, "limiter")
+                async with session.get(url, params=params, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+                    rate_limiter.update(url, response.status, response.headers, sent_at)
+                    body = await response.read() if response.status == 200 else None
+                    latency = time.monotonic() - sent_at
+                    telemetry.record_request(url, latency, response.status)
+                    concurrency.observe(url, latency, response.status)
+            if response.status == 429:
+                logger.warning(f"Rate limit hit at {url}. Retrying once the rate limiter allows it...")
+                telemetry.record_retry(url, "429")
+                attempt += 1
+                continue
+            if response.status != 200:
+                return response.status, None, 0
+            return response.status, decode(body), len(body)
+        except RequestCancelled:
+            logger.info(f"Not requesting {url}: the run was cancelled or reached its deadline")
+            return None, None, 0
+        except Exception as e:
+            logger.exception(f"Exception in async_safe_get for URL {url}: {e}")
+            telemetry.record_retry(url, "timeout" if isinstance(e, asyncio.TimeoutError) else "error")
+            if isinstance(e, asyncio.TimeoutError):
+                concurrency.observe(url, None, "timeout")
+            telemetry.record_sleep(url, wait_time, "backoff")
+            await asyncio.sleep(wait_time)
+            attempt += 1
+            wait_time *= 2
+    return None, None, 0
+
+class AsyncFetchEngine:
+    # Drop-in for RiotAnalyzer.get_match_history/process_matches that keeps many requests
+    # in flight as coroutines instead of being capped by a thread pool
+    def __init__(self, analyzer, concurrency=DEFAULT_CONCURRENCY):
+        if aiohttp is None:
+            raise RuntimeError("The asyncio engine requires the 'aiohttp' package (pip install aiohttp)")
+        self.analyzer = analyzer
+        self.concurrency = concurrency
+        self.semaphores = {}
+
+    def _session(self):
+        # Connections are limited per host, so each region has its own pool
+        connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.concurrency, ttl_dns_cache=300)
+        return aiohttp.ClientSession(headers=self.analyzer.headers, connector=connector)
+
+    def _semaphore(self, url):
+        # One per region: coroutines waiting for a throttled region do not block the others
+        region = routing_key(url)[0]
+        semaphore = self.semaphores.get(region)
+        if semaphore is None:
+            semaphore = self.semaphores[region] = asyncio.Semaphore(self.concurrency)
+        return semaphore
+
+    async def _get(self, session, url, params=None, decode=loads):
+        # Identical requests in flight at the same time (e.g. two analyses of the service
+        # asking for the same teammate) are sent once
+        key = ("response", url, tuple(sorted(params.items())) if params else (), decode)
+        result = await inflight.do_async(key, self._send, session, url, params, decode)
+        # None: the request this one waited for was cancelled
+        return result if result is not None else (None, None, 0)
+
+    @contextlib.asynccontextmanager
+    async def _hold(self, url):
+        # The region's semaphore and concurrency slot, in the order _send takes them; the
+        # requests the task sends while holding them run inside them
+        semaphore = self._semaphore(url)
+        async with semaphore:
+            token = held_semaphores.set(held_semaphores.get() | {semaphore})
+            try:
+                async with concurrency.async_slot(url):
+                    yield
+            finally:
+                held_semaphores.reset(token)
+
+    async def _send(self, session, url, params, decode):
+        semaphore = self._semaphore(url)
+        async with (contextlib.nullcontext() if semaphore in held_semaphores.get() else semaphore):
+            return await async_safe_get(session, url, params=params,
+                                        max_retries=self.analyzer.max_retries,
+                                        timeout=self.analyzer.network_timeout, decode=decode)
+
+    async def _get_page(self, session, url, puuid, params):
+        # Match ID page, replayed from the fetch journal if an earlier run already listed it
+        journal = self.analyzer.journal
+        if journal is not None:
+            journaled = journal.page(puuid, params)
+            if journaled is not None:
+                return 200, journaled, 0
+        status, batch, size = await self._get(session, url, params)
+        if status == 200 and journal is not None:
+            journal.add_page(puuid, params, batch)
+        return status, batch, size
+
+    def get_match_history(self, puuid, count, region=None, start_time=None, queue=None):
+        return asyncio.run(self._run(self.get_match_history_async, puuid, count, region, start_time, queue))
+
+    def process_matches(self, matches, puuid):
+        return asyncio.run(self._run(self.process_matches_async, matches, puuid))
+
+    def process_history(self, puuid, count, region=None, queue=None):
+        return asyncio.run(self._run(self.process_history_async, puuid, count, region, queue))
+
+    async def _run(self, coroutine_function, *args):
+        self.semaphores = {}
+        async with self._session() as session:
+            return await coroutine_function(session, *args)
+
+    async def get_match_history_async(self, session, puuid, count, region=None, start_time=None, queue=None):
+        url = api_url(region or self.analyzer.region, f"/lol/match/v5/matches/by-puuid/{puuid}/ids")
+        if start_time is not None:
+            matches = []
+            for start in range(0, count, 100):
+                page_size = min(100, count - start)
+                status, batch, size = await self._get_page(session, url, puuid,
+                                                           match_id_params(page_size, start, start_time, queue))
+                if status != 200:
+                    logger.error(f"Error retrieving match batch: {status}")
+                    break
+                matches.extend(batch or [])
+                if len(batch or []) < page_size:
+                    break
+            return matches[:count]
+        pages = await asyncio.gather(*(
+            self._get_page(session, url, puuid, match_id_params(min(100, count - start), start, None, queue))
+            for start in range(0, count, 100)
+        ))
+        matches = []
+        for status, batch, size in pages:
+            if status == 200:
+                matches.extend(batch or [])
+            else:
+                logger.error(f"Error retrieving match batch: {status}")
+        return matches[:count]
+
+    async def get_match_details_async(self, session, match_id, region=None):
+        return await inflight.do_async(("match", match_id), self._get_match_details_async, session, match_id, region)
+
+    async def _get_match_details_async(self, session, match_id, region=None):
+        analyzer = self.analyzer
+        cached = analyzer.match_cache.get(match_id)
+        if cached is not None:
+            return cached
+        if analyzer.match_store is not None:
+            stored = analyzer.match_store.get(match_id, decode=decode_match)
+            if stored is not None:
+                return stored
+        url = api_url(match_region(match_id, region or analyzer.region), f"/lol/match/v5/matches/{match_id}")
+        # The body is kept as bytes here: it goes to the match store as received
+        status, raw, size = await self._get(session, url, decode=bytes)
+        if status is None:
+            return None
+        if status != 200 or not raw:
+            logger.error(f"Error retrieving match {match_id}: {status}")
+            return None
+        try:
+            match_data = decode_match(raw)
+        except ValueError:
+            logger.exception(f"Invalid JSON for match {match_id}")
+            return None
+        if analyzer.match_store is not None and "info" in match_data:
+            analyzer.match_store.put_raw(match_id, raw)
+        else:
+            analyzer.match_cache.set(match_id, match_data, size=slim_size(match_data))
+        return match_data
+
+    async def resolve_names_async(self, session, puuids, region=None):
+        # Same as riot_api.resolve_summoner_names, with the account requests as coroutines
+        analyzer = self.analyzer
+        names = known_summoner_names(puuids, analyzer.match_store, analyzer.name_ttl)
+        missing = list(missing_summoner_names(puuids, known=names))
+        if not missing:
+            return names
+        region = account_region(region or analyzer.region)
+        results = await asyncio.gather(*(
+            self._get(session, api_url(region, f"/riot/account/v1/accounts/by-puuid/{p}"))
+            for p in missing
+        ))
+        resolved = {}
+        for puuid, (status, data, size) in zip(missing, results):
+            if status == 200 and data:
+                resolved[puuid] = riot_id_from_account(data)
+            elif status is not None:
+                failed_name_cache[puuid] = True
+        summoner_cache.update(resolved)
+        if analyzer.match_store is not None and resolved:
+            analyzer.match_store.put_names(resolved)
+        names.update(resolved)
+        return names
+
+    def get_match_histories(self, players, count, queue=None):
+        return asyncio.run(self._run(self.get_match_histories_async, players, count, queue))
+
+    async def get_match_histories_async(self, session, players, count, queue=None):
+        histories = await asyncio.gather(*(self.get_match_history_async(session, puuid, count, region, None, queue)
+                                           for puuid, region in players))
+        return {puuid: matches for (puuid, region), matches in zip(players, histories)}
+
+    def fetch_shared_match_records(self, matches_by_puuid):
+        return asyncio.run(self._run(self.fetch_shared_match_records_async, matches_by_puuid))
+
+    async def fetch_shared_match_records_async(self, session, matches_by_puuid):
+        owners = {}
+        for puuid, matches in matches_by_puuid.items():
+            for match_id in matches:
+                owners.setdefault(match_id, []).append(puuid)
+        records_by_puuid = {puuid: [] for puuid in matches_by_puuid}
+        fetched = 0
+        for match_id, puuids in list(owners.items()):
+            journaled = [self.analyzer.journaled_record(puuid, match_id) for puuid in puuids]
+            if all(record is not None for record in journaled):
+                fetched += 1
+                for puuid, record in zip(puuids, journaled):
+                    records_by_puuid[puuid].append(record)
+                del owners[match_id]
+        total = fetched + len(owners)
+
+        async def fetch(match_id):
+            try:
+                return match_id, await self.get_match_details_async(session, match_id)
+            except Exception as e:
+                logger.exception(f"Error processing match {match_id}")
+                return match_id, None
+
+        tasks = [asyncio.ensure_future(fetch(match_id)) for match_id in owners]
+        for future in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="Processing Matches", unit="Match"):
+            match_id, match_data = await future
+            if match_data and "info" in match_data:
+                fetched += 1
+                for puuid in owners[match_id]:
+                    record = extract_record(match_data, puuid, match_id)
+                    self.analyzer.journal_record(puuid, record)
+                    records_by_puuid[puuid].append(record)
+        logger.info(f"Successfully retrieved {fetched} of {total} unique match details.")
+        return records_by_puuid
+
+    async def fetch_history_records_async(self, session, puuid, count, region=None, queue=None):
+        # Same pipeline and priorities as RiotAnalyzer.fetch_history_records; a worker picks
+        # an item only once it holds the region's semaphore and concurrency slot
+        region = region or self.analyzer.region
+        url = api_url(region, f"/lol/match/v5/matches/by-puuid/{puuid}/ids")
+        pending = asyncio.PriorityQueue(maxsize=self.concurrency)
+        available = asyncio.Semaphore(0)
+        matches = []
+        listed = set()
+        records = []
+        ranked_records = []
+        resolved_names = {}
+        known_names = {}
+        state = {"listed": False, "ranked_open": 0, "finished": False}
+        order = itertools.count()
+        progress = tqdm(total=count, desc="Processing Matches", unit="Match")
+
+        async def put(item):
+            await pending.put(item)
+            available.release()
+
+        async def finish_if_done():
+            if state["finished"] or not state["listed"] or state["ranked_open"]:
+                return
+            state["finished"] = True
+            teammates = unnamed_teammates([r for r in ranked_records if r.match_id in listed])
+            known = known_summoner_names(teammates, self.analyzer.match_store, self.analyzer.name_ttl)
+            known_names.update(known)
+            for teammate_puuid in missing_summoner_names(teammates, known=known):
+                await put((PRIORITY_NAMES, next(order), teammate_puuid))
+            for _ in range(self.concurrency):
+                await put((PRIORITY_STOP, next(order), None))
+
+        async def queue_ranked(match_id):
+            state["ranked_open"] += 1
+            await put((PRIORITY_RANKED, next(order), match_id))
+
+        def list_pages(page_queue):
+            pages = []
+            for start in range(0, count, 100):
+                params = match_id_params(min(100, count - start), start, None, page_queue)
+                pages.append(asyncio.ensure_future(self._get_page(session, url, puuid, params)))
+            return pages
+
+        async def produce():
+            ranked_pages = [] if queue is not None else list_pages(RANKED_SOLO_QUEUE)
+            pages = list_pages(queue)
+            try:
+                ranked = set()
+                for page in ranked_pages:
+                    status, batch, size = await page
+                    for match_id in batch or []:
+                        ranked.add(match_id)
+                        await queue_ranked(match_id)
+                for page in pages:
+                    status, batch, size = await page
+                    if status != 200:
+                        logger.error(f"Error retrieving match batch: {status}")
+                        continue
+                    for match_id in (batch or [])[:count - len(matches)]:
+                        matches.append(match_id)
+                        listed.add(match_id)
+                        if queue == RANKED_SOLO_QUEUE:
+                            await queue_ranked(match_id)
+                        elif match_id not in ranked:
+                            await put((PRIORITY_OTHER, next(order), match_id))
+            except Exception as e:
+                logger.exception("Exception while listing match IDs")
+            finally:
+                for page in ranked_pages + pages:
+                    page.cancel()
+                progress.total = len(matches)
+                progress.refresh()
+                state["listed"] = True
+                await finish_if_done()
+
+        async def consume():
+            while True:
+                await available.acquire()
+                async with self._hold(url):
+                    priority, position, item = pending.get_nowait()
+                    if priority == PRIORITY_STOP:
+                        return
+                    if priority == PRIORITY_NAMES:
+                        status, data, size = await self._get(session, api_url(account_region(region),
+                                                                              f"/riot/account/v1/accounts/by-puuid/{item}"))
+                        if status == 200 and data:
+                            resolved_names[item] = riot_id_from_account(data)
+                        elif status is not None:
+                            failed_name_cache[item] = True
+                        continue
+                    record = None
+                    if not state["listed"] or item in listed:
+                        record = self.analyzer.journaled_record(puuid, item)
+                        try:
+                            if record is None:
+                                match_data = await self.get_match_details_async(session, item)
+                                if match_data and "info" in match_data:
+                                    record = extract_record(match_data, puuid, item)
+                                    self.analyzer.journal_record(puuid, record)
+                        except Exception as e:
+                            logger.exception(f"Error processing match {item}")
+                if record is not None:
+                    records.append(record)
+                    progress.update(1)
+                if priority == PRIORITY_RANKED:
+                    state["ranked_open"] -= 1
+                    if record is not None:
+                        ranked_records.append(record)
+                    await finish_if_done()
+
+        try:
+            await asyncio.gather(produce(), *(consume() for _ in range(self.concurrency)))
+        finally:
+            progress.close()
+        summoner_cache.update(resolved_names)
+        if self.analyzer.match_store is not None and resolved_names:
+            self.analyzer.match_store.put_names(resolved_names)
+        records = [record for record in records if record.match_id in listed]
+        logger.info(f"Successfully retrieved {len(records)} of {len(matches)} match details.")
+        return matches, records, dict(known_names, **resolved_names)
+
+    async def process_history_async(self, session, puuid, count, region=None, queue=None):
+        with telemetry.stage("match_pipeline"):
+            matches, match_records, names = await self.fetch_history_records_async(session, puuid, count, region, queue)
+        results = await self.summarize_records_async(session, match_records, names)
+        mark_partial(results, matches)
+        return matches, results
+
+    async def process_matches_async(self, session, matches, puuid):
+        with telemetry.stage("match_details"):
+            match_records = (await self.fetch_shared_match_records_async(session, {puuid: matches}))[puuid]
+        return await self.summarize_records_async(session, match_records)
+
+    async def summarize_records_async(self, session, match_records, names=None):
+        # Resolve every teammate name the classification will need concurrently up front
+        # and hand them to summarize_matches; names holds those the pipeline resolved
+        names = dict(names or {})
+        with telemetry.stage("names"):
+            names.update(await self.resolve_names_async(session, unnamed_teammates(match_records) - names.keys()))
+        with telemetry.stage("analysis"):
+            return summarize_matches(match_records, names=names)
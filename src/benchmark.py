@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from analyzer import RiotAnalyzer
+from async_engine import AsyncFetchEngine
+from match_store import MatchStore
+from mock_riot_api import MockServerProcess, DEFAULT_MOCK_CONFIG
+from rate_limiter import rate_limiter
+from riot_api import set_api_base_url
+from cache import clear_caches
+from concurrency import concurrency
+
+logger = logging.getLogger(__name__)
+
+# Runs the real fetch pipeline (process_history, as used by main.py) against a local mock
+# of the Riot API, once with empty caches and an empty match store (cold) and once more
+# with both filled (warm). Usage: python benchmark.py [scenario ...] [--engine asyncio]
+
+# Limits of a production key; the "dev-key" scenario uses the limits of a development key
+BENCHMARK_RATE_LIMIT = "3000:10,180000:600"
+
+SCENARIOS = {
+    "100": {"games": 100},
+    "500": {"games": 500},
+    "2000": {"games": 2000},
+    # Payloads without Riot IDs and a huge teammate pool, so almost every teammate needs a lookup
+    "many-teammates": {"games": 500, "mock": {"teammate_pool": 1000000, "named_participants": False}},
+    # Slow, jittery server with random 429s (Retry-After) and 5xx errors
+    "faults": {"games": 500, "mock": {"latency": 0.05, "latency_jitter": 0.05,
+                                      "error_rate_429": 0.02, "error_rate_5xx": 0.01}},
+    # One player per regional cluster, fetched as a batch; each region has its own 20:1 limit,
+    # so this takes about as long as a single region if the regions are fetched in parallel
+    "multi-region": {"games": 200, "regions": ["europe", "americas", "asia", "sea"],
+                     "mock": {"app_rate_limit": "20:1"}},
+    # 20:1,100:120 as for a development key; takes several minutes, so not part of the default run
+    "dev-key": {"games": 100, "mock": {"app_rate_limit": "20:1,100:120"}},
+}
+DEFAULT_SCENARIOS = ["100", "500", "2000", "many-teammates", "faults", "multi-region"]
+
+def peak_memory():
+    # Python allocations of this phase with --tracemalloc (slows the client down a lot),
+    # otherwise the peak RSS of the whole process so far
+    if tracemalloc.is_tracing():
+        return tracemalloc.get_traced_memory()[1]
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return None
+
+def run_phase(server, scenario, engine, match_store):
+    analyzer = RiotAnalyzer("benchmark-key", match_store=match_store)
+    fetcher = AsyncFetchEngine(analyzer) if engine == "asyncio" else analyzer
+    before = server.stats()
+    wait_before = rate_limiter.total_wait
+    concurrency.reset()
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    if "regions" in scenario:
+        matches_by_puuid = {}
+        for region in scenario["regions"]:
+            account = analyzer.get_account_by_riot_id(f"Bench{region}", "MOCK", region)
+            matches_by_puuid[account["puuid"]] = fetcher.get_match_history(account["puuid"], count=scenario["games"],
+                                                                           region=region)
+        records = fetcher.fetch_shared_match_records(matches_by_puuid)
+        matches = [match_id for region_matches in matches_by_puuid.values() for match_id in region_matches]
+        fetched = sum(len(region_records) for region_records in records.values())
+    else:
+        account = analyzer.get_account_by_riot_id("Bench", "MOCK")
+        matches, results = fetcher.process_history(account["puuid"], count=scenario["games"])
+        fetched = results["fetched_matches"]
+    wall = time.perf_counter() - start
+    peak = peak_memory()
+    after = server.stats()
+    requests_sent = after["requests"] - before["requests"]
+    return {
+        "wall_s": round(wall, 3),
+        "requests": requests_sent,
+        "requests_per_s": round(requests_sent / wall, 1) if wall > 0 else 0.0,
+        "peak_mb": round(peak / (1024 * 1024), 1) if peak is not None else "n/a",
+        "429": after["429"] - before["429"],
+        "5xx": after["5xx"] - before["5xx"],
+        "limiter_wait_s": round(rate_limiter.total_wait - wait_before, 2),
+        "match_ids": len(matches),
+        "matches_fetched": fetched,
+        "concurrency": max((c["mean_level"] for c in concurrency.summary()["regions"].values()), default="n/a"),
+    }
+
+def run_scenario(name, engine="threads"):
+    scenario = SCENARIOS[name]
+    mock_config = dict(scenario.get("mock", {}), games=scenario["games"])
+    mock_config.setdefault("app_rate_limit", BENCHMARK_RATE_LIMIT)
+    store_dir = tempfile.mkdtemp(prefix="benchmark-")
+    report = {}
+    try:
+        with MockServerProcess(mock_config) as server:
+            set_api_base_url(server.base_url)
+            clear_caches()
+            rate_limiter.reset()
+            rate_limiter.configure(mock_config["app_rate_limit"])
+            match_store = MatchStore(os.path.join(store_dir, "matches.db"))
+            try:
+                for phase in ("cold", "warm"):
+                    report[phase] = run_phase(server, scenario, engine, match_store)
+            finally:
+                match_store.close()
+    finally:
+        shutil.rmtree(store_dir, ignore_errors=True)
+    return report
+
+def print_report(reports):
+    columns = ["wall_s", "requests", "requests_per_s", "peak_mb", "429", "5xx", "limiter_wait_s", "match_ids",
+               "matches_fetched", "concurrency"]
+    print(f"{'scenario':<16}{'phase':<6}" + "".join(f"{c:>16}" for c in columns))
+    for name, report in reports.items():
+        for phase, numbers in report.items():
+            print(f"{name:<16}{phase:<6}" + "".join(f"{numbers[c]:>16}" for c in columns))
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the fetch pipeline against a local mock Riot API")
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run (default: {' '.join(DEFAULT_SCENARIOS)}; "
+                                                     f"available: {' '.join(SCENARIOS)})")
+    parser.add_argument("--engine", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument("--json", metavar="FILE", help="also write the numbers to FILE")
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="measure peak Python allocations per phase instead of the process peak RSS")
+    parser.add_argument("--concurrency", type=int, metavar="N",
+                        help="keep N requests in flight instead of adapting the level")
+    parser.add_argument("--log-level", default="ERROR")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper())
+
+    names = args.scenarios or DEFAULT_SCENARIOS
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(unknown)}")
+
+    if args.concurrency:
+        concurrency.configure(maximum=args.concurrency, adaptive=False)
+    if args.tracemalloc:
+        tracemalloc.start()
+    reports = {}
+    for name in names:
+        print(f"Running scenario {name} ({args.engine})...", file=sys.stderr)
+        reports[name] = run_scenario(name, args.engine)
+    print_report(reports)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"engine": args.engine, "mock_defaults": DEFAULT_MOCK_CONFIG, "scenarios": reports}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import sys
+import time
+import asyncio
+import weakref
+import logging
+import threading
+from concurrent.futures import Future
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Defaults for every cache, overwritten from the [Cache] section by configure_caches()
+cache_settings = {
+    "enabled": True,
+    "max_entries": 1024,
+    "max_bytes": 256 * 1024 * 1024,
+}
+
+_registry = weakref.WeakSet()
+_registry_lock = threading.Lock()
+
+_MISSING = object()
+
+class BoundedCache:
+    # Thread-safe LRU cache bounded by entry count and (optionally) approximate bytes,
+    # with optional expiry. Values can be given an explicit size when set; otherwise
+    # sys.getsizeof is used, which is only a shallow estimate.
+    def __init__(self, name, max_entries=None, max_bytes=None, ttl=None):
+        self.name = name
+        self.lock = threading.RLock()
+        self.data = OrderedDict()
+        self.ttl = ttl
+        self.fixed_max_entries = max_entries
+        self.fixed_max_bytes = max_bytes
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        with _registry_lock:
+            _registry.add(self)
+
+    @property
+    def max_entries(self):
+        if not cache_settings["enabled"]:
+            return 0
+        return self.fixed_max_entries if self.fixed_max_entries is not None else cache_settings["max_entries"]
+
+    @property
+    def max_bytes(self):
+        return self.fixed_max_bytes if self.fixed_max_bytes is not None else cache_settings["max_bytes"]
+
+    def _expired(self, stored_at, now):
+        return self.ttl is not None and now - stored_at > self.ttl
+
+    def _remove(self, key):
+        value, size, stored_at = self.data.pop(key)
+        self.total_bytes -= size
+
+    def get(self, key, default=None):
+        with self.lock:
+            entry = self.data.get(key, _MISSING)
+            if entry is not _MISSING and self._expired(entry[2], time.time()):
+                self._remove(key)
+                self.expirations += 1
+                entry = _MISSING
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            self.data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        with self.lock:
+            entry = self.data.get(key, _MISSING)
+            return entry is not _MISSING and not self._expired(entry[2], time.time())
+
+    def set(self, key, value, size=None):
+        if size is None:
+            size = sys.getsizeof(value)
+        with self.lock:
+            if self.max_entries <= 0:
+                return
+            if key in self.data:
+                self._remove(key)
+            self.data[key] = (value, size, time.time())
+            self.total_bytes += size
+            self._shrink()
+
+    def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def update(self, items):
+        for key, value in items.items():
+            self.set(key, value)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            if key not in self.data:
+                return default
+            value = self.data[key][0]
+            self._remove(key)
+            return value
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+            self.total_bytes = 0
+
+    def _shrink(self):
+        max_entries = self.max_entries
+        max_bytes = self.max_bytes
+        while self.data and (len(self.data) > max_entries or (max_bytes and self.total_bytes > max_bytes)):
+            key = next(iter(self.data))
+            self._remove(key)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self.data)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "entries": len(self.data),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+def configure_caches(max_entries=None, max_bytes=None, enabled=None):
+    if max_entries is not None:
+        cache_settings["max_entries"] = max_entries
+    if max_bytes is not None:
+        cache_settings["max_bytes"] = max_bytes
+    if enabled is not None:
+        cache_settings["enabled"] = enabled
+    with _registry_lock:
+        caches = list(_registry)
+    for cache in caches:
+        with cache.lock:
+            cache._shrink()
+
+def clear_caches():
+    with _registry_lock:
+        caches = list(_registry)
+    for cache in caches:
+        cache.clear()
+
+def cache_stats():
+    with _registry_lock:
+        caches = list(_registry)
+    return [cache.stats() for cache in caches]
+
+def log_cache_stats():
+    for stats in cache_stats():
+        logger.info(f"Cache {stats['name']}: {stats['entries']} entries, {stats['bytes']} bytes, "
+                    f"{stats['hits']} hits, {stats['misses']} misses ({stats['hit_ratio']:.0%}), "
+                    f"{stats['evictions']} evictions")
+
+class SingleFlight:
+    # Coalesces identical fetches that overlap in time: the first caller of a key does the
+    # work, everyone asking for the same key meanwhile waits for its result instead of
+    # sending the same request again. Works across threads and event loops, so analyses
+    # running side by side (service.py) share their in-flight requests.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.started = 0
+        self.coalesced = 0
+
+    def _join(self, key):
+        with self.lock:
+            future = self.calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self.calls[key] = Future()
+            self.started += 1
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self.lock:
+            del self.calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, function, *args):
+        future, leader = self._join(key)
+        if not leader:
+            return future.result()
+        try:
+            result = function(*args)
+        except Exception as e:
+            self._finish(key, future, error=e)
+            raise
+        except BaseException:
+            # Ctrl+C: waiting callers get "not fetched" instead of the interrupt
+            self._finish(key, future)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    async def do_async(self, key, coroutine_function, *args):
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            result = await coroutine_function(*args)
+        except Exception as e:
+            self._finish(key, future, error=e)
+            raise
+        except BaseException:
+            # The task was cancelled: waiting callers get "not fetched" instead of the cancellation
+            self._finish(key, future)
+            raise
+        self._finish(key, future, result)
+        return result
+
+    def stats(self):
+        with self.lock:
+            return {"fetches": self.started, "coalesced": self.coalesced, "in_flight": len(self.calls)}
+
+# Shared by every thread in the process
+inflight = SingleFlight()
@@ -0,0 +1,283 @@
+import time
+import asyncio
+import logging
+import threading
+import contextlib
+import contextvars
+from collections import deque
+from rate_limiter import rate_limiter, routing_key
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INITIAL = 10
+DEFAULT_MINIMUM = 2
+DEFAULT_MAXIMUM = 50
+
+# A request counts as slow once the short-term latency of its endpoint is this many times its
+# long-term latency: the server (or the connection) has started queueing our requests. The
+# long-term average follows slow changes, e.g. a busy client parsing large payloads.
+LATENCY_TOLERANCE = 2.0
+SHORT_SMOOTHING = 0.2
+LONG_SMOOTHING = 0.01
+# More requests in flight than the rate limit can serve during one round trip only wait
+# in the rate limiter (Little's law); the factor leaves room for latency variation
+RATE_HEADROOM = 2.0
+DECREASE_FACTOR = 0.5
+# Share of 429s among the last RECENT_RESPONSES responses above which the level is cut;
+# isolated 429s (e.g. a short service hiccup) are left to the rate limiter's pause
+MAX_429_SHARE = 0.05
+RECENT_RESPONSES = 50
+
+# Controllers whose slot the current thread or task already holds. A pipeline worker takes
+# its slot before it picks an item from the queue (analyzer.py), and the request it then
+# sends runs in that same slot.
+held_slots = contextvars.ContextVar("held_slots", default=frozenset())
+
+class EndpointLatency:
+    def __init__(self, seconds):
+        self.short = seconds
+        self.long = seconds
+
+    def add(self, seconds):
+        self.short += SHORT_SMOOTHING * (seconds - self.short)
+        self.long += LONG_SMOOTHING * (seconds - self.long)
+
+    def slow(self):
+        return self.short > LATENCY_TOLERANCE * self.long
+
+class AdaptiveConcurrency:
+    # AIMD controller for the number of requests in flight, shared by every fetch worker.
+    # Each successful request at normal latency adds 1/level (so +1 per round of requests);
+    # a high 429 rate, a timeout or a latency spike halves the level. After a cut, the requests
+    # sent at the old level are let through before the next cut, so one burst counts once.
+    # The level never exceeds what the known rate limits can keep busy. There is one controller
+    # per routing value (see RegionalConcurrency below).
+    def __init__(self, initial=DEFAULT_INITIAL, minimum=DEFAULT_MINIMUM, maximum=DEFAULT_MAXIMUM, adaptive=True):
+        self.condition = threading.Condition()
+        self.waiters = []
+        self.configure(initial, minimum, maximum, adaptive)
+
+    def configure(self, initial=DEFAULT_INITIAL, minimum=DEFAULT_MINIMUM, maximum=DEFAULT_MAXIMUM, adaptive=True):
+        with self.condition:
+            self.minimum = max(1, minimum)
+            self.maximum = max(self.minimum, maximum)
+            self.initial = min(max(initial, self.minimum), self.maximum)
+            self.adaptive = adaptive
+        self.reset()
+
+    def reset(self):
+        with self.condition:
+            self.level = float(self.initial if self.adaptive else self.maximum)
+            self.in_flight = 0
+            self.reserved = 0
+            self.latencies = {}
+            self.recent = deque(maxlen=RECENT_RESPONSES)
+            self.settling = 0
+            self.increases = 0
+            self.decreases = 0
+            self.peak = self.level
+            self.started = self.changed = time.monotonic()
+            self.level_time = 0.0
+            self._wake()
+
+    def limit(self):
+        return max(self.minimum, min(int(self.level), self.maximum))
+
+    def _wake(self, count=None):
+        # count=None wakes every waiting worker (the level went up), otherwise one per free slot.
+        # A coroutine woken for a free slot gets it reserved: it only runs after the loop's
+        # next turn, and a coroutine that is already running would otherwise take it first.
+        if count is None:
+            self.condition.notify_all()
+            waking, self.waiters = self.waiters, []
+        else:
+            self.condition.notify(count)
+            waking, self.waiters = self.waiters[:count], self.waiters[count:]
+            self.reserved += len(waking)
+        for loop, future in waking:
+            loop.call_soon_threadsafe(self._resolve, future, count is not None)
+
+    def _resolve(self, future, reserved):
+        if future.done():
+            # Cancelled while the wake-up was on its way: pass the reservation on
+            if reserved:
+                with self.condition:
+                    self.reserved -= 1
+                    self._wake(1)
+            return
+        future.set_result(reserved)
+
+    def _set_level(self, level, now):
+        level = max(self.minimum, min(level, self.maximum))
+        self.level_time += self.level * (now - self.changed)
+        self.changed = now
+        self.level = level
+        self.peak = max(self.peak, level)
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight + self.reserved >= self.limit():
+                self.condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        reserved = False
+        while True:
+            with self.condition:
+                if reserved:
+                    self.reserved -= 1
+                if self.in_flight + self.reserved < self.limit() and (reserved or not self.waiters):
+                    self.in_flight += 1
+                    return
+                future = loop.create_future()
+                self.waiters.append((loop, future))
+            try:
+                reserved = await future
+            except asyncio.CancelledError:
+                with self.condition:
+                    if (loop, future) in self.waiters:
+                        self.waiters.remove((loop, future))
+                    elif future.done() and not future.cancelled() and future.result():
+                        self.reserved -= 1
+                        self._wake(1)
+                raise
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self._wake(1)
+
+    @contextlib.contextmanager
+    def slot(self):
+        if self in held_slots.get():
+            yield
+            return
+        self.acquire()
+        token = held_slots.set(held_slots.get() | {self})
+        try:
+            yield
+        finally:
+            held_slots.reset(token)
+            self.release()
+
+    @contextlib.asynccontextmanager
+    async def async_slot(self):
+        if self in held_slots.get():
+            yield
+            return
+        await self.acquire_async()
+        token = held_slots.set(held_slots.get() | {self})
+        try:
+            yield
+        finally:
+            held_slots.reset(token)
+            self.release()
+
+    def observe(self, url, seconds, status):
+        # seconds is the round trip of one response (None for a timeout); status its code or "timeout"
+        if not self.adaptive:
+            return
+        method = routing_key(url)[1]
+        rate = rate_limiter.sustained_rate(url)
+        now = time.monotonic()
+        with self.condition:
+            latency = self.latencies.get(method)
+            if seconds is not None:
+                if latency is None:
+                    latency = self.latencies[method] = EndpointLatency(seconds)
+                else:
+                    latency.add(seconds)
+            self.recent.append(status == 429)
+            overloaded = (status == "timeout" or
+                          (status == 429 and sum(self.recent) > MAX_429_SHARE * len(self.recent)) or
+                          (latency is not None and latency.slow()))
+            level = self.level
+            if self.settling:
+                self.settling -= 1
+            elif overloaded:
+                level *= DECREASE_FACTOR
+                self.settling = self.in_flight
+                self.decreases += 1
+                logger.info(f"Concurrency down to {max(self.minimum, int(level))} ({status}, {method} at "
+                            f"{latency.short * 1000 if latency is not None else 0:.0f} ms)")
+            if status == 200 and not overloaded:
+                level += 1 / level
+                if int(level) > int(self.level):
+                    self.increases += 1
+            if rate is not None and latency is not None:
+                level = min(level, max(self.minimum, rate * latency.long * RATE_HEADROOM))
+            if level != self.level:
+                grew = level > self.level
+                self._set_level(level, now)
+                if grew:
+                    self._wake()
+
+    def summary(self):
+        with self.condition:
+            now = time.monotonic()
+            elapsed = now - self.started
+            level_time = self.level_time + self.level * (now - self.changed)
+            return {
+                "adaptive": self.adaptive,
+                "level": self.limit(),
+                "mean_level": round(level_time / elapsed, 1) if elapsed > 0 else float(self.limit()),
+                "peak_level": min(int(self.peak), self.maximum),
+                "minimum": self.minimum,
+                "maximum": self.maximum,
+                "increases": self.increases,
+                "decreases": self.decreases,
+            }
+
+class RegionalConcurrency:
+    # Every region has its own rate limits and servers, so each gets its own controller and a
+    # slow or throttled region does not hold back requests to the others
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.controllers = {}
+        self.configure()
+
+    def configure(self, initial=DEFAULT_INITIAL, minimum=DEFAULT_MINIMUM, maximum=DEFAULT_MAXIMUM, adaptive=True):
+        with self.lock:
+            self.initial = initial
+            self.minimum = max(1, minimum)
+            self.maximum = max(self.minimum, maximum)
+            self.adaptive = adaptive
+            self.controllers = {}
+
+    def reset(self):
+        with self.lock:
+            controllers = list(self.controllers.values())
+        for controller in controllers:
+            controller.reset()
+
+    def controller(self, url):
+        region = routing_key(url)[0]
+        with self.lock:
+            controller = self.controllers.get(region)
+            if controller is None:
+                controller = self.controllers[region] = AdaptiveConcurrency(self.initial, self.minimum, self.maximum,
+                                                                            self.adaptive)
+            return controller
+
+    def slot(self, url):
+        return self.controller(url).slot()
+
+    def async_slot(self, url):
+        return self.controller(url).async_slot()
+
+    def observe(self, url, seconds, status):
+        self.controller(url).observe(url, seconds, status)
+
+    def summary(self):
+        with self.lock:
+            controllers = sorted(self.controllers.items())
+        return {
+            "adaptive": self.adaptive,
+            "minimum": self.minimum,
+            "maximum": self.maximum,
+            "regions": {region: controller.summary() for region, controller in controllers},
+        }
+
+# Shared by every thread in the process, like the rate limiter
+concurrency = RegionalConcurrency()
@@ -12,8 +12,34 @@ def get_settings(config):
     settings = {}
     settings["api_key"] = config.get("API", "key", fallback="YOUR_API_KEY")
     settings["region"] = config.get("API", "region", fallback="europe")
+    settings["platform"] = config.get("API", "platform", fallback="").strip() or None
     settings["network_timeout"] = config.getint("Network", "timeout", fallback=10)
     settings["max_retries"] = config.getint("Network", "max_retries", fallback=5)
+    settings["rate_limit"] = config.get("Network", "rate_limit", fallback="20:1,100:120")
+    settings["engine"] = config.get("Network", "engine", fallback="threads").strip().lower()
+    settings["async_concurrency"] = config.getint("Network", "async_concurrency", fallback=100)
+    settings["adaptive_concurrency"] = config.getboolean("Network", "adaptive_concurrency", fallback=True)
+    settings["max_concurrency"] = config.getint("Network", "max_concurrency", fallback=50)
+    settings["deadline_seconds"] = config.getint("Network", "deadline_seconds", fallback=0)
     settings["cache_size"] = config.getint("Cache", "size", fallback=1024)
+    settings["cache_enabled"] = config.getboolean("Cache", "enable_cache", fallback=True)
+    settings["cache_max_mb"] = config.getint("Cache", "max_mb", fallback=256)
+    settings["name_ttl_hours"] = config.getint("Cache", "name_ttl_hours", fallback=168)
+    settings["store_enabled"] = config.getboolean("Store", "enabled", fallback=True)
+    settings["store_path"] = config.get("Store", "path", fallback="matches.db")
+    settings["store_max_mb"] = config.getint("Store", "max_size_mb", fallback=512)
+    settings["store_max_matches"] = config.getint("Store", "max_matches", fallback=50000)
+    settings["resume"] = config.getboolean("Store", "resume", fallback=True)
+    settings["journal_dir"] = config.get("Store", "journal_dir", fallback="journal")
+    settings["incremental"] = config.getboolean("Statistics", "incremental", fallback=False)
+    settings["ranked_only"] = config.getboolean("Statistics", "ranked_only", fallback=False)
+    settings["stats_engine"] = config.get("Statistics", "engine", fallback="python").strip().lower()
+    settings["timeline_metrics"] = config.getboolean("Statistics", "timeline_metrics", fallback=False)
     settings["colored_console"] = config.getboolean("Output", "colored_console", fallback=True)
+    settings["export_formats"] = config.get("Output", "export_formats", fallback="csv")
+    settings["telemetry"] = config.getboolean("Output", "telemetry", fallback=True)
+    settings["telemetry_json"] = config.getboolean("Output", "telemetry_json", fallback=False)
+    settings["service_host"] = config.get("Service", "host", fallback="127.0.0.1")
+    settings["service_port"] = config.getint("Service", "port", fallback=8000)
+    settings["service_max_analyses"] = config.getint("Service", "max_analyses", fallback=4)
     return settings
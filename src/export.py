@@ -0,0 +1,169 @@
+import os
+import io
+import csv
+import sys
+import json
+import logging
+from abc import ABC, abstractmethod
+from output import remove_ansi_sequences
+
+logger = logging.getLogger(__name__)
+
+TABLE_COLUMNS = ["GameID", "Date", "Result", "Type", "Teammates", "Playtime"]
+EXPORT_FORMATS = ("csv", "jsonl", "parquet")
+
+# Rows are written one at a time instead of being copied into a DataFrame first. Libraries
+# for columnar formats are only imported when such a format is requested.
+class RowWriter(ABC):
+    extension = None
+
+    def __init__(self, path, columns=TABLE_COLUMNS):
+        self.path = path
+        self.columns = columns
+        self.rows = 0
+
+    @abstractmethod
+    def write(self, row):
+        pass
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write(row)
+        return self
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class CsvRowWriter(RowWriter):
+    extension = "csv"
+
+    def __init__(self, path, columns=TABLE_COLUMNS):
+        super().__init__(path, columns)
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.file, lineterminator=os.linesep)
+        self.writer.writerow(columns)
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.rows += 1
+
+    def close(self):
+        self.file.close()
+
+class JsonlRowWriter(RowWriter):
+    extension = "jsonl"
+
+    def __init__(self, path, columns=TABLE_COLUMNS):
+        super().__init__(path, columns)
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, row):
+        self.file.write(json.dumps(dict(zip(self.columns, row)), ensure_ascii=False) + "\n")
+        self.rows += 1
+
+    def close(self):
+        self.file.close()
+
+class ParquetRowWriter(RowWriter):
+    # Buffers up to batch_size rows and writes each batch as a row group
+    extension = "parquet"
+
+    def __init__(self, path, columns=TABLE_COLUMNS, batch_size=1000):
+        super().__init__(path, columns)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet export requires the 'pyarrow' package (pip install pyarrow)")
+        self.pa = pyarrow
+        self.schema = pyarrow.schema([(column, pyarrow.string()) for column in columns])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+        self.batch_size = batch_size
+        self.batch = []
+
+    def write(self, row):
+        self.batch.append(row)
+        self.rows += 1
+        if len(self.batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not self.batch:
+            return
+        arrays = [self.pa.array([str(row[i]) for row in self.batch], type=self.pa.string())
+                  for i in range(len(self.columns))]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+        self.batch = []
+
+    def close(self):
+        self._flush()
+        self.writer.close()
+
+ROW_WRITERS = {
+    "csv": CsvRowWriter,
+    "jsonl": JsonlRowWriter,
+    "parquet": ParquetRowWriter,
+}
+
+def parse_export_formats(value):
+    formats = []
+    for name in (value or "").split(","):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in ROW_WRITERS:
+            logger.warning(f"Unknown export format '{name}', expected one of {', '.join(EXPORT_FORMATS)}")
+            continue
+        formats.append(name)
+    return formats
+
+def export_rows(rows, base_path, formats=("csv",), columns=TABLE_COLUMNS):
+    # Writes the rows once per format to base_path.<extension>; returns the files written
+    written = []
+    for name in formats:
+        writer_class = ROW_WRITERS[name]
+        path = f"{base_path}.{writer_class.extension}"
+        try:
+            with writer_class(path, columns) as writer:
+                writer.write_rows(rows)
+            written.append(path)
+        except RuntimeError as e:
+            logger.warning(f"{e}; skipping {name} export")
+        except Exception as e:
+            logger.exception(f"Error exporting {name} to {path}")
+    return written
+
+class TeeOutput(io.TextIOBase):
+    # Stands in for sys.stdout during an analysis: console output goes through unchanged,
+    # and the same text without ANSI colour codes goes straight into the report file
+    def __init__(self, path, console=None):
+        self.path = path
+        self.console = console if console is not None else sys.stdout
+        self.file = open(path, "w", encoding="utf-8")
+
+    def write(self, text):
+        self.console.write(text)
+        self.file.write(remove_ansi_sequences(text))
+        return len(text)
+
+    def flush(self):
+        self.console.flush()
+        if not self.file.closed:
+            self.file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+    @property
+    def encoding(self):
+        return getattr(self.console, "encoding", "utf-8")
+
+    def isatty(self):
+        return self.console.isatty()
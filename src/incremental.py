@@ -0,0 +1,161 @@
+import logging
+from aggregation import (classify_ranked_entries, finalize_champion_stats, finalize_lane_stats, finalize_party_stats,
+                         CHAMPION_TOTALS, LANE_MAPPING)
+from telemetry import telemetry
+from analyzer import mark_partial
+from rollups import rollup_index
+
+logger = logging.getLogger(__name__)
+
+# Per-PUUID aggregates kept in the match store between runs. Counts are additive; the
+# solo/duo classification depends on how often teammates recur across all games, so the
+# compact ranked entries are kept and classified again after every merge.
+# States of an older version are dropped and rebuilt (version 2: entries carry PUUIDs;
+# version 3: entries carry K/D/A, champion totals carry CS, damage and time played;
+# version 4: entries carry the participant IDs the match timeline is read with; version 5:
+# what each match added to the totals is kept, so matches beyond games_to_analyze can be
+# taken out of them again).
+STATE_VERSION = 5
+
+def new_player_state():
+    return {
+        "version": STATE_VERSION,
+        "last_game_creation": 0,
+        "last_match_id": None,
+        "match_ids": [],
+        "match_facts": {},
+        "game_modes": {},
+        "ranked_entries": {},
+        "champion_stats": {},
+        "lane_stats": {},
+        "party_stats": {},
+        "table_rows": [],
+    }
+
+def _add_totals(target, source, keys):
+    for name, stats in source.items():
+        totals = target.setdefault(name, {key: 0 for key in keys})
+        for key in keys:
+            totals[key] += stats.get(key, 0)
+
+def match_fact(record, party_size):
+    # What one match added to the totals of the state: a game of its queue, one of its party
+    # size and, for tracked Ranked Solo/Duo games, the champion and lane totals
+    fact = {"creation": record.creation, "queue_id": str(record.queue_id), "party_size": party_size, "win": record.win}
+    if record.is_ranked_solo and record.tracked:
+        lane = record.position.upper()
+        fact["champion"] = record.champion
+        fact["lane"] = LANE_MAPPING.get(lane, lane)
+        fact["totals"] = [1, int(bool(record.win)), record.kills, record.deaths, record.assists, record.cs,
+                          record.damage, record.team_damage, record.duration]
+    return fact
+
+def _remove_game(totals, name, values, drop_empty=True):
+    stats = totals.get(name)
+    if stats is None:
+        return
+    for key, value in values.items():
+        stats[key] = stats.get(key, 0) - value
+    if drop_empty and stats.get("games", 0) <= 0:
+        del totals[name]
+
+def trim_state(state, games_to_analyze):
+    # Keeps the newest games_to_analyze matches, so the report covers the same window as a
+    # full analysis; the older ones are taken out of every total
+    if len(state["match_ids"]) <= games_to_analyze:
+        return False
+    facts = state["match_facts"]
+    ordered = sorted(state["match_ids"], key=lambda match_id: facts.get(match_id, {}).get("creation", 0), reverse=True)
+    dropped = set(ordered[games_to_analyze:])
+    for match_id in dropped:
+        fact = facts.pop(match_id, None)
+        state["ranked_entries"].pop(match_id, None)
+        if fact is None:
+            continue
+        game_modes = state["game_modes"]
+        if fact["queue_id"] in game_modes:
+            game_modes[fact["queue_id"]] -= 1
+            if game_modes[fact["queue_id"]] <= 0:
+                del game_modes[fact["queue_id"]]
+        win = int(bool(fact["win"]))
+        if fact["party_size"] is not None:
+            _remove_game(state["party_stats"], str(fact["party_size"]), {"games": 1, "wins": win})
+        if "totals" in fact:
+            _remove_game(state["champion_stats"], fact["champion"], dict(zip(CHAMPION_TOTALS, fact["totals"])))
+            # Every lane stays in the report, with 0 games if need be
+            _remove_game(state["lane_stats"], fact["lane"], {"games": 1, "wins": win}, drop_empty=False)
+    state["match_ids"] = [match_id for match_id in state["match_ids"] if match_id not in dropped]
+    state["table_rows"] = [row for row in state["table_rows"] if row[0] not in dropped]
+    return True
+
+def merge_into_state(state, results, games_to_analyze=None):
+    match_records = results["match_records"]
+    party_sizes = results.get("party_sizes") or {}
+    for queue_id, count in results["game_modes"].items():
+        state["game_modes"][str(queue_id)] = state["game_modes"].get(str(queue_id), 0) + count
+    state["ranked_entries"].update(results["ranked_entries"])
+    _add_totals(state["champion_stats"], results["champion_stats"], CHAMPION_TOTALS)
+    _add_totals(state["lane_stats"], results["lane_stats"], ("games", "wins"))
+    _add_totals(state["party_stats"], {str(size): stats for size, stats in results["party_stats"].items()},
+                ("games", "wins"))
+
+    # The type column is filled in from the classification of the merged state on output
+    entries = state["ranked_entries"]
+    rows = state["table_rows"] + results["match_table_rows"]
+    state["table_rows"] = sorted(rows, key=lambda row: entries.get(row[0], {}).get("creation", 0), reverse=True)
+
+    for record in match_records:
+        state["match_ids"].append(record.match_id)
+        state["match_facts"][record.match_id] = match_fact(record, party_sizes.get(record.match_id))
+        if record.creation > state["last_game_creation"]:
+            state["last_game_creation"] = record.creation
+            state["last_match_id"] = record.match_id
+    if games_to_analyze is not None:
+        trim_state(state, games_to_analyze)
+
+def results_from_state(state):
+    results = classify_ranked_entries(state["ranked_entries"])
+    results["game_modes"] = {int(queue_id): count for queue_id, count in state["game_modes"].items()}
+    results["fetched_matches"] = len(state["match_ids"])
+    champ_stats = finalize_champion_stats({champ: dict(stats) for champ, stats in state["champion_stats"].items()})
+    lane_stats = finalize_lane_stats({lane: dict(stats) for lane, stats in state["lane_stats"].items()})
+    results["party_stats"] = finalize_party_stats({int(size): dict(stats) for size, stats in state["party_stats"].items()})
+    classification = results["match_classification"]
+    rows = [row[:3] + [classification.get(row[0], "N/A")] + row[4:] for row in state["table_rows"]]
+    return results, champ_stats, lane_stats, rows
+
+def analyze_incremental(fetcher, match_store, puuid, games_to_analyze, queue=None):
+    state = match_store.get_player_state(puuid)
+    start_time = None
+    if state is None or state.get("version") != STATE_VERSION:
+        state = new_player_state()
+    else:
+        # startTime is in seconds and inclusive; the last known match is filtered out below
+        start_time = state["last_game_creation"] // 1000
+    known = set(state["match_ids"])
+    with telemetry.stage("match_ids"):
+        matches = fetcher.get_match_history(puuid, count=games_to_analyze, start_time=start_time, queue=queue)
+    new_matches = [m for m in matches if m not in known]
+    logger.info(f"Incremental analysis for {puuid}: {len(new_matches)} new matches, {len(known)} already analysed")
+    partial = False
+    if new_matches:
+        new_results = fetcher.process_matches(new_matches, puuid)
+        mark_partial(new_results, new_matches)
+        partial = new_results["partial"]
+        merge_into_state(state, new_results, games_to_analyze)
+        # The skipped matches are older than the newest merged one and would never be asked for
+        # again, so a partial merge is reported but not saved
+        if partial:
+            logger.warning(f"Run for {puuid} was cut short, not saving the incremental state")
+        else:
+            match_store.put_player_state(puuid, state)
+    elif trim_state(state, games_to_analyze):
+        # games_to_analyze was lowered since the last run
+        match_store.put_player_state(puuid, state)
+    results, champ_stats, lane_stats, rows = results_from_state(state)
+    # The rollups hold every match analysed so far, so the trend covers the whole history
+    results["weekly_trend"] = rollup_index.trend(puuid, "week")
+    results["new_matches"] = len(new_matches)
+    results["partial"] = partial
+    results["skipped_matches"] = new_results["skipped_matches"] if partial else 0
+    return results, champ_stats, lane_stats, rows
@@ -0,0 +1,102 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from records import record_to_list, record_from_list
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_DIR = "journal"
+# Match ID pages change as soon as the player finishes another game, so journaled pages are
+# only reused this long; fetched match records never change and are always reused
+PAGE_MAX_AGE = 6 * 3600
+
+def page_key(params):
+    return json.dumps(params, sort_keys=True)
+
+class FetchJournal:
+    # Append-only log of one analysis (one JSON object per line): every completed match ID
+    # page and every extracted match record. A run that crashes, is interrupted or gives up
+    # on some matches leaves the file behind; the next run for the same players replays it
+    # and only requests what is missing. A finished run deletes it.
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pages = {}
+        self.records = {}
+        self.resumed_pages = 0
+        self.resumed_records = 0
+        if os.path.exists(path):
+            self._load()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Line buffered, so every entry is on disk as soon as it is written
+        self.file = open(path, "a", encoding="utf-8", buffering=1)
+
+    @classmethod
+    def for_players(cls, puuids, directory=JOURNAL_DIR):
+        digest = hashlib.sha1("\n".join(sorted(puuids)).encode("utf-8")).hexdigest()[:20]
+        return cls(os.path.join(directory, f"{digest}.jsonl"))
+
+    def _load(self):
+        oldest = time.time() - PAGE_MAX_AGE
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line of a crashed run may be cut off
+                    continue
+                if "record" in entry:
+                    record = record_from_list(entry["record"])
+                    self.records[(entry["puuid"], record.match_id)] = record
+                elif "ids" in entry and entry.get("time", 0) >= oldest:
+                    self.pages[(entry["puuid"], entry["page"])] = entry["ids"]
+        if self.pages or self.records:
+            logger.info(f"Resuming from {self.path}: {len(self.pages)} ID pages, {len(self.records)} match records")
+
+    def _write(self, entry):
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self.lock:
+            if not self.file.closed:
+                self.file.write(line)
+
+    def page(self, puuid, params):
+        # Match IDs of a page listed earlier, or None. Pages with startTime (incremental
+        # runs) are never journaled, they are cheap and change all the time.
+        if "startTime" in params:
+            return None
+        ids = self.pages.get((puuid, page_key(params)))
+        if ids is not None:
+            self.resumed_pages += 1
+        return ids
+
+    def add_page(self, puuid, params, ids):
+        if "startTime" in params:
+            return
+        key = page_key(params)
+        self.pages[(puuid, key)] = ids
+        self._write({"puuid": puuid, "page": key, "ids": ids, "time": time.time()})
+
+    def record(self, puuid, match_id):
+        record = self.records.get((puuid, match_id))
+        if record is not None:
+            self.resumed_records += 1
+        return record
+
+    def add_record(self, puuid, record):
+        self.records[(puuid, record.match_id)] = record
+        self._write({"puuid": puuid, "record": record_to_list(record)})
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    def finish(self):
+        # Everything was fetched: the next run starts from scratch
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError as e:
+            logger.warning(f"Could not remove journal {self.path}: {e}")
@@ -2,25 +2,43 @@
 import os
 import sys
 import re
-import io
+import argparse
+import contextlib
 import logging
 import configparser
 from datetime import datetime
-import pandas as pd
 import colorama
 from colorama import init, Fore, Style
 
 from config import load_config, get_settings
-from analyzer import RiotAnalyzer, analyze_champion_stats, analyze_lane_performance
-from output import print_ascii_menu, print_match_table, remove_ansi_sequences
+from analyzer import (RiotAnalyzer, summarize_matches, mark_partial, set_stats_engine, summoner_cache, QUEUE_NAMES,
+                      RANKED_SOLO_QUEUE)
+from match_store import MatchStore
+from rate_limiter import rate_limiter
+from riot_api import set_api_key, set_pool_size, MATCH_HISTORY_WORKERS
+from concurrency import concurrency
+from regions import resolve_routing, is_routing_value
+from cache import configure_caches, log_cache_stats
+from telemetry import telemetry
+from incremental import analyze_incremental
+from output import print_ascii_menu, print_match_rows
+from export import TeeOutput, export_rows, parse_export_formats
+from journal import FetchJournal
+from rollups import rollup_index, ROLLUP_COLUMNS, PERIODS
+from teammates import teammate_index
 
 logger = logging.getLogger(__name__)
 
-def analyze_queue_types(name, tag, api_key, games_to_analyze):
+# Weeks shown in the trend section of the report; the exported rollups hold all of them
+TREND_WEEKS = 12
+
+def analyze_queue_types(name, tag, api_key, games_to_analyze, match_store=None, settings=None):
+    settings = settings or {}
     print(Fore.CYAN + f"Analyzing up to {games_to_analyze} games for {name}#{tag}..." + Style.RESET_ALL)
     logger.info(f"Start analysis for {name}#{tag} with {games_to_analyze} games.")
-    analyzer = RiotAnalyzer(api_key)
-    account = analyzer.get_account_by_riot_id(name, tag)
+    analyzer = create_analyzer(api_key, match_store, settings)
+    with telemetry.stage("account"):
+        account = analyzer.get_account_by_riot_id(name, tag)
     if not account:
         logger.error(f"Account not found for {name}#{tag}")
         print(Fore.RED + f"Could not find Riot account for {name}#{tag}." + Style.RESET_ALL)
@@ -30,26 +48,176 @@ def analyze_queue_types(name, tag, api_key, games_to_analyze):
     display_name = f"{game_name}#{account.get('tagLine', tag)}"
     print(Fore.GREEN + f"Account found: {display_name} (PUUID: {puuid})" + Style.RESET_ALL)
     logger.info(f"Account found: {display_name} (PUUID: {puuid})")
-    matches = analyzer.get_match_history(puuid, count=games_to_analyze)
-    if not matches:
-        logger.error("No matches found.")
-        print(Fore.RED + "No matches found." + Style.RESET_ALL)
+    fetcher = create_fetcher(analyzer, settings)
+    analyzer.journal = open_journal(settings, [puuid])
+
+    # Ranked-only mode asks the ID endpoint for queue 420 only, so no other match bodies are downloaded
+    queue = RANKED_SOLO_QUEUE if settings.get("ranked_only") else None
+    complete = False
+    try:
+        if settings.get("incremental") and match_store is not None:
+            print(Fore.YELLOW + "Fetching matches played since the last analysis..." + Style.RESET_ALL)
+            results, champ_stats, lane_stats, match_table_rows = analyze_incremental(fetcher, match_store, puuid, games_to_analyze, queue=queue)
+            if not results["fetched_matches"]:
+                logger.error("No matches found.")
+                print(Fore.RED + "No matches found." + Style.RESET_ALL)
+                return None
+            print(Fore.GREEN + f"New matches since the last analysis: {results['new_matches']}" + Style.RESET_ALL)
+        else:
+            # Match IDs are listed and their details fetched in one pipeline
+            print(Fore.YELLOW + "Processing match details (this may take a few minutes)..." + Style.RESET_ALL)
+            matches, results = fetcher.process_history(puuid, count=games_to_analyze, queue=queue)
+            if not matches:
+                logger.error("No matches found.")
+                print(Fore.RED + "No matches found." + Style.RESET_ALL)
+                return None
+            print(Fore.GREEN + f"Found Matches: {len(matches)}" + Style.RESET_ALL)
+            logger.info(f"Found Matches: {len(matches)}")
+            champ_stats = results["champion_stats"]
+            lane_stats = results["lane_stats"]
+            match_table_rows = results["match_table_rows"]
+        complete = not results.get("skipped_matches")
+    finally:
+        close_journal(analyzer.journal, complete)
+
+    if queue is not None:
+        count_game_modes(analyzer, puuid, results)
+    if settings.get("timeline_metrics"):
+        add_early_game_stats(analyzer, results)
+    results["puuid"] = puuid
+
+    print_analysis_report(display_name, games_to_analyze, results, champ_stats, lane_stats, match_table_rows)
+    return display_name, results, match_table_rows
+
+def create_analyzer(api_key, match_store, settings):
+    return RiotAnalyzer(api_key, match_store=match_store, name_ttl=settings.get("name_ttl_hours", 168) * 3600,
+                        region=settings.get("region", "europe"), platform=settings.get("platform"))
+
+def open_journal(settings, puuids):
+    # With resume enabled every fetched page and match is journaled, so an interrupted or
+    # crashed run for the same players continues where it stopped
+    if not settings.get("resume"):
         return None
-    print(Fore.GREEN + f"Found Matches: {len(matches)}" + Style.RESET_ALL)
-    logger.info(f"Found Matches: {len(matches)}")
-    print(Fore.YELLOW + "Processing match details (this may take a few minutes)..." + Style.RESET_ALL)
-    results = analyzer.process_matches(matches, puuid)
-    match_data_list = results["match_data_list"]
-    match_classification = results.get("match_classification", {})
+    journal = FetchJournal.for_players(puuids, settings.get("journal_dir", "journal"))
+    if journal.records:
+        print(Fore.YELLOW + f"Resuming an earlier run: {len(journal.records)} matches already fetched" + Style.RESET_ALL)
+    return journal
+
+def close_journal(journal, complete):
+    if journal is None:
+        return
+    if complete or not (journal.pages or journal.records):
+        journal.finish()
+        return
+    journal.close()
+    logger.info(f"Journal kept at {journal.path}")
+    print(Fore.YELLOW + "Not every match could be fetched; run the same analysis again to continue where it stopped."
+          + Style.RESET_ALL)
+
+def create_fetcher(analyzer, settings):
+    if settings.get("engine") == "asyncio":
+        # aiohttp takes a while to import, so it is only loaded for the asyncio engine
+        from async_engine import AsyncFetchEngine
+        try:
+            return AsyncFetchEngine(analyzer, concurrency=settings.get("async_concurrency", 100))
+        except RuntimeError as e:
+            logger.warning(f"{e}; falling back to the thread pool engine")
+    return analyzer
+
+def count_game_modes(analyzer, puuid, results, region=None):
+    if not results["ranked_entries"]:
+        return
+    oldest = min(entry["creation"] for entry in results["ranked_entries"].values())
+    print(Fore.YELLOW + "Counting games per queue since the oldest ranked game..." + Style.RESET_ALL)
+    with telemetry.stage("queue_counts"):
+        results["game_modes"] = analyzer.count_matches_by_queue(puuid, start_time=oldest // 1000, region=region)
+
+def analyze_batch(riot_ids, api_key, games_to_analyze, match_store=None, settings=None):
+    # Histories of team mates and duo pairs overlap heavily, so the match IDs of all players
+    # are merged and every unique match is fetched once
+    settings = settings or {}
+    analyzer = create_analyzer(api_key, match_store, settings)
+    fetcher = create_fetcher(analyzer, settings)
+    queue = RANKED_SOLO_QUEUE if settings.get("ranked_only") else None
+
+    players = []
+    for name, tag, routing in riot_ids:
+        region = resolve_routing(routing)[0] if routing else analyzer.region
+        with telemetry.stage("account"):
+            account = analyzer.get_account_by_riot_id(name, tag, region)
+        if not account:
+            logger.error(f"Account not found for {name}#{tag}")
+            print(Fore.RED + f"Could not find Riot account for {name}#{tag}." + Style.RESET_ALL)
+            continue
+        display_name = f"{account.get('gameName', name)}#{account.get('tagLine', tag)}"
+        players.append((name, display_name, account["puuid"], region))
+        print(Fore.GREEN + f"Account found: {display_name} (PUUID: {account['puuid']})" + Style.RESET_ALL)
+
+    analyzer.journal = open_journal(settings, [player[2] for player in players])
+    matches_by_puuid = {}
+    records_by_puuid = {}
+    try:
+        with telemetry.stage("match_ids"):
+            matches_by_puuid = fetcher.get_match_histories([(puuid, region) for name, display_name, puuid, region in players],
+                                                           count=games_to_analyze, queue=queue)
+        total = sum(len(matches) for matches in matches_by_puuid.values())
+        unique = len(set().union(*matches_by_puuid.values())) if matches_by_puuid else 0
+        print(Fore.GREEN + f"Found Matches: {total} across {len(players)} players, {unique} unique" + Style.RESET_ALL)
+        logger.info(f"Batch: {total} match IDs across {len(players)} players, {unique} unique")
+
+        print(Fore.YELLOW + "Processing match details (this may take a few minutes)..." + Style.RESET_ALL)
+        with telemetry.stage("match_details"):
+            records_by_puuid = fetcher.fetch_shared_match_records(matches_by_puuid)
+    finally:
+        complete = bool(records_by_puuid) and all(
+            len(records_by_puuid.get(puuid, ())) == len(matches) for puuid, matches in matches_by_puuid.items())
+        close_journal(analyzer.journal, complete)
+    with telemetry.stage("names"):
+        names = analyzer.resolve_teammate_names([r for records in records_by_puuid.values() for r in records])
 
-    champ_stats = analyze_champion_stats(match_data_list, puuid)
-    lane_stats = analyze_lane_performance(match_data_list, puuid)
+    reports = []
+    for name, display_name, puuid, region in players:
+        with telemetry.stage("analysis"):
+            results = summarize_matches(records_by_puuid[puuid], names=names)
+        mark_partial(results, matches_by_puuid[puuid])
+        if queue is not None:
+            count_game_modes(analyzer, puuid, results, region)
+        if settings.get("timeline_metrics"):
+            add_early_game_stats(analyzer, results, region)
+        results["puuid"] = puuid
+        reports.append((name, display_name, results))
+    return reports
 
+def read_riot_ids(path):
+    riot_ids = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if "#" not in line:
+                logger.warning(f"Skipping '{line}': expected Name#Tag")
+                continue
+            # Players outside the configured region are written as Name#Tag@na1 (or @americas)
+            name, tag = line.rsplit("#", 1)
+            routing = None
+            if "@" in tag:
+                tag, routing = tag.split("@", 1)
+                if not is_routing_value(routing.strip().lower()):
+                    logger.warning(f"Skipping '{line}': unknown region '{routing}'")
+                    continue
+            riot_ids.append((name.strip(), tag.strip(), routing.strip().lower() if routing else None))
+    return riot_ids
+
+def print_analysis_report(display_name, games_to_analyze, results, champ_stats, lane_stats, match_table_rows):
     print("\n" + Fore.CYAN + "===== ANALYSIS RESULTS =====" + Style.RESET_ALL)
     print(f"Player: {display_name}")
     print(f"Matches requested: {games_to_analyze}")
     print(f"Matches retrieved: {results['fetched_matches']}")
     print(f"Ranked Solo/Duo Matches (Queue 420): {results['total_ranked']}\n")
+    if results.get("partial"):
+        print(Fore.YELLOW + f"Partial report: the run was cancelled or hit its deadline, {results['skipped_matches']} "
+              "matches were skipped (ranked games are fetched first)\n" + Style.RESET_ALL)
 
     print(Fore.CYAN + "Solo Queue:" + Style.RESET_ALL)
     print(f"  Games: {results['solo_queue']}")
@@ -62,30 +230,33 @@ def analyze_queue_types(name, tag, api_key, games_to_analyze):
     else:
         print("  Not enough Duo Queue games for winrate calculation (minimum 3 required)")
 
+    if results.get("early_game"):
+        print(Fore.CYAN + "\nEarly Game vs. Lane Opponent (average difference):" + Style.RESET_ALL)
+        for party, label in (("solo", "SoloQ"), ("duo", "DuoQ")):
+            for minute, stats in sorted(results["early_game"].get(party, {}).items(), key=lambda item: int(item[0])):
+                print(f"  {label} at {minute} min ({stats['games']} games): gold {stats['gold']:+.0f}, "
+                      f"CS {stats['cs']:+.1f}, XP {stats['xp']:+.0f}")
+
+    if results.get("party_stats"):
+        print(Fore.CYAN + "\nParty Size (all queues):" + Style.RESET_ALL)
+        for size, stats in sorted(results["party_stats"].items()):
+            label = "Solo" if size == 1 else f"{size} premade players"
+            print(f"  {label}: {stats['games']} games, winrate: {stats['win_rate']:.1f}%")
+
     print(Fore.CYAN + "\nGame Mode Distribution:" + Style.RESET_ALL)
-    queue_names = {
-        400: "Normal Draft",
-        420: "Ranked Solo/Duo",
-        430: "Normal Blind",
-        440: "Ranked Flex",
-        450: "ARAM",
-        700: "Clash",
-        830: "Co-op vs AI (Intro)",
-        840: "Co-op vs AI (Beginner)",
-        850: "Co-op vs AI (Intermediate)",
-        900: "URF",
-        1020: "One for All",
-        1300: "Nexus Blitz",
-        1400: "Ultimate Spellbook",
-        1900: "URF",
-    }
     for queue_id, count in results["game_modes"].items():
-        qname = queue_names.get(queue_id, f"Queue ID {queue_id}")
+        qname = QUEUE_NAMES.get(queue_id, f"Queue ID {queue_id}")
         print(f"  {qname}: {count} games")
 
+    if results.get("weekly_trend"):
+        print(Fore.CYAN + f"\nWeekly Trend (last {TREND_WEEKS} weeks with games):" + Style.RESET_ALL)
+        for week in results["weekly_trend"][-TREND_WEEKS:]:
+            print(f"  Week of {week['bucket']}: {week['games']} games, winrate: {week['win_rate']:.1f}%")
+
     print(Fore.CYAN + "\nChampion Stats:" + Style.RESET_ALL)
     for champ, stats in sorted(champ_stats.items(), key=lambda x: x[1]["games"], reverse=True):
-        print(f"  {champ}: {stats['games']} games, winrate: {stats['win_rate']:.1f}%, KDA: {stats['kda']:.2f}")
+        print(f"  {champ}: {stats['games']} games, winrate: {stats['win_rate']:.1f}%, KDA: {stats['kda']:.2f}, "
+              f"CS/min: {stats.get('cs_per_min', 0):.1f}, damage share: {stats.get('damage_share', 0):.1f}%")
 
     print(Fore.CYAN + "\nLane Performance:" + Style.RESET_ALL)
     for lane, stats in lane_stats.items():
@@ -94,29 +265,111 @@ def analyze_queue_types(name, tag, api_key, games_to_analyze):
     print(Fore.YELLOW + "\nNote: If rate limits are reached, the retry mechanism will continue fetching data." + Style.RESET_ALL)
 
     # Print modern table with colors for console output; CSV export is handled without colors
-    match_table_rows = print_match_table(match_data_list, puuid, match_classification, colored=COLORED_CONSOLE)
-    return display_name, results, match_table_rows
+    print_match_rows(match_table_rows, colored=COLORED_CONSOLE)
 
-def main():
-    print_ascii_menu()
-    # Ensure output directories exist
-    os.makedirs("full", exist_ok=True)
-    os.makedirs("table", exist_ok=True)
-    config = load_config("apiKey.ini")
-    settings = get_settings(config)
+def add_early_game_stats(analyzer, results, region=None):
+    print(Fore.YELLOW + "Fetching match timelines of the ranked games..." + Style.RESET_ALL)
+    analyzer.add_early_game_stats(results, region)
+
+def setup(settings):
     global HEADERS
     HEADERS = {"X-Riot-Token": settings["api_key"]}
+    set_api_key(settings["api_key"])
     # Setup other global variables from settings
     global NETWORK_TIMEOUT, MAX_RETRIES, CACHE_SIZE, COLORED_CONSOLE
     NETWORK_TIMEOUT = settings["network_timeout"]
     MAX_RETRIES = settings["max_retries"]
     CACHE_SIZE = settings["cache_size"]
+    configure_caches(max_entries=CACHE_SIZE, max_bytes=settings["cache_max_mb"] * 1024 * 1024,
+                     enabled=settings["cache_enabled"])
+    # Names in memory expire like those in the match store
+    summoner_cache.ttl = settings.get("name_ttl_hours", 168) * 3600
+    rate_limiter.configure(settings["rate_limit"])
+    concurrency.configure(maximum=settings["max_concurrency"], adaptive=settings["adaptive_concurrency"])
+    set_pool_size(MATCH_HISTORY_WORKERS + concurrency.maximum)
+    set_stats_engine(settings.get("stats_engine", "python"))
     COLORED_CONSOLE = settings["colored_console"]
     if COLORED_CONSOLE:
         colorama.init(autoreset=True)
     else:
         colorama.deinit()
 
+def open_match_store(settings):
+    if not settings["store_enabled"]:
+        return None
+    try:
+        return MatchStore(settings["store_path"],
+                          max_bytes=settings["store_max_mb"] * 1024 * 1024,
+                          max_matches=settings["store_max_matches"])
+    except Exception as e:
+        logger.exception("Could not open match store, continuing without it")
+        return None
+
+def reset_memory_indexes():
+    # Without a match store the teammate index and the rollups live in memory and only serve
+    # the analysis that just ended; they are emptied so memory stays flat across analyses
+    teammate_index.reset()
+    rollup_index.reset()
+
+def close_match_store(match_store):
+    reset_memory_indexes()
+    if match_store is None:
+        return
+    # The indexes fall back to memory rather than reading a closed store
+    teammate_index.attach(None)
+    rollup_index.attach(None)
+    match_store.close()
+
+def report_telemetry(settings, safe_name, timestr, match_store=None):
+    if not settings["telemetry"] and not settings["telemetry_json"]:
+        return
+    summary = telemetry.summary(match_store)
+    if settings["telemetry"]:
+        print("\n" + Fore.CYAN + "===== TELEMETRY =====" + Style.RESET_ALL)
+        print(telemetry.format_summary(summary))
+    if settings["telemetry_json"]:
+        os.makedirs("telemetry", exist_ok=True)
+        json_filename = os.path.join("telemetry", f"{safe_name}_{timestr}.json")
+        if telemetry.write_json(json_filename, summary):
+            print(f"Telemetry saved to: {json_filename}")
+
+def save_match_table(safe_name, timestr, match_table_rows, settings):
+    if not match_table_rows:
+        print("No match table found to save.")
+        logger.warning("No match table found to save.")
+        return
+    formats = parse_export_formats(settings["export_formats"]) or ["csv"]
+    for filename in export_rows(match_table_rows, os.path.join("table", f"{safe_name}_{timestr}"), formats):
+        logger.info(f"Match table saved: {filename}")
+        print(f"Match table saved: {filename}")
+
+def save_rollups(safe_name, timestr, puuid, settings):
+    # Daily and weekly rollups of everything analysed for the player, next to the match table
+    if puuid is None:
+        return
+    formats = parse_export_formats(settings["export_formats"]) or ["csv"]
+    for period in PERIODS:
+        rows = rollup_index.export_rows(puuid, period)
+        if not rows:
+            continue
+        base_path = os.path.join("table", f"{safe_name}_{timestr}_{period}")
+        for filename in export_rows(rows, base_path, formats, columns=ROLLUP_COLUMNS):
+            logger.info(f"Rollups saved: {filename}")
+            print(f"Rollups saved: {filename}")
+
+def report_file(safe_name, timestr):
+    # The report is written to full/ while it is printed instead of being buffered first
+    return TeeOutput(os.path.join("full", f"{safe_name}_{timestr}.txt"), console=sys.stdout)
+
+def main():
+    print_ascii_menu()
+    # Ensure output directories exist
+    os.makedirs("full", exist_ok=True)
+    os.makedirs("table", exist_ok=True)
+    config = load_config("apiKey.ini")
+    settings = get_settings(config)
+    setup(settings)
+
     try:
         summoner_name = input("Enter Riot Summoner Name: ").strip()
         tag = input("Enter Riot Tag: ").strip()
@@ -134,55 +387,90 @@ def main():
     timestr = now.strftime("%Y%m%d_%H%M%S")
     safe_name = re.sub(r'\W+', '_', summoner_name)
 
-    # Capture console output
-    old_stdout = sys.stdout
-    sys.stdout = mystdout = io.StringIO()
+    match_store = open_match_store(settings)
+    telemetry.reset()
+    # Requests still waiting when the deadline passes (or after Ctrl+C) are dropped and the
+    # report is built from what has been fetched so far
+    rate_limiter.start_run(settings["deadline_seconds"] or None)
 
-    ret = analyze_queue_types(summoner_name, tag, settings["api_key"], games)
-
-    sys.stdout = old_stdout
-    analysis_text = mystdout.getvalue()
-    clean_text = remove_ansi_sequences(analysis_text)
+    report = report_file(safe_name, timestr)
+    try:
+        try:
+            with contextlib.redirect_stdout(report):
+                ret = analyze_queue_types(summoner_name, tag, settings["api_key"], games, match_store=match_store, settings=settings)
+        finally:
+            report.close()
+        if ret is not None:
+            logger.info(f"Analysis output saved to text file: {report.path}")
+            print(f"\nAnalysis output saved to text file: {report.path}")
+            display_name, results, match_table_rows = ret
+            save_match_table(safe_name, timestr, match_table_rows, settings)
+            # The rollups are read from the match store, so it is closed only after the export
+            save_rollups(safe_name, timestr, results.get("puuid"), settings)
+    finally:
+        close_match_store(match_store)
+        log_cache_stats()
 
     if ret is None:
+        with contextlib.suppress(OSError):
+            os.remove(report.path)
         print("Analysis could not be completed.")
         logger.error("Analysis could not be completed.")
+        report_telemetry(settings, safe_name, timestr, match_store)
         input("\nPress Enter to exit...")
         return
+    report_telemetry(settings, safe_name, timestr, match_store)
 
-    display_name, results, match_table_rows = ret
-
-    txt_filename = os.path.join("full", f"{safe_name}_{timestr}.txt")
-    try:
-        with open(txt_filename, "w", encoding="utf-8") as f:
-            f.write(clean_text)
-        logger.info(f"Analysis output saved to text file: {txt_filename}")
-        print(f"Analysis output saved to text file: {txt_filename}")
-    except Exception as e:
-        logger.exception("Error saving text file")
+def run_batch(players_file, games):
+    print_ascii_menu()
+    os.makedirs("full", exist_ok=True)
+    os.makedirs("table", exist_ok=True)
+    config = load_config("apiKey.ini")
+    settings = get_settings(config)
+    setup(settings)
 
-    if match_table_rows:
-        try:
-            df = pd.DataFrame(match_table_rows, columns=["GameID", "Date", "Result", "Type", "Teammates", "Playtime"])
-            csv_filename = os.path.join("table", f"{safe_name}_{timestr}.csv")
-            df.to_csv(csv_filename, index=False)
-            logger.info(f"Match table saved as CSV: {csv_filename}")
-            print(f"Match table saved as CSV: {csv_filename}")
-        except Exception as e:
-            logger.exception("Error saving CSV file")
-    else:
-        print("No match table found to save.")
-        logger.warning("No match table found to save.")
+    riot_ids = read_riot_ids(players_file)
+    if not riot_ids:
+        print(f"No Riot IDs found in {players_file}.")
+        return
+    print(Fore.CYAN + f"Analyzing up to {games} games for {len(riot_ids)} players..." + Style.RESET_ALL)
 
-    print("\n" + analysis_text)
+    match_store = open_match_store(settings)
+    telemetry.reset()
+    rate_limiter.start_run(settings["deadline_seconds"] or None)
+    timestr = datetime.now().strftime("%Y%m%d_%H%M%S")
+    try:
+        reports = analyze_batch(riot_ids, settings["api_key"], games, match_store=match_store, settings=settings)
+        for name, display_name, results in reports:
+            safe_name = re.sub(r'\W+', '_', name)
+            print()
+            with report_file(safe_name, timestr) as report, contextlib.redirect_stdout(report):
+                print_analysis_report(display_name, games, results, results["champion_stats"],
+                                      results["lane_stats"], results["match_table_rows"])
+            print(f"Analysis output saved to text file: {report.path}")
+            save_match_table(safe_name, timestr, results["match_table_rows"], settings)
+            # The rollups are read from the match store, so it is closed only after the exports
+            save_rollups(safe_name, timestr, results.get("puuid"), settings)
+    finally:
+        close_match_store(match_store)
+        log_cache_stats()
+    report_telemetry(settings, "batch", timestr, match_store)
 
 if __name__ == "__main__":
-    while True:
-        try:
-            main()
-        except Exception as e:
-            logger.exception("Unhandled exception in main")
-            print(f"Unhandled exception: {e}")
-        answer = input("\nWould you like to perform another analysis? (Y/n): ").strip().lower()
-        if answer not in ["y", ""]:
-            break
+    parser = argparse.ArgumentParser(description="Analyse SoloQ and DuoQ games")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="analyse every Riot ID in FILE (one Name#Tag per line) without prompts")
+    parser.add_argument("--games", type=int, default=500, help="number of games per player in batch mode")
+    args = parser.parse_args()
+    if args.batch:
+        run_batch(args.batch, args.games)
+    else:
+        while True:
+            try:
+                main()
+            except Exception as e:
+                logger.exception("Unhandled exception in main")
+                print(f"Unhandled exception: {e}")
+            answer = input("\nWould you like to perform another analysis? (Y/n): ").strip().lower()
+            if answer not in ["y", ""]:
+                break
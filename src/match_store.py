@@ -0,0 +1,353 @@
+import os
+import json
+import math
+import time
+import zlib
+import sqlite3
+import logging
+import threading
+from teammates import team_pairs
+from rollups import bucket_start
+
+logger = logging.getLogger(__name__)
+
+# last_access updates from get() are written in batches of this many
+ACCESS_FLUSH = 256
+# close() compacts the file (VACUUM rewrites all of it) only once this share of its pages is free
+COMPACT_FREE_SHARE = 0.25
+
+# Finished matches never change, so they can be kept across runs.
+# Payloads are stored zlib-compressed in a single SQLite file keyed by match ID.
+# max_bytes and max_matches bound the match payloads (and the timeline frames kept with
+# them); names, player states, the teammate index and the rollups are small and kept.
+class MatchStore:
+    def __init__(self, path="matches.db", max_bytes=512 * 1024 * 1024, max_matches=50000, compression_level=6):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_matches = max_matches
+        self.compression_level = compression_level
+        self.lock = threading.RLock()
+        self.accessed = {}
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        with self.lock:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS matches ("
+                " match_id TEXT PRIMARY KEY,"
+                " data BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_matches_last_access ON matches(last_access)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS player_state ("
+                " puuid TEXT PRIMARY KEY,"
+                " last_game_creation INTEGER NOT NULL,"
+                " data BLOB NOT NULL,"
+                " updated REAL NOT NULL)"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS names ("
+                " puuid TEXT PRIMARY KEY,"
+                " name TEXT NOT NULL,"
+                " updated REAL NOT NULL)"
+            )
+            # Teammate co-occurrence index (teammates.py); puuid_a < puuid_b
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS teammate_pairs ("
+                " puuid_a TEXT NOT NULL,"
+                " puuid_b TEXT NOT NULL,"
+                " games INTEGER NOT NULL,"
+                " wins INTEGER NOT NULL,"
+                " last_seen INTEGER NOT NULL,"
+                " PRIMARY KEY (puuid_a, puuid_b)) WITHOUT ROWID"
+            )
+            # Daily/weekly rollups (rollups.py) and the matches already counted in them
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS rollups ("
+                " puuid TEXT NOT NULL,"
+                " period TEXT NOT NULL,"
+                " bucket TEXT NOT NULL,"
+                " queue_id INTEGER NOT NULL,"
+                " champion TEXT NOT NULL,"
+                " lane TEXT NOT NULL,"
+                " party TEXT NOT NULL,"
+                " games INTEGER NOT NULL,"
+                " wins INTEGER NOT NULL,"
+                " kills INTEGER NOT NULL,"
+                " deaths INTEGER NOT NULL,"
+                " assists INTEGER NOT NULL,"
+                " seconds INTEGER NOT NULL,"
+                " PRIMARY KEY (puuid, period, bucket, queue_id, champion, lane, party)) WITHOUT ROWID"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS rolled_up_matches ("
+                " puuid TEXT NOT NULL,"
+                " match_id TEXT NOT NULL,"
+                " PRIMARY KEY (puuid, match_id)) WITHOUT ROWID"
+            )
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS indexed_teams ("
+                " match_id TEXT NOT NULL,"
+                " team TEXT NOT NULL,"
+                " PRIMARY KEY (match_id, team)) WITHOUT ROWID"
+            )
+            # The few frame values read from a match timeline (timelines.py); the timeline is not kept
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS timeline_frames ("
+                " match_id TEXT PRIMARY KEY,"
+                " frames TEXT NOT NULL)"
+            )
+            self.conn.commit()
+            row = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM matches").fetchone()
+        self.count, self.total_bytes = row[0], row[1]
+        logger.info(f"Match store opened at {path}: {self.count} matches, {self.total_bytes} bytes")
+
+    def __contains__(self, match_id):
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM matches WHERE match_id = ?", (match_id,)).fetchone()
+        return row is not None
+
+    def get(self, match_id, decode=json.loads):
+        # decode turns the stored raw JSON bytes into the returned value (payloads.decode_match
+        # keeps only the fields the analysis needs)
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM matches WHERE match_id = ?", (match_id,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.accessed[match_id] = time.time()
+            if len(self.accessed) >= ACCESS_FLUSH:
+                self.flush_access()
+        try:
+            return decode(zlib.decompress(row[0]))
+        except Exception as e:
+            logger.exception(f"Corrupt entry for match {match_id} in match store, dropping it")
+            self.delete(match_id)
+            return None
+
+    def put(self, match_id, match_data):
+        self.put_raw(match_id, json.dumps(match_data, separators=(",", ":")).encode("utf-8"))
+
+    def put_raw(self, match_id, raw):
+        # The response body as received, so nothing is re-serialised
+        blob = zlib.compress(raw, self.compression_level)
+        now = time.time()
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM matches WHERE match_id = ?", (match_id,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO matches (match_id, data, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (match_id, blob, len(blob), now, now),
+            )
+            self.conn.commit()
+            if old:
+                self.total_bytes -= old[0]
+            else:
+                self.count += 1
+            self.total_bytes += len(blob)
+            self.evict()
+
+    def delete(self, match_id):
+        with self.lock:
+            row = self.conn.execute("SELECT size FROM matches WHERE match_id = ?", (match_id,)).fetchone()
+            if row is None:
+                return
+            self.conn.execute("DELETE FROM matches WHERE match_id = ?", (match_id,))
+            self.conn.commit()
+            self.count -= 1
+            self.total_bytes -= row[0]
+
+    def get_player_state(self, puuid):
+        with self.lock:
+            row = self.conn.execute("SELECT data FROM player_state WHERE puuid = ?", (puuid,)).fetchone()
+        if row is None:
+            return None
+        try:
+            return json.loads(zlib.decompress(row[0]))
+        except Exception as e:
+            logger.exception(f"Corrupt player state for {puuid}, starting from scratch")
+            return None
+
+    def put_player_state(self, puuid, state):
+        blob = zlib.compress(json.dumps(state, separators=(",", ":")).encode("utf-8"), self.compression_level)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO player_state (puuid, last_game_creation, data, updated) VALUES (?, ?, ?, ?)",
+                (puuid, state.get("last_game_creation", 0), blob, time.time()),
+            )
+            self.conn.commit()
+
+    def get_names(self, puuids, ttl):
+        puuids = list(puuids)
+        names = {}
+        oldest = time.time() - ttl
+        with self.lock:
+            # Stay below SQLite's limit on bound parameters
+            for i in range(0, len(puuids), 500):
+                chunk = puuids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT puuid, name FROM names WHERE updated >= ? AND puuid IN ({placeholders})",
+                    [oldest] + chunk,
+                ).fetchall()
+                names.update(rows)
+        return names
+
+    def put_names(self, names):
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO names (puuid, name, updated) VALUES (?, ?, ?)",
+                [(puuid, name, now) for puuid, name in names.items()],
+            )
+            self.conn.commit()
+
+    def get_timeline_frames(self, match_id):
+        with self.lock:
+            row = self.conn.execute("SELECT frames FROM timeline_frames WHERE match_id = ?", (match_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def put_timeline_frames(self, match_id, frames):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO timeline_frames (match_id, frames) VALUES (?, ?)",
+                              (match_id, json.dumps(frames, separators=(",", ":"))))
+            self.conn.commit()
+
+    def add_teams(self, teams):
+        # teams: (match_id, puuids, win, creation); a team already in the index is skipped
+        added = 0
+        with self.lock:
+            for match_id, puuids, win, creation in teams:
+                cursor = self.conn.execute("INSERT OR IGNORE INTO indexed_teams (match_id, team) VALUES (?, ?)",
+                                           (match_id, min(puuids)))
+                if cursor.rowcount != 1:
+                    continue
+                added += 1
+                self.conn.executemany(
+                    "INSERT INTO teammate_pairs (puuid_a, puuid_b, games, wins, last_seen) VALUES (?, ?, 1, ?, ?)"
+                    " ON CONFLICT (puuid_a, puuid_b) DO UPDATE SET games = games + 1, wins = wins + excluded.wins,"
+                    " last_seen = MAX(last_seen, excluded.last_seen)",
+                    [(a, b, 1 if win else 0, creation) for a, b in team_pairs(puuids)],
+                )
+            self.conn.commit()
+        return added
+
+    def pair_games(self, puuids):
+        puuids = sorted(set(puuids))
+        placeholders = ",".join("?" * len(puuids))
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT puuid_a, puuid_b, games FROM teammate_pairs"
+                f" WHERE puuid_a IN ({placeholders}) AND puuid_b IN ({placeholders})",
+                puuids + puuids,
+            ).fetchall()
+        return {(a, b): games for a, b, games in rows}
+
+    def add_rollups(self, facts, periods):
+        # facts: see rollups.rollup_fact; a match already rolled up for the player is skipped
+        added = 0
+        with self.lock:
+            for puuid, match_id, creation, dimensions, measures in facts:
+                cursor = self.conn.execute("INSERT OR IGNORE INTO rolled_up_matches (puuid, match_id) VALUES (?, ?)",
+                                           (puuid, match_id))
+                if cursor.rowcount != 1:
+                    continue
+                added += 1
+                self.conn.executemany(
+                    "INSERT INTO rollups (puuid, period, bucket, queue_id, champion, lane, party,"
+                    " games, wins, kills, deaths, assists, seconds) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (puuid, period, bucket, queue_id, champion, lane, party) DO UPDATE SET"
+                    " games = games + excluded.games, wins = wins + excluded.wins, kills = kills + excluded.kills,"
+                    " deaths = deaths + excluded.deaths, assists = assists + excluded.assists,"
+                    " seconds = seconds + excluded.seconds",
+                    [(puuid, period, bucket_start(creation, period)) + tuple(dimensions) + tuple(measures)
+                     for period in periods],
+                )
+            self.conn.commit()
+        return added
+
+    def rollup_rows(self, puuid, period, since=None):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT bucket, queue_id, champion, lane, party, games, wins, kills, deaths, assists, seconds"
+                " FROM rollups WHERE puuid = ? AND period = ? AND bucket >= ? ORDER BY bucket, queue_id, champion, lane, party",
+                (puuid, period, since or ""),
+            ).fetchall()
+        return [(row[0], row[1:5], row[5:]) for row in rows]
+
+    def flush_access(self):
+        with self.lock:
+            if not self.accessed:
+                return
+            self.conn.executemany("UPDATE matches SET last_access = ? WHERE match_id = ?",
+                                  [(accessed, match_id) for match_id, accessed in self.accessed.items()])
+            self.conn.commit()
+            self.accessed = {}
+
+    def evict(self):
+        # Least recently used matches go first, in chunks sized from the overshoot (in bytes,
+        # at the average match size) so a large overshoot is cleared quickly
+        with self.lock:
+            if self.count == 0 or (self.total_bytes <= self.max_bytes and self.count <= self.max_matches):
+                return 0
+            self.flush_access()
+            removed = 0
+            while self.count > 0 and (self.total_bytes > self.max_bytes or self.count > self.max_matches):
+                average = max(self.total_bytes / self.count, 1)
+                over = max(self.count - self.max_matches, math.ceil((self.total_bytes - self.max_bytes) / average), 1)
+                rows = self.conn.execute(
+                    "SELECT match_id, size FROM matches ORDER BY last_access ASC LIMIT ?", (min(over, 500),)
+                ).fetchall()
+                if not rows:
+                    break
+                self.conn.executemany("DELETE FROM matches WHERE match_id = ?", [(r[0],) for r in rows])
+                self.conn.executemany("DELETE FROM timeline_frames WHERE match_id = ?", [(r[0],) for r in rows])
+                self.count -= len(rows)
+                self.total_bytes -= sum(r[1] for r in rows)
+                removed += len(rows)
+            self.conn.commit()
+            logger.info(f"Evicted {removed} matches from match store ({self.count} left, {self.total_bytes} bytes)")
+        return removed
+
+    def free_share(self):
+        # Share of the file's pages that eviction freed and SQLite has not reused yet
+        with self.lock:
+            pages = self.conn.execute("PRAGMA page_count").fetchone()[0]
+            free = self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return free / pages if pages else 0.0
+
+    def compact(self):
+        # Give pages freed by eviction back to the file system
+        with self.lock:
+            self.evict()
+            self.conn.execute("VACUUM")
+        logger.info(f"Match store compacted: {self.count} matches, {self.total_bytes} bytes")
+
+    def stats(self):
+        with self.lock:
+            file_size = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+            return {
+                "matches": self.count,
+                "bytes": self.total_bytes,
+                "file_bytes": file_size,
+                "max_bytes": self.max_bytes,
+                "max_matches": self.max_matches,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def close(self):
+        with self.lock:
+            self.flush_access()
+            # Freed pages are reused by later inserts; the file is only rewritten once a
+            # large part of it is free
+            if self.free_share() > COMPACT_FREE_SHARE:
+                self.compact()
+            self.conn.close()
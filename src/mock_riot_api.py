@@ -0,0 +1,383 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+logger = logging.getLogger(__name__)
+
+# Stand-in for the Riot API that serves synthetic (or recorded) account, match ID and
+# match-v5 payloads, so benchmark.py can measure the fetch pipeline without an API key.
+# URLs look like http://127.0.0.1:<port>/<region>/lol/match/v5/..., which is what
+# riot_api.api_url() produces after set_api_base_url("http://127.0.0.1:<port>/{region}").
+
+MOCK_PUUID_PREFIX = "mock-puuid-"
+QUEUE_WEIGHTS = [(420, 0.7), (440, 0.15), (450, 0.1), (400, 0.05)]
+CHAMPIONS = ["Ahri", "Garen", "Lux", "Jinx", "LeeSin", "Thresh", "Ezreal", "Yasuo", "Leona", "Darius",
+             "Kaisa", "Sylas", "Viego", "Nami", "Orianna", "Sett", "Vayne", "Zed", "Lulu", "Graves"]
+POSITIONS = ["TOP", "JUNGLE", "MIDDLE", "BOTTOM", "UTILITY"]
+# Platform prefix of the match IDs listed in each regional cluster
+REGION_PLATFORMS = {"europe": "EUW1", "americas": "NA1", "asia": "KR", "sea": "OC1"}
+
+DEFAULT_MOCK_CONFIG = {
+    # Matches available per player
+    "games": 500,
+    # Size of the pool teammates are drawn from; large pools mean many unique names to resolve
+    "teammate_pool": 30,
+    # Whether participants carry riotIdGameName/riotIdTagline (if not, every name needs a lookup)
+    "named_participants": True,
+    # Filler stats per participant, roughly the size of a real match-v5 document
+    "challenge_fields": 120,
+    "latency": 0.02,
+    "latency_jitter": 0.01,
+    # Probability of a random 429 (X-Rate-Limit-Type: service) and of a 500/503
+    "error_rate_429": 0.0,
+    "error_rate_5xx": 0.0,
+    "retry_after": 1,
+    # Advertised and enforced limits; an empty value disables the headers
+    "app_rate_limit": "500:10,30000:600",
+    "method_rate_limit": "2000:10",
+    # Directory with recorded <match_id>.json payloads that take precedence over synthetic ones
+    "fixtures_dir": None,
+    "seed": 1,
+}
+
+def parse_limit_header(value):
+    limits = []
+    for part in (value or "").split(","):
+        if part.strip():
+            count, seconds = part.strip().split(":")
+            limits.append((int(count), int(seconds)))
+    return limits
+
+class FixedWindows:
+    # Counts requests in fixed windows like the real API does
+    def __init__(self, limits):
+        self.limits = limits
+        self.windows = {seconds: [0.0, 0] for count, seconds in limits}
+
+    def hit(self, now):
+        # Returns (counts header, seconds until the exceeded window resets or 0)
+        retry_after = 0
+        for count, seconds in self.limits:
+            window = self.windows[seconds]
+            if now - window[0] >= seconds:
+                window[0] = now
+                window[1] = 0
+            window[1] += 1
+            if window[1] > count:
+                retry_after = max(retry_after, int(window[0] + seconds - now) + 1)
+        counts = ",".join(f"{self.windows[s][1]}:{s}" for c, s in self.limits)
+        return counts, retry_after
+
+class MockRiotData:
+    def __init__(self, config):
+        self.config = config
+        self.match_ids = {}
+        self.match_index = {}
+        self.fixtures = {}
+        # Only there for the payload size, so every participant shares the same values
+        filler = random.Random(config["seed"])
+        self.challenges = {f"challenge{i}": filler.random() * 100 for i in range(config["challenge_fields"])}
+        self.champion_stats = {f"stat{i}": filler.randrange(1000) for i in range(25)}
+        fixtures_dir = config.get("fixtures_dir")
+        if fixtures_dir and os.path.isdir(fixtures_dir):
+            for filename in os.listdir(fixtures_dir):
+                if filename.endswith(".json"):
+                    self.fixtures[filename[:-5]] = os.path.join(fixtures_dir, filename)
+
+    def account(self, puuid=None, game_name=None, tag_line="MOCK"):
+        if puuid is None:
+            puuid = MOCK_PUUID_PREFIX + game_name.lower()
+        if game_name is None:
+            game_name = puuid.replace(MOCK_PUUID_PREFIX, "Player")
+        return {"puuid": puuid, "gameName": game_name, "tagLine": tag_line}
+
+    def _history(self, puuid, region="europe"):
+        # Newest first, one game every ~40 minutes going back from a fixed point in time.
+        # Match IDs carry the platform of the region they were listed in (EUW1_, NA1_, ...)
+        history = self.match_ids.get((puuid, region))
+        if history is None:
+            platform = REGION_PLATFORMS.get(region, "EUW1")
+            rng = random.Random(f"{self.config['seed']}-{puuid}")
+            base = 7000000000 + rng.randrange(1000000)
+            now_ms = 1700000000000
+            history = []
+            for i in range(self.config["games"]):
+                queue_id = rng.choices([q for q, w in QUEUE_WEIGHTS], [w for q, w in QUEUE_WEIGHTS])[0]
+                entry = (f"{platform}_{base - i}", now_ms - i * 2400000, queue_id)
+                history.append(entry)
+                self.match_index[entry[0]] = (puuid, entry, region)
+            self.match_ids[(puuid, region)] = history
+        return history
+
+    def match_id_page(self, puuid, params, region="europe"):
+        start = int(params.get("start", 0))
+        count = min(int(params.get("count", 20)), 100)
+        queue = params.get("queue")
+        start_time = params.get("startTime")
+        history = self._history(puuid, region)
+        if queue is not None:
+            history = [h for h in history if h[2] == int(queue)]
+        if start_time is not None:
+            history = [h for h in history if h[1] >= int(start_time) * 1000]
+        return [match_id for match_id, creation, queue_id in history[start:start + count]]
+
+    def match(self, match_id, region=None):
+        path = self.fixtures.get(match_id)
+        if path is not None:
+            with open(path, "rb") as f:
+                return f.read()
+        owner, entry, match_region = self.match_index.get(match_id, (None, None, None))
+        # Like the real API, a match is only found on the cluster of its platform
+        if owner is None or (region is not None and region != match_region):
+            return None
+        creation, queue_id = entry[1], entry[2]
+        rng = random.Random(f"{self.config['seed']}-{match_id}")
+        pool = self.config["teammate_pool"]
+        teammates = rng.sample(range(pool), 4) if pool >= 4 else [rng.randrange(1 << 30) for _ in range(4)]
+        team = [owner] + [f"{MOCK_PUUID_PREFIX}mate{t}" for t in teammates]
+        enemies = [f"{MOCK_PUUID_PREFIX}enemy{rng.randrange(1 << 30)}" for _ in range(5)]
+        win = rng.random() < 0.5
+        participants = []
+        for team_id, puuids, team_win in ((100, team, win), (200, enemies, not win)):
+            for position, puuid in zip(POSITIONS, puuids):
+                participant = {
+                    "participantId": len(participants) + 1,
+                    "puuid": puuid,
+                    "teamId": team_id,
+                    "win": team_win,
+                    "championName": rng.choice(CHAMPIONS),
+                    "individualPosition": position,
+                    "teamPosition": position,
+                    "kills": rng.randrange(15),
+                    "deaths": rng.randrange(12),
+                    "assists": rng.randrange(20),
+                    "totalMinionsKilled": rng.randrange(40, 260),
+                    "neutralMinionsKilled": rng.randrange(0, 120),
+                    "goldEarned": rng.randrange(6000, 18000),
+                    "totalDamageDealtToChampions": rng.randrange(5000, 45000),
+                    "summonerName": "",
+                    "challenges": self.challenges,
+                }
+                if self.config["named_participants"]:
+                    participant["riotIdGameName"] = puuid.replace(MOCK_PUUID_PREFIX, "Player")
+                    participant["riotIdTagline"] = "MOCK"
+                participants.append(participant)
+        match = {
+            "metadata": {"matchId": match_id, "participants": team + enemies},
+            "info": {
+                "gameCreation": creation,
+                "gameDuration": rng.randrange(900, 2400),
+                "queueId": queue_id,
+                "platformId": match_id.split("_")[0],
+                "participants": participants,
+            },
+        }
+        return json.dumps(match).encode("utf-8")
+
+    def timeline(self, match_id, region=None):
+        path = self.fixtures.get(f"{match_id}_timeline")
+        if path is not None:
+            with open(path, "rb") as f:
+                return f.read()
+        match = self.match(match_id, region)
+        if match is None:
+            return None
+        info = json.loads(match)["info"]
+        rng = random.Random(f"{self.config['seed']}-{match_id}-timeline")
+        # Per-minute income of every participant; jungle/support farm mostly monsters/nothing
+        rates = {p["participantId"]: (rng.uniform(300, 450), rng.uniform(5, 9), rng.uniform(350, 500),
+                                      p["individualPosition"]) for p in info["participants"]}
+        frames = []
+        for minute in range(info["gameDuration"] // 60 + 1):
+            participant_frames = {}
+            for participant_id, (gold, cs, xp, position) in rates.items():
+                farm = int(cs * minute * rng.uniform(0.9, 1.1))
+                participant_frames[str(participant_id)] = {
+                    "participantId": participant_id,
+                    "totalGold": 500 + int(gold * minute * rng.uniform(0.9, 1.1)),
+                    "currentGold": rng.randrange(1500),
+                    "xp": int(xp * minute * rng.uniform(0.9, 1.1)),
+                    "level": min(18, 1 + minute // 2),
+                    "minionsKilled": 0 if position in ("JUNGLE", "UTILITY") else farm,
+                    "jungleMinionsKilled": farm if position == "JUNGLE" else 0,
+                    "position": {"x": rng.randrange(15000), "y": rng.randrange(15000)},
+                    "championStats": self.champion_stats,
+                }
+            # Roughly as many events per minute as a real game, only there for the payload size
+            events = [{"type": "ITEM_PURCHASED", "timestamp": minute * 60000 + i, "participantId": 1 + i % 10,
+                       "itemId": 1000 + i} for i in range(25)]
+            frames.append({"timestamp": minute * 60000 + rng.randrange(50), "participantFrames": participant_frames,
+                           "events": events})
+        timeline = {
+            "metadata": {"matchId": match_id, "participants": [p["puuid"] for p in info["participants"]]},
+            "info": {
+                "frameInterval": 60000,
+                "frames": frames,
+                "participants": [{"participantId": p["participantId"], "puuid": p["puuid"]}
+                                 for p in info["participants"]],
+            },
+        }
+        return json.dumps(timeline).encode("utf-8")
+
+class MockRiotHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        parsed = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        parts = [p for p in parsed.path.split("/") if p]
+        if parts[:2] == ["_mock", "stats"]:
+            with server.lock:
+                body = json.dumps(server.stats).encode("utf-8")
+            return self._send(200, body)
+        if parts[:2] == ["_mock", "reset"]:
+            with server.lock:
+                server.reset_stats()
+            return self._send(200, b"{}")
+
+        config = server.config
+        delay = config["latency"] + random.uniform(0, config["latency_jitter"])
+        if delay > 0:
+            time.sleep(delay)
+        region = parts[0]
+        method = "/".join(parts[1:5])
+        headers = {}
+        with server.lock:
+            server.stats["requests"] += 1
+            now = time.monotonic()
+            # Every region has its own rate limits, as on the real API
+            app_windows = server.app_windows.setdefault(region, FixedWindows(server.app_limits))
+            app_counts, app_retry = app_windows.hit(now)
+            method_windows = server.method_windows.setdefault((region, method), FixedWindows(server.method_limits))
+            method_counts, method_retry = method_windows.hit(now)
+            if config["app_rate_limit"]:
+                headers["X-App-Rate-Limit"] = config["app_rate_limit"]
+                headers["X-App-Rate-Limit-Count"] = app_counts
+            if config["method_rate_limit"]:
+                headers["X-Method-Rate-Limit"] = config["method_rate_limit"]
+                headers["X-Method-Rate-Limit-Count"] = method_counts
+            if app_retry or method_retry:
+                server.stats["429"] += 1
+                headers["Retry-After"] = str(max(app_retry, method_retry))
+                headers["X-Rate-Limit-Type"] = "application" if app_retry else "method"
+                return self._send(429, b'{"status": {"status_code": 429}}', headers)
+            if random.random() < config["error_rate_429"]:
+                server.stats["429"] += 1
+                headers = {"Retry-After": str(config["retry_after"]), "X-Rate-Limit-Type": "service"}
+                return self._send(429, b'{"status": {"status_code": 429}}', headers)
+            if random.random() < config["error_rate_5xx"]:
+                server.stats["5xx"] += 1
+                return self._send(random.choice((500, 503)), b'{"status": {"status_code": 500}}', headers)
+
+        body = self._route(server.data, region, parts[1:], params)
+        if body is None:
+            with server.lock:
+                server.stats["404"] += 1
+            return self._send(404, b'{"status": {"status_code": 404}}', headers)
+        with server.lock:
+            server.stats["bytes"] += len(body)
+        self._send(200, body, headers)
+
+    def _route(self, data, region, parts, params):
+        with self.server.lock:
+            if parts[:5] == ["riot", "account", "v1", "accounts", "by-riot-id"] and len(parts) == 7:
+                return json.dumps(data.account(game_name=parts[5], tag_line=parts[6])).encode("utf-8")
+            if parts[:5] == ["riot", "account", "v1", "accounts", "by-puuid"] and len(parts) == 6:
+                return json.dumps(data.account(puuid=parts[5])).encode("utf-8")
+            if parts[:5] == ["lol", "summoner", "v4", "summoners", "by-name"] and len(parts) == 6:
+                return json.dumps(data.account(game_name=parts[5])).encode("utf-8")
+            if parts[:5] == ["lol", "match", "v5", "matches", "by-puuid"] and len(parts) == 7 and parts[6] == "ids":
+                return json.dumps(data.match_id_page(parts[5], params, region)).encode("utf-8")
+            if parts[:4] == ["lol", "match", "v5", "matches"] and len(parts) == 5:
+                return data.match(parts[4], region)
+            if parts[:4] == ["lol", "match", "v5", "matches"] and len(parts) == 6 and parts[5] == "timeline":
+                return data.timeline(parts[4], region)
+        return None
+
+    def _send(self, status, body, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+class MockRiotServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        super().__init__((host, port), MockRiotHandler)
+        self.config = dict(DEFAULT_MOCK_CONFIG, **(config or {}))
+        self.lock = threading.Lock()
+        self.data = MockRiotData(self.config)
+        self.app_limits = parse_limit_header(self.config["app_rate_limit"])
+        self.app_windows = {}
+        self.method_limits = parse_limit_header(self.config["method_rate_limit"])
+        self.method_windows = {}
+        random.seed(self.config["seed"])
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.stats = {"requests": 0, "429": 0, "5xx": 0, "404": 0, "bytes": 0}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/{{region}}"
+
+def _serve(config, port_queue):
+    server = MockRiotServer(config)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+class MockServerProcess:
+    # Runs the mock server in its own process so it does not compete with the client
+    # for the GIL and the measured numbers only reflect the client
+    def __init__(self, config=None):
+        self.config = config
+        self.process = None
+        self.port = None
+
+    def __enter__(self):
+        port_queue = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=_serve, args=(self.config, port_queue), daemon=True)
+        self.process.start()
+        self.port = port_queue.get(timeout=10)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.join(5)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}/{{region}}"
+
+    def stats(self):
+        import requests
+        return requests.get(f"http://127.0.0.1:{self.port}/_mock/stats", timeout=5).json()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Local stand-in for the Riot API")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--config", help="JSON file overriding DEFAULT_MOCK_CONFIG")
+    args = parser.parse_args()
+    config = {}
+    if args.config:
+        with open(args.config, encoding="utf-8") as f:
+            config = json.load(f)
+    server = MockRiotServer(config, port=args.port)
+    print(f"Mock Riot API listening on http://127.0.0.1:{args.port} (base URL {server.base_url})")
+    server.serve_forever()
@@ -11,28 +11,25 @@ def format_playtime(seconds):
     sec = seconds % 60
     return f"{minutes}m {sec}s" if seconds else "N/A"
 
-def print_match_table(match_data_list, puuid, match_classification, colored=True):
-    ranked_matches = [m for m in match_data_list if m["info"].get("queueId") == 420 and "metadata" in m]
-    ranked_matches = sorted(ranked_matches, key=lambda m: m["info"].get("gameCreation", 0), reverse=True)
-    rows = []
-    for match in ranked_matches:
-        match_id = match["metadata"].get("matchId", "UNKNOWN")
-        ts = match["info"].get("gameCreation", 0) / 1000.0
-        date_str = time.strftime("%Y-%m-%d", time.localtime(ts))
-        participant = next((p for p in match["info"]["participants"] if p["puuid"] == puuid), None)
-        result = "Win" if participant and participant.get("win", False) else "Lose"
-        typ = match_classification.get(match_id, "N/A")
-        my_team = next((p["teamId"] for p in match["info"]["participants"] if p["puuid"] == puuid), None)
-        teammates = [
-            p.get("summonerName") or p.get("puuid")
-            for p in match["info"]["participants"]
-            if p["teamId"] == my_team and p["puuid"] != puuid
-        ]
-        teammates_str = ", ".join(teammates)
-        duration = match["info"].get("gameDuration", 0)
-        playtime = format_playtime(duration)
-        rows.append([match_id, date_str, result, typ, teammates_str, playtime])
-    
+def print_match_table(match_records, match_classification, colored=True):
+    rows = build_match_table_rows(match_records, match_classification)
+    return print_match_rows(rows, colored=colored)
+
+def build_match_table_rows(match_records, match_classification):
+    ranked_matches = [r for r in match_records if r.is_ranked_solo]
+    ranked_matches = sorted(ranked_matches, key=lambda r: r.creation, reverse=True)
+    return [match_table_row(record, match_classification.get(record.match_id, "N/A")) for record in ranked_matches]
+
+def match_table_row(record, typ):
+    ts = record.creation / 1000.0
+    date_str = time.strftime("%Y-%m-%d", time.localtime(ts))
+    result = "Win" if record.tracked and record.win else "Lose"
+    teammates = [name or teammate_puuid for teammate_puuid, name in record.teammates()]
+    teammates_str = ", ".join(teammates)
+    playtime = format_playtime(record.duration)
+    return [record.match_id, date_str, result, typ, teammates_str, playtime]
+
+def print_match_rows(rows, colored=True):
     if not rows:
         print("\nNo ranked matches found.")
         return rows
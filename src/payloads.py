@@ -0,0 +1,48 @@
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# The fields of a match-v5 document the analysis reads. A document is 100 KB+ of JSON
+# (items, runes, challenges, pings, ...), of which only these are kept once it is decoded;
+# the raw bytes stay in the match store, so further fields can be decoded from there later.
+MATCH_INFO_FIELDS = ("queueId", "gameCreation", "gameDuration")
+PARTICIPANT_FIELDS = ("puuid", "teamId", "championName", "individualPosition", "kills", "deaths", "assists", "win",
+                      "summonerName", "riotIdGameName", "riotIdTagline", "totalMinionsKilled", "neutralMinionsKilled",
+                      "totalDamageDealtToChampions", "participantId", "teamPosition")
+# Rough in-memory size of a slim match, for the byte budget of the match cache
+SLIM_MATCH_BYTES = 500
+SLIM_PARTICIPANT_BYTES = 750
+
+def loads(data):
+    # orjson parses bytes several times faster than the json module and is used when installed
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def slim_match(match_data):
+    info = match_data.get("info")
+    if not isinstance(info, dict):
+        return match_data
+    slim_info = {key: info[key] for key in MATCH_INFO_FIELDS if key in info}
+    slim_info["participants"] = [
+        {key: participant[key] for key in PARTICIPANT_FIELDS if key in participant}
+        for participant in info.get("participants", [])
+    ]
+    slim = {"info": slim_info}
+    match_id = match_data.get("metadata", {}).get("matchId")
+    if match_id is not None:
+        slim["metadata"] = {"matchId": match_id}
+    return slim
+
+def decode_match(raw):
+    # raw match-v5 bytes -> dict with only the fields above
+    return slim_match(loads(raw))
+
+def slim_size(match_data):
+    return SLIM_MATCH_BYTES + SLIM_PARTICIPANT_BYTES * len(match_data.get("info", {}).get("participants", ()))
@@ -0,0 +1,262 @@
+import re
+import time
+import asyncio
+import logging
+import bisect
+import threading
+from collections import deque
+from urllib.parse import urlparse
+from regions import is_routing_value
+
+logger = logging.getLogger(__name__)
+
+# Limits of a development key, used until the first response tells us the real ones
+DEFAULT_APP_LIMITS = "20:1,100:120"
+
+# Riot counts requests in fixed windows. Keeping a log of our own send times per window
+# guarantees that no interval of that length ever holds more than the limit.
+SAFETY_MARGIN = 0.05
+
+METHOD_PATTERNS = [
+    (re.compile(r"/riot/account/v1/accounts/by-riot-id/"), "account-v1.by-riot-id"),
+    (re.compile(r"/riot/account/v1/accounts/by-puuid/"), "account-v1.by-puuid"),
+    (re.compile(r"/lol/match/v5/matches/by-puuid/[^/]+/ids"), "match-v5.ids"),
+    (re.compile(r"/lol/match/v5/matches/[^/]+/timeline"), "match-v5.timeline"),
+    (re.compile(r"/lol/match/v5/matches/[^/]+$"), "match-v5.match"),
+    (re.compile(r"/lol/summoner/v4/summoners/by-name/"), "summoner-v4.by-name"),
+    (re.compile(r"/lol/summoner/v4/summoners/by-puuid/"), "summoner-v4.by-puuid"),
+]
+
+class RequestCancelled(Exception):
+    # Raised by acquire() once the run was cancelled or ran past its deadline
+    pass
+
+def parse_limits(value):
+    limits = []
+    if not value:
+        return limits
+    for part in value.split(","):
+        try:
+            count, seconds = part.strip().split(":")
+            limits.append((int(count), int(seconds)))
+        except ValueError:
+            logger.warning(f"Could not parse rate limit entry '{part}'")
+    return limits
+
+def routing_key(url):
+    parsed = urlparse(url)
+    host = parsed.hostname or ""
+    path = parsed.path
+    if host.endswith(".api.riotgames.com"):
+        region = host.split(".")[0]
+    else:
+        # Local mock (benchmark.py): the routing value is the first path segment
+        first = path.split("/")[1] if path.count("/") > 1 else ""
+        region = first if is_routing_value(first) else host
+    method = None
+    for pattern, name in METHOD_PATTERNS:
+        if pattern.search(path):
+            method = name
+            break
+    if method is None:
+        method = "/".join(path.split("/")[:5])
+    return region, method
+
+class RateWindow:
+    def __init__(self, limit, seconds):
+        self.limit = limit
+        self.seconds = seconds
+        self.sent = deque()
+
+    def _purge(self, now):
+        while self.sent and self.sent[0] <= now - self.seconds:
+            self.sent.popleft()
+
+    def wait_time(self, now):
+        self._purge(now)
+        if len(self.sent) < self.limit:
+            return 0.0
+        return self.sent[len(self.sent) - self.limit] + self.seconds - now + SAFETY_MARGIN
+
+    def take(self, now):
+        self.sent.append(now)
+
+    def sync(self, count, sent_at, now):
+        # The server saw more requests than we sent up to this one (e.g. another process
+        # shares the key), so account for the difference at the time this request was sent
+        self._purge(now)
+        if sent_at <= now - self.seconds:
+            return
+        ours = bisect.bisect_right(self.sent, sent_at)
+        for _ in range(min(count, self.limit) - ours):
+            self.sent.insert(ours, sent_at)
+
+class RateBucket:
+    def __init__(self, name, limits=None):
+        self.name = name
+        self.windows = {}
+        self.blocked_until = 0.0
+        if limits:
+            self.set_limits(limits)
+
+    def limits(self):
+        return sorted((w.limit, s) for s, w in self.windows.items())
+
+    def set_limits(self, limits):
+        if sorted(limits) == self.limits():
+            return
+        windows = {}
+        for limit, seconds in limits:
+            window = self.windows.get(seconds) or RateWindow(limit, seconds)
+            window.limit = limit
+            windows[seconds] = window
+        self.windows = windows
+        logger.info(f"Rate limits for {self.name}: {', '.join(f'{l}:{s}' for l, s in limits)}")
+
+    def wait_time(self, now):
+        wait = max(self.blocked_until - now, 0.0)
+        for window in self.windows.values():
+            wait = max(wait, window.wait_time(now))
+        return wait
+
+    def take(self, now):
+        for window in self.windows.values():
+            window.take(now)
+
+    def sync(self, counts, sent_at, now):
+        for count, seconds in counts:
+            window = self.windows.get(seconds)
+            if window is not None:
+                window.sync(count, sent_at, now)
+
+class RateLimiter:
+    def __init__(self, default_app_limits=DEFAULT_APP_LIMITS):
+        self.lock = threading.Lock()
+        self.default_app_limits = parse_limits(default_app_limits)
+        self.app_buckets = {}
+        self.method_buckets = {}
+        self.total_wait = 0.0
+        self.cancel_event = threading.Event()
+        self.deadline = None
+
+    def configure(self, default_app_limits):
+        with self.lock:
+            self.default_app_limits = parse_limits(default_app_limits)
+            for bucket in self.app_buckets.values():
+                bucket.set_limits(self.default_app_limits)
+
+    def reset(self):
+        # Forget all learned limits, send logs and pauses (used between benchmark runs)
+        with self.lock:
+            self.app_buckets.clear()
+            self.method_buckets.clear()
+            self.total_wait = 0.0
+        self.start_run()
+
+    def start_run(self, deadline=None):
+        # deadline: seconds from now after which no further request is sent (None = no limit)
+        self.cancel_event.clear()
+        self.deadline = time.monotonic() + deadline if deadline else None
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def cancelled(self):
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel_event.set()
+        return self.cancel_event.is_set()
+
+    def _sleep_time(self, wait):
+        # Never sleep past the deadline, so a waiting request notices it in time
+        if self.deadline is not None:
+            wait = min(wait, max(self.deadline - time.monotonic(), 0.0))
+        return wait
+
+    def _buckets(self, region, method):
+        app = self.app_buckets.get(region)
+        if app is None:
+            app = self.app_buckets[region] = RateBucket(f"{region} app", self.default_app_limits)
+        key = (region, method)
+        meth = self.method_buckets.get(key)
+        if meth is None:
+            meth = self.method_buckets[key] = RateBucket(f"{region} {method}")
+        return app, meth
+
+    def sustained_rate(self, url):
+        # Requests per second the tightest known limit for this URL allows in the long run
+        region, method = routing_key(url)
+        with self.lock:
+            rates = [w.limit / w.seconds for bucket in self._buckets(region, method) for w in bucket.windows.values()]
+        return min(rates) if rates else None
+
+    def try_acquire(self, url):
+        # Returns (0, send time) after taking a slot, or (seconds to wait, None)
+        region, method = routing_key(url)
+        with self.lock:
+            now = time.monotonic()
+            buckets = self._buckets(region, method)
+            wait = max(b.wait_time(now) for b in buckets)
+            if wait > 0:
+                return wait, None
+            for bucket in buckets:
+                bucket.take(now)
+            return 0.0, now
+
+    def acquire(self, url):
+        waited = 0.0
+        while True:
+            if self.cancelled():
+                self._add_wait(waited)
+                raise RequestCancelled(url)
+            wait, sent_at = self.try_acquire(url)
+            if sent_at is not None:
+                self._add_wait(waited)
+                return sent_at
+            wait = self._sleep_time(wait)
+            self.cancel_event.wait(wait)
+            waited += wait
+
+    async def acquire_async(self, url):
+        waited = 0.0
+        while True:
+            if self.cancelled():
+                self._add_wait(waited)
+                raise RequestCancelled(url)
+            wait, sent_at = self.try_acquire(url)
+            if sent_at is not None:
+                self._add_wait(waited)
+                return sent_at
+            wait = self._sleep_time(wait)
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def _add_wait(self, waited):
+        if waited:
+            with self.lock:
+                self.total_wait += waited
+
+    def update(self, url, status_code, headers, sent_at):
+        region, method = routing_key(url)
+        now = time.monotonic()
+        with self.lock:
+            app, meth = self._buckets(region, method)
+            app_limits = parse_limits(headers.get("X-App-Rate-Limit"))
+            if app_limits:
+                app.set_limits(app_limits)
+            app.sync(parse_limits(headers.get("X-App-Rate-Limit-Count")), sent_at, now)
+            method_limits = parse_limits(headers.get("X-Method-Rate-Limit"))
+            if method_limits:
+                meth.set_limits(method_limits)
+            meth.sync(parse_limits(headers.get("X-Method-Rate-Limit-Count")), sent_at, now)
+            if status_code == 429:
+                try:
+                    retry_after = float(headers.get("Retry-After", 1))
+                except ValueError:
+                    retry_after = 1.0
+                limit_type = headers.get("X-Rate-Limit-Type", "")
+                bucket = app if limit_type == "application" else meth
+                bucket.blocked_until = max(bucket.blocked_until, now + retry_after)
+                logger.warning(f"429 ({limit_type or 'unknown'}) for {region} {method}, pausing for {retry_after}s")
+
+# Shared by every thread in the process
+rate_limiter = RateLimiter()
@@ -0,0 +1,114 @@
+import itertools
+
+RANKED_SOLO_QUEUE = 420
+
+# Everything the analysis needs from one match-v5 document (often 100 KB+), extracted as
+# soon as the payload arrives so the full JSON can be dropped right away
+class MatchRecord:
+    __slots__ = ("match_id", "queue_id", "creation", "duration", "tracked", "champion", "position",
+                 "kills", "deaths", "assists", "win", "team_puuids", "team_names", "puuid", "cs", "damage",
+                 "team_damage", "participant_id", "opponent_id")
+
+    def __init__(self, match_id, queue_id, creation, duration):
+        self.match_id = match_id
+        self.queue_id = queue_id
+        self.creation = creation
+        self.duration = duration
+        # False if the tracked player was not found among the participants
+        self.tracked = False
+        self.champion = None
+        self.position = None
+        self.kills = 0
+        self.deaths = 0
+        self.assists = 0
+        self.win = False
+        self.team_puuids = ()
+        self.team_names = ()
+        # The tracked player
+        self.puuid = None
+        # Minions and monsters killed; damage to champions of the player and of the whole team
+        self.cs = 0
+        self.damage = 0
+        self.team_damage = 0
+        # Participant IDs of the player and of the lane opponent (None if there is no single
+        # one), as used by the match timeline
+        self.participant_id = None
+        self.opponent_id = None
+
+    @property
+    def is_ranked_solo(self):
+        return self.queue_id == RANKED_SOLO_QUEUE
+
+    def teammates(self):
+        # (puuid, name from the payload or None) for every other player on the tracked player's team
+        return zip(self.team_puuids, self.team_names)
+
+    def __repr__(self):
+        return f"MatchRecord({self.match_id}, queue={self.queue_id}, champion={self.champion}, win={self.win})"
+
+def record_to_list(record):
+    # Compact JSON form (field order of __slots__), used by the fetch journal
+    return [getattr(record, name) for name in MatchRecord.__slots__]
+
+def record_from_list(values):
+    record = MatchRecord.__new__(MatchRecord)
+    # Lists written before a field was added are shorter; the missing fields stay None
+    for name, value in itertools.zip_longest(MatchRecord.__slots__, values):
+        setattr(record, name, value)
+    record.team_puuids = tuple(record.team_puuids or ())
+    record.team_names = tuple(record.team_names or ())
+    for name in ("cs", "damage", "team_damage"):
+        if getattr(record, name) is None:
+            setattr(record, name, 0)
+    return record
+
+def payload_riot_id(participant):
+    # Riot ID as the account API would format it, if the payload already contains it
+    game_name = participant.get("riotIdGameName")
+    tag_line = participant.get("riotIdTagline")
+    if game_name and tag_line:
+        return f"{game_name}#{tag_line}"
+    return None
+
+def participant_id(participants, participant):
+    # participantId is the position in the participant list, counted from 1
+    return participant.get("participantId") or participants.index(participant) + 1
+
+def lane_opponent(participants, participant):
+    position = participant.get("teamPosition") or participant.get("individualPosition")
+    if not position or position in ("NONE", "Invalid"):
+        return None
+    opponents = [p for p in participants if p["teamId"] != participant["teamId"]
+                 and (p.get("teamPosition") or p.get("individualPosition")) == position]
+    return opponents[0] if len(opponents) == 1 else None
+
+def extract_record(match_data, puuid, match_id=None):
+    info = match_data["info"]
+    if match_id is None:
+        match_id = match_data.get("metadata", {}).get("matchId", "UNKNOWN")
+    record = MatchRecord(match_id, info.get("queueId", 0), info.get("gameCreation", 0), info.get("gameDuration", 0))
+    record.puuid = puuid
+    participants = info.get("participants", [])
+    # Index the participants once; every later lookup works on the record
+    by_puuid = {p["puuid"]: p for p in participants}
+    participant = by_puuid.get(puuid)
+    if participant is None:
+        return record
+    record.tracked = True
+    record.champion = participant.get("championName", "Unknown")
+    record.position = participant.get("individualPosition", "UNKNOWN")
+    record.kills = participant.get("kills", 0)
+    record.deaths = participant.get("deaths", 0)
+    record.assists = participant.get("assists", 0)
+    record.win = participant.get("win", False)
+    record.cs = participant.get("totalMinionsKilled", 0) + participant.get("neutralMinionsKilled", 0)
+    record.damage = participant.get("totalDamageDealtToChampions", 0)
+    team = [p for p in participants if p["teamId"] == participant["teamId"] and p["puuid"] != puuid]
+    record.team_damage = record.damage + sum(p.get("totalDamageDealtToChampions", 0) for p in team)
+    record.participant_id = participant_id(participants, participant)
+    opponent = lane_opponent(participants, participant)
+    if opponent is not None:
+        record.opponent_id = participant_id(participants, opponent)
+    record.team_puuids = tuple(p["puuid"] for p in team)
+    record.team_names = tuple(p.get("summonerName") or payload_riot_id(p) for p in team)
+    return record
@@ -0,0 +1,60 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Platform routing values (summoner-v4, league-v4, ...) and the regional cluster that serves
+# account-v1 and match-v5 for them. Match IDs start with the upper-case platform ("EUW1_...").
+PLATFORM_REGIONS = {
+    "euw1": "europe",
+    "eun1": "europe",
+    "tr1": "europe",
+    "ru": "europe",
+    "me1": "europe",
+    "na1": "americas",
+    "br1": "americas",
+    "la1": "americas",
+    "la2": "americas",
+    "kr": "asia",
+    "jp1": "asia",
+    "oc1": "sea",
+    "ph2": "sea",
+    "sg2": "sea",
+    "th2": "sea",
+    "tw2": "sea",
+    "vn2": "sea",
+}
+REGIONS = ("americas", "asia", "europe", "sea")
+# Platform assumed when only a regional value is configured
+DEFAULT_PLATFORMS = {"europe": "euw1", "americas": "na1", "asia": "kr", "sea": "oc1"}
+# account-v1 is served by americas, asia and europe only; accounts are global, so any of
+# them can be asked, and the nearest one is used
+ACCOUNT_REGIONS = {"europe": "europe", "americas": "americas", "asia": "asia", "sea": "asia"}
+
+def is_routing_value(value):
+    return value in PLATFORM_REGIONS or value in REGIONS
+
+def resolve_routing(value, platform=None):
+    # value may be a regional value (europe) or a platform (euw1); returns (region, platform)
+    value = (value or "europe").strip().lower()
+    platform = (platform or "").strip().lower() or None
+    if value in PLATFORM_REGIONS:
+        return PLATFORM_REGIONS[value], platform or value
+    if value not in REGIONS:
+        logger.warning(f"Unknown region '{value}', using europe")
+        value = "europe"
+    if platform is not None and PLATFORM_REGIONS.get(platform) != value:
+        logger.warning(f"Platform '{platform}' does not belong to {value}, using {DEFAULT_PLATFORMS[value]}")
+        platform = None
+    return value, platform or DEFAULT_PLATFORMS[value]
+
+def platform_of_match(match_id):
+    platform = match_id.split("_", 1)[0].lower() if "_" in match_id else None
+    return platform if platform in PLATFORM_REGIONS else None
+
+def match_region(match_id, default="europe"):
+    # match-v5 has to be asked on the cluster of the platform the game was played on
+    platform = platform_of_match(match_id)
+    return PLATFORM_REGIONS[platform] if platform is not None else default
+
+def account_region(region):
+    return ACCOUNT_REGIONS.get(region, "europe")
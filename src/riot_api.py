@@ -1,38 +1,125 @@
 import time
 import requests
 import logging
-from functools import lru_cache
+import threading
+import concurrent.futures
+from requests.adapters import HTTPAdapter
+from rate_limiter import rate_limiter, RequestCancelled
+from cache import BoundedCache, inflight
+from telemetry import telemetry
+from concurrency import concurrency
+from regions import PLATFORM_REGIONS, REGIONS, account_region
 
 logger = logging.getLogger(__name__)
 
 # Globale Header (werden in main.py gesetzt)
 HEADERS = {}
 
-def safe_get(url, headers, params=None, max_retries=5, timeout=10):
+# {region} is replaced by the routing value (europe, euw1, ...). benchmark.py points this
+# at a local mock server
+API_BASE_URL = "https://{region}.api.riotgames.com"
+
+# How long a resolved PUUID -> Riot ID mapping in the match store stays valid
+NAME_TTL = 7 * 24 * 3600
+# How long a PUUID whose name could not be resolved is not asked for again
+FAILED_NAME_TTL = 3600
+
+# Worker threads of the executors in analyzer.py. There are as many detail workers as the
+# concurrency controller (concurrency.py) may allow at most; it decides how many of them
+# have a request in flight at any moment. The connection pool is sized to match.
+MATCH_HISTORY_WORKERS = 5
+# Match IDs per detail worker the ID pages may run ahead in the pipelined fetch
+PIPELINE_QUEUE_PER_WORKER = 4
+
+# Order in which the pipeline works through its queue when the rate budget is the bottleneck
+# (lower runs first). Under a deadline the most useful part of the report is fetched first.
+PRIORITY_RANKED = 1  # Ranked Solo/Duo match details, newest first
+PRIORITY_NAMES = 2   # Teammate names needed for the duo classification
+PRIORITY_OTHER = 3   # Other match details, only used for the game mode distribution
+PRIORITY_STOP = 9
+
+# One adapter (and therefore one keep-alive connection pool per host) is shared by all
+# threads. Each thread gets its own Session on top of it, because Session objects
+# themselves are not guaranteed to be thread-safe. Every routing host keeps its own pool,
+# so requests to one region never wait for connections to another.
+POOL_HOSTS = len(REGIONS) + len(PLATFORM_REGIONS)
+_adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=MATCH_HISTORY_WORKERS + concurrency.maximum,
+                       pool_block=True)
+_local = threading.local()
+
+def detail_workers():
+    return concurrency.maximum
+
+def set_pool_size(maxsize):
+    # Only affects sessions created afterwards, so this is called from setup() before any request
+    global _adapter
+    _adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=maxsize, pool_block=True)
+
+def set_api_key(api_key):
+    HEADERS["X-Riot-Token"] = api_key
+
+def set_api_base_url(base_url):
+    global API_BASE_URL
+    API_BASE_URL = base_url
+
+def api_url(region, path):
+    return API_BASE_URL.format(region=region) + path
+
+def get_session():
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        session.mount("https://", _adapter)
+        session.mount("http://", _adapter)
+        session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+        _local.session = session
+    return session
+
+def safe_get(url, headers, params=None, max_retries=5, timeout=10, stream=False):
+    # Every request goes through the shared rate limiter, which spaces requests out
+    # ahead of time based on Riot's rate-limit headers and pauses after a 429
     attempt = 0
     wait_time = 1
+    response = None
     while attempt < max_retries:
         try:
-            response = requests.get(url, headers=headers, params=params, timeout=timeout)
+            with concurrency.slot(url):
+                queued_at = time.monotonic()
+                sent_at = rate_limiter.acquire(url)
+                telemetry.record_sleep(url, sent_at - queued_at, "limiter")
+                response = get_session().get(url, headers=headers, params=params, timeout=timeout, stream=stream)
+                latency = time.monotonic() - sent_at
+                telemetry.record_request(url, latency, response.status_code)
+                rate_limiter.update(url, response.status_code, response.headers, sent_at)
+                concurrency.observe(url, latency, response.status_code)
             if response.status_code == 429:
-                retry_after = response.headers.get("Retry-After")
-                if retry_after:
-                    wait_time = int(retry_after)
-                logger.warning(f"Rate limit hit at {url}. Waiting {wait_time} seconds...")
-                time.sleep(wait_time)
+                logger.warning(f"Rate limit hit at {url}. Retrying once the rate limiter allows it...")
+                telemetry.record_retry(url, "429")
+                if stream:
+                    response.close()
                 attempt += 1
-                wait_time *= 2
             else:
                 return response
+        except RequestCancelled:
+            logger.info(f"Not requesting {url}: the run was cancelled or reached its deadline")
+            return None
         except Exception as e:
             logger.exception(f"Exception in safe_get for URL {url}: {e}")
+            telemetry.record_retry(url, "timeout" if isinstance(e, requests.Timeout) else "error")
+            if isinstance(e, requests.Timeout):
+                concurrency.observe(url, None, "timeout")
+            telemetry.record_sleep(url, wait_time, "backoff")
             time.sleep(wait_time)
             attempt += 1
             wait_time *= 2
     return response
 
-@lru_cache(maxsize=1024)
+api_response_cache = BoundedCache("api_response")
+
 def cached_api_request(url, params_str="", headers=HEADERS):
+    cached = api_response_cache.get((url, params_str))
+    if cached is not None:
+        return cached
     params = {}
     if params_str:
         try:
@@ -42,28 +129,38 @@ def cached_api_request(url, params_str="", headers=HEADERS):
         except Exception as e:
             logger.exception("Error parsing params_str")
     response = safe_get(url, headers=headers, params=params)
-    time.sleep(0.1)
+    if response is None:
+        return None
     if response.status_code == 200:
-        return response.json()
+        data = response.json()
+        api_response_cache.set((url, params_str), data, size=len(response.content))
+        return data
     else:
         logger.error(f"Error with request {url}: {response.status_code}")
         return None
 
-def get_duo_partner_full_name(summoner_name, region="euw"):
+def get_duo_partner_full_name(summoner_name, platform="euw1"):
     # duo_partner_cache wird im analyzer-Modul verwaltet
     from analyzer import duo_partner_cache
-    if summoner_name in duo_partner_cache:
-        return duo_partner_cache[summoner_name]
+    cached = duo_partner_cache.get(summoner_name)
+    if cached is not None:
+        return cached
     try:
-        url = f"https://euw1.api.riotgames.com/lol/summoner/v4/summoners/by-name/{summoner_name}"
+        url = api_url(platform, f"/lol/summoner/v4/summoners/by-name/{summoner_name}")
         token = HEADERS.get("X-Riot-Token")
         response = safe_get(url, headers={"X-Riot-Token": token})
+        if response is None:
+            # Cancelled (deadline or Ctrl+C): not a failed lookup
+            return summoner_name
         if response.status_code == 200:
             data = response.json()
             puuid = data.get("puuid")
             if puuid:
-                url2 = f"https://europe.api.riotgames.com/riot/account/v1/accounts/by-puuid/{puuid}"
+                url2 = api_url(account_region(PLATFORM_REGIONS.get(platform, "europe")),
+                               f"/riot/account/v1/accounts/by-puuid/{puuid}")
                 response2 = safe_get(url2, headers={"X-Riot-Token": token})
+                if response2 is None:
+                    return summoner_name
                 if response2.status_code == 200:
                     data2 = response2.json()
                     full_name = f"{data2.get('gameName', summoner_name)}#{data2.get('tagLine', 'UNKNOWN')}"
@@ -74,20 +171,73 @@ def get_duo_partner_full_name(summoner_name, region="euw"):
     duo_partner_cache[summoner_name] = summoner_name
     return summoner_name
 
-def get_summoner_full_name_by_puuid(puuid):
+def get_summoner_full_name_by_puuid(puuid, region="europe"):
+    return inflight.do(("name", puuid), _get_summoner_full_name_by_puuid, puuid, region)
+
+def _get_summoner_full_name_by_puuid(puuid, region):
     # summoner_cache wird im analyzer-Modul verwaltet
-    from analyzer import summoner_cache
-    if puuid in summoner_cache:
-        return summoner_cache[puuid]
+    from analyzer import summoner_cache, failed_name_cache
+    cached = summoner_cache.get(puuid)
+    if cached is not None:
+        return cached
+    if puuid in failed_name_cache:
+        return puuid
     try:
-        url = f"https://europe.api.riotgames.com/riot/account/v1/accounts/by-puuid/{puuid}"
+        url = api_url(account_region(region), f"/riot/account/v1/accounts/by-puuid/{puuid}")
         token = HEADERS.get("X-Riot-Token")
         response = safe_get(url, headers={"X-Riot-Token": token})
+        if response is None:
+            # Cancelled (deadline or Ctrl+C): not a failed lookup
+            return puuid
         if response.status_code == 200:
-            data = response.json()
-            full_name = f"{data.get('gameName', 'UNKNOWN')}#{data.get('tagLine', 'UNKNOWN')}"
+            full_name = riot_id_from_account(response.json())
             summoner_cache[puuid] = full_name
             return full_name
     except Exception as e:
         logger.exception(f"Error in get_summoner_full_name_by_puuid for {puuid}")
+    failed_name_cache[puuid] = True
     return puuid
+
+def riot_id_from_account(data):
+    return f"{data.get('gameName', 'UNKNOWN')}#{data.get('tagLine', 'UNKNOWN')}"
+
+def known_summoner_names(puuids, name_store=None, ttl=NAME_TTL):
+    # {puuid: name} for the PUUIDs in the in-memory cache or in the name table of the match
+    # store; names found in the store are loaded into the cache on the way
+    from analyzer import summoner_cache
+    names = {}
+    for puuid in set(puuids):
+        name = summoner_cache.get(puuid)
+        if name is not None:
+            names[puuid] = name
+    if name_store is not None:
+        stored = name_store.get_names(set(puuids) - names.keys(), ttl)
+        summoner_cache.update(stored)
+        names.update(stored)
+    return names
+
+def missing_summoner_names(puuids, name_store=None, ttl=NAME_TTL, known=None):
+    # PUUIDs with no known name that have not failed to resolve recently
+    from analyzer import failed_name_cache
+    known = known if known is not None else known_summoner_names(puuids, name_store, ttl)
+    return {p for p in puuids if p not in known and p not in failed_name_cache}
+
+def resolve_summoner_names(puuids, name_store=None, ttl=NAME_TTL, max_workers=None, region="europe"):
+    # Resolves each unique PUUID once: in-memory cache first, then the persistent
+    # name table of the match store, then the account API concurrently. Returns the
+    # names found; PUUIDs that could not be resolved are left out.
+    names = known_summoner_names(puuids, name_store, ttl)
+    missing = missing_summoner_names(puuids, known=names)
+    if not missing:
+        return names
+    logger.info(f"Resolving {len(missing)} teammate names via the account API")
+    resolved = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or detail_workers()) as executor:
+        found = executor.map(lambda puuid: get_summoner_full_name_by_puuid(puuid, region), missing)
+        for puuid, name in zip(missing, found):
+            if name != puuid:
+                resolved[puuid] = name
+    if name_store is not None and resolved:
+        name_store.put_names(resolved)
+    names.update(resolved)
+    return names
@@ -0,0 +1,92 @@
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+logger = logging.getLogger(__name__)
+
+PERIODS = ("day", "week")
+DIMENSIONS = ("queue_id", "champion", "lane", "party")
+MEASURES = ("games", "wins", "kills", "deaths", "assists", "seconds")
+ROLLUP_COLUMNS = ["Period", "Bucket", "Queue", "Champion", "Lane", "Party", "Games", "Wins", "Kills", "Deaths",
+                  "Assists", "Minutes", "Winrate"]
+
+def bucket_start(creation_ms, period):
+    # Buckets are named by their first day (UTC); weeks start on Monday
+    day = datetime.fromtimestamp(creation_ms / 1000, tz=timezone.utc).date()
+    if period == "week":
+        day -= timedelta(days=day.weekday())
+    return day.isoformat()
+
+def rollup_fact(record, lane, party):
+    # One analysed match of one player: (puuid, match_id, creation, dimensions, measures)
+    dimensions = (record.queue_id, record.champion or "Unknown", lane or "NONE", party)
+    measures = (1, 1 if record.win else 0, record.kills, record.deaths, record.assists, record.duration)
+    return record.puuid, record.match_id, record.creation, dimensions, measures
+
+def rollup_row(period, bucket, dimensions, measures):
+    games, wins, kills, deaths, assists, seconds = measures
+    return [period, bucket, *dimensions, games, wins, kills, deaths, assists, round(seconds / 60, 1),
+            round(wins / games * 100, 1) if games else 0.0]
+
+class RollupIndex:
+    # Daily and weekly totals per player x queue x champion x lane x party (solo, duo,
+    # premade), updated as matches are analysed. Trend and window queries read the buckets
+    # instead of the matches. Kept in the match store when there is one, in memory otherwise;
+    # a match is rolled up once per player, however often it is analysed.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.match_store = None
+        self.buckets = {}
+        self.rolled_up = set()
+
+    def attach(self, match_store):
+        self.match_store = match_store
+
+    def reset(self):
+        # Empties the in-memory buckets (the ones used without a match store)
+        with self.lock:
+            self.buckets = {}
+            self.rolled_up = set()
+
+    def add(self, facts):
+        if self.match_store is not None:
+            return self.match_store.add_rollups(facts, PERIODS)
+        added = 0
+        with self.lock:
+            for puuid, match_id, creation, dimensions, measures in facts:
+                if (puuid, match_id) in self.rolled_up:
+                    continue
+                self.rolled_up.add((puuid, match_id))
+                added += 1
+                for period in PERIODS:
+                    key = (puuid, period, bucket_start(creation, period)) + dimensions
+                    totals = self.buckets.get(key)
+                    self.buckets[key] = list(measures) if totals is None else [a + b for a, b in zip(totals, measures)]
+        return added
+
+    def rows(self, puuid, period="week", since=None):
+        # [(bucket, dimensions, measures)] in bucket order; since is a bucket name (YYYY-MM-DD)
+        if self.match_store is not None:
+            return self.match_store.rollup_rows(puuid, period, since)
+        with self.lock:
+            rows = [(key[2], key[3:], tuple(measures)) for key, measures in self.buckets.items()
+                    if key[0] == puuid and key[1] == period and (since is None or key[2] >= since)]
+        return sorted(rows, key=lambda row: (row[0],) + tuple(str(value) for value in row[1]))
+
+    def trend(self, puuid, period="week", since=None, **filters):
+        # Games, wins and winrate per bucket, optionally for one queue_id/champion/lane/party only
+        totals = {}
+        for bucket, dimensions, measures in self.rows(puuid, period, since):
+            if any(dimensions[DIMENSIONS.index(name)] != value for name, value in filters.items()):
+                continue
+            games, wins = totals.get(bucket, (0, 0))
+            totals[bucket] = (games + measures[0], wins + measures[1])
+        return [{"bucket": bucket, "games": games, "wins": wins, "win_rate": wins / games * 100 if games else 0}
+                for bucket, (games, wins) in sorted(totals.items())]
+
+    def export_rows(self, puuid, period="week", since=None):
+        return [rollup_row(period, bucket, dimensions, measures)
+                for bucket, dimensions, measures in self.rows(puuid, period, since)]
+
+# Shared by every analysis in the process; RiotAnalyzer attaches its match store
+rollup_index = RollupIndex()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+import json
+import logging
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import load_config, get_settings
+from analyzer import RANKED_SOLO_QUEUE
+from rate_limiter import rate_limiter
+from regions import resolve_routing, is_routing_value
+from cache import inflight, log_cache_stats
+from telemetry import telemetry
+from incremental import analyze_incremental
+from rollups import rollup_index, PERIODS, DIMENSIONS
+from main import (setup, open_match_store, close_match_store, reset_memory_indexes, create_analyzer, create_fetcher,
+                  count_game_modes)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GAMES = 100
+# Parts of the analysis results an /analyze response carries. The match records, the raw
+# ranked entries and the party size of every match are internal to the analysis.
+RESPONSE_FIELDS = ("solo_queue", "solo_wins", "solo_total", "solo_win_ratio", "duo_queue", "duo_wins", "duo_total",
+                   "duo_win_ratio", "total_ranked", "duo_partner_stats", "duo_partner_ratios", "match_classification",
+                   "party_stats", "game_modes", "champion_stats", "lane_stats", "match_table_rows", "weekly_trend",
+                   "early_game", "fetched_matches", "new_matches", "skipped_matches", "partial")
+
+class AnalysisService:
+    # Long-running counterpart of main(): one analyzer, match store, cache set and connection
+    # pool serve every analysis, so they stay warm between requests. Several analyses run at
+    # once (up to max_analyses); an analysis that is already running is not started a second
+    # time, and fetches two analyses have in common are sent once (cache.inflight).
+    def __init__(self, settings):
+        self.settings = settings
+        self.match_store = open_match_store(settings)
+        self.analyzer = create_analyzer(settings["api_key"], self.match_store, settings)
+        self.slots = threading.BoundedSemaphore(max(settings["service_max_analyses"], 1))
+        self.lock = threading.Lock()
+        self.running = 0
+        self.completed = 0
+        # The deadline is shared by the whole process, so the service never sets one
+        rate_limiter.start_run()
+
+    def analyze(self, name, tag, games, routing=None, timeline=None):
+        region = resolve_routing(routing)[0] if routing else self.analyzer.region
+        if timeline is None:
+            timeline = self.settings.get("timeline_metrics", False)
+        key = ("analysis", name.lower(), tag.lower(), games, region, timeline)
+        return inflight.do(key, self._analyze, name, tag, games, region, timeline)
+
+    def _analyze(self, name, tag, games, region, timeline=False):
+        with self.slots:
+            with self.lock:
+                self.running += 1
+            try:
+                return self._run_analysis(name, tag, games, region, timeline)
+            finally:
+                with self.lock:
+                    self.running -= 1
+                    self.completed += 1
+                    if self.running == 0 and self.match_store is None:
+                        reset_memory_indexes()
+
+    def _run_analysis(self, name, tag, games, region, timeline=False):
+        logger.info(f"Analysis of {name}#{tag} ({games} games, {region}) started")
+        account = self.analyzer.get_account_by_riot_id(name, tag, region)
+        if not account:
+            return None
+        puuid = account["puuid"]
+        fetcher = create_fetcher(self.analyzer, self.settings)
+        queue = RANKED_SOLO_QUEUE if self.settings.get("ranked_only") else None
+        # The incremental state only follows the configured region (see analyze_incremental)
+        if self.settings.get("incremental") and self.match_store is not None and region == self.analyzer.region:
+            results, champ_stats, lane_stats, match_table_rows = analyze_incremental(
+                fetcher, self.match_store, puuid, games, queue=queue)
+            results = dict(results, champion_stats=champ_stats, lane_stats=lane_stats,
+                           match_table_rows=match_table_rows)
+        else:
+            matches, results = fetcher.process_history(puuid, count=games, region=region, queue=queue)
+        if queue is not None:
+            count_game_modes(self.analyzer, puuid, results, region)
+        if timeline:
+            self.analyzer.add_early_game_stats(results, region)
+        logger.info(f"Analysis of {name}#{tag} finished: {results.get('fetched_matches', 0)} matches")
+        return {
+            "riot_id": f"{account.get('gameName', name)}#{account.get('tagLine', tag)}",
+            "puuid": puuid,
+            "region": region,
+            "games": games,
+            "results": {field: results[field] for field in RESPONSE_FIELDS if field in results},
+        }
+
+    def trend(self, name, tag, period="week", since=None, **filters):
+        # Reads the rollups only: covers every match analysed so far, however many there are
+        account = self.analyzer.get_account_by_riot_id(name, tag)
+        if not account:
+            return None
+        puuid = account["puuid"]
+        return {
+            "riot_id": f"{account.get('gameName', name)}#{account.get('tagLine', tag)}",
+            "puuid": puuid,
+            "period": period,
+            "since": since,
+            "filters": filters,
+            "trend": rollup_index.trend(puuid, period, since, **filters),
+        }
+
+    def status(self):
+        with self.lock:
+            running, completed = self.running, self.completed
+        return {
+            "running": running,
+            "completed": completed,
+            "max_analyses": self.settings["service_max_analyses"],
+            "telemetry": telemetry.summary(self.match_store),
+        }
+
+    def close(self):
+        close_match_store(self.match_store)
+        log_cache_stats()
+
+class AnalysisHandler(BaseHTTPRequestHandler):
+    # GET /analyze?riot_id=Name%23Tag[&games=100][&region=na1][&timeline=1] -> analysis results as JSON
+    # GET /trend?riot_id=Name%23Tag[&period=week][&since=2024-01-01][&queue_id=420][&champion=..][&lane=..][&party=duo]
+    #     -> games and winrate per day/week from the rollups, without fetching anything
+    # GET /status -> running analyses, coalesced fetches and the telemetry summary
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} {format % args}")
+
+    def do_GET(self):
+        service = self.server.service
+        parsed = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+        if parsed.path == "/status":
+            return self._send(200, service.status())
+        if parsed.path not in ("/analyze", "/trend"):
+            return self._send(404, {"error": "Unknown path, use /analyze?riot_id=Name%23Tag, /trend or /status"})
+        riot_id = params.get("riot_id", "").strip()
+        if "#" not in riot_id:
+            return self._send(400, {"error": "riot_id must be given as Name#Tag (URL-encoded: Name%23Tag)"})
+        name, tag = riot_id.rsplit("#", 1)
+        if parsed.path == "/trend":
+            return self._trend(service, riot_id, name, tag, params)
+        routing = params.get("region", "").strip().lower() or None
+        if routing is not None and not is_routing_value(routing):
+            return self._send(400, {"error": f"Unknown region '{routing}'"})
+        try:
+            games = int(params.get("games", DEFAULT_GAMES))
+        except ValueError:
+            games = 0
+        if games < 1:
+            return self._send(400, {"error": "games must be a positive number"})
+        timeline = params.get("timeline", "").strip().lower()
+        timeline = timeline in ("1", "true", "yes") if timeline else None
+        try:
+            report = service.analyze(name, tag, games, routing, timeline)
+        except Exception as e:
+            logger.exception(f"Analysis of {riot_id} failed")
+            return self._send(500, {"error": str(e)})
+        if report is None:
+            return self._send(404, {"error": f"Could not find Riot account for {riot_id}"})
+        self._send(200, report)
+
+    def _trend(self, service, riot_id, name, tag, params):
+        period = params.get("period", "week")
+        if period not in PERIODS:
+            return self._send(400, {"error": f"period must be one of {', '.join(PERIODS)}"})
+        filters = {name: params[name] for name in DIMENSIONS if params.get(name)}
+        if "queue_id" in filters:
+            if not filters["queue_id"].isdigit():
+                return self._send(400, {"error": "queue_id must be a number"})
+            filters["queue_id"] = int(filters["queue_id"])
+        try:
+            report = service.trend(name, tag, period, params.get("since") or None, **filters)
+        except Exception as e:
+            logger.exception(f"Trend of {riot_id} failed")
+            return self._send(500, {"error": str(e)})
+        if report is None:
+            return self._send(404, {"error": f"Could not find Riot account for {riot_id}"})
+        self._send(200, report)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class AnalysisServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, service, host="127.0.0.1", port=8000):
+        super().__init__((host, port), AnalysisHandler)
+        self.service = service
+
+def serve(settings, host=None, port=None):
+    setup(settings)
+    service = AnalysisService(settings)
+    server = AnalysisServer(service, host or settings["service_host"], port or settings["service_port"])
+    host, port = server.server_address[:2]
+    print(f"Analysis service listening on http://{host}:{port} (GET /analyze?riot_id=Name%23Tag, GET /trend, GET /status)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve SoloQ/DuoQ analyses as JSON over HTTP")
+    parser.add_argument("--host", help="address to listen on (default: [Service] host)")
+    parser.add_argument("--port", type=int, help="port to listen on (default: [Service] port)")
+    parser.add_argument("--log-level", default="INFO")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    serve(get_settings(load_config("apiKey.ini")), args.host, args.port)
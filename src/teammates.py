@@ -0,0 +1,79 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Two players count as premade once they were on the same team this often
+MIN_GAMES_TOGETHER = 2
+
+def pair_key(a, b):
+    return (a, b) if a < b else (b, a)
+
+def team_pairs(puuids):
+    puuids = sorted(puuids)
+    return [(a, b) for i, a in enumerate(puuids) for b in puuids[i + 1:]]
+
+class TeammateIndex:
+    # PUUID pair -> games together, wins together, last game together, over every team of
+    # every analysed player. It lives in the match store when there is one (and so grows
+    # across runs and players), in memory otherwise. Each team of a match is counted once,
+    # however often the match is analysed again.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.match_store = None
+        self.pairs = {}
+        self.teams = set()
+
+    def attach(self, match_store):
+        self.match_store = match_store
+
+    def reset(self):
+        # Empties the in-memory index (the one used without a match store)
+        with self.lock:
+            self.pairs = {}
+            self.teams = set()
+
+    def add_teams(self, teams):
+        # teams: (match_id, puuids, win, creation) for each team
+        if self.match_store is not None:
+            return self.match_store.add_teams(teams)
+        added = 0
+        with self.lock:
+            for match_id, puuids, win, creation in teams:
+                team = (match_id, min(puuids))
+                if team in self.teams:
+                    continue
+                self.teams.add(team)
+                added += 1
+                for pair in team_pairs(puuids):
+                    stats = self.pairs.setdefault(pair, [0, 0, 0])
+                    stats[0] += 1
+                    stats[1] += 1 if win else 0
+                    stats[2] = max(stats[2], creation)
+        return added
+
+    def games_together(self, puuids):
+        # {pair_key(a, b): games} for the pairs among puuids that were ever on a team together
+        if self.match_store is not None:
+            return self.match_store.pair_games(puuids)
+        with self.lock:
+            return {pair: self.pairs[pair][0] for pair in team_pairs(puuids) if pair in self.pairs}
+
+    def party(self, puuid, teammate_puuids):
+        # Teammates premade with the player: everyone who played at least MIN_GAMES_TOGETHER
+        # games with the player or with someone already in the party
+        games = self.games_together([puuid] + list(teammate_puuids))
+        party = [puuid]
+        rest = list(teammate_puuids)
+        grew = True
+        while grew:
+            grew = False
+            for teammate in list(rest):
+                if any(games.get(pair_key(member, teammate), 0) >= MIN_GAMES_TOGETHER for member in party):
+                    party.append(teammate)
+                    rest.remove(teammate)
+                    grew = True
+        return party[1:], games
+
+# Shared by every analysis in the process; RiotAnalyzer attaches its match store
+teammate_index = TeammateIndex()
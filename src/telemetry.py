@@ -0,0 +1,203 @@
+import json
+import time
+import logging
+import threading
+import contextlib
+from collections import defaultdict
+from rate_limiter import routing_key
+from cache import cache_stats, inflight
+from concurrency import concurrency
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; slower requests land in the last one
+LATENCY_BUCKETS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class EndpointStats:
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.statuses = defaultdict(int)
+        self.retries = 0
+        self.rate_limited = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.limiter_wait = 0.0
+        self.backoff = 0.0
+
+    def add(self, seconds, status):
+        ms = seconds * 1000
+        index = 0
+        while index < len(LATENCY_BUCKETS) and ms > LATENCY_BUCKETS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.statuses[status] += 1
+
+    def percentile(self, fraction):
+        # Upper bound of the bucket holding the given fraction of the requests
+        if not self.count:
+            return None
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS + (None,), self.buckets):
+            seen += count
+            if seen >= fraction * self.count:
+                return bound if bound is not None else round(self.max * 1000)
+        return None
+
+    def summary(self):
+        histogram = {f"<={bound}ms": count for bound, count in zip(LATENCY_BUCKETS, self.buckets)}
+        histogram[f">{LATENCY_BUCKETS[-1]}ms"] = self.buckets[-1]
+        return {
+            "requests": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 1) if self.count else None,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "max_ms": round(self.max * 1000, 1),
+            "histogram": histogram,
+            "statuses": {str(status): count for status, count in sorted(self.statuses.items(), key=lambda s: str(s[0]))},
+            "retries": self.retries,
+            "429": self.rate_limited,
+            "5xx": sum(count for status, count in self.statuses.items() if isinstance(status, int) and status >= 500),
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+            "limiter_wait_s": round(self.limiter_wait, 3),
+            "backoff_s": round(self.backoff, 3),
+        }
+
+class Telemetry:
+    # Collects request latencies per endpoint (as named by the rate limiter), retries,
+    # time spent sleeping and per-stage wall/CPU time for one run
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = defaultdict(EndpointStats)
+            self.stages = {}
+            # Strong references, so per-analyzer caches still show up once the analyzer is gone
+            self.caches = []
+            self.started = time.perf_counter()
+
+    def watch_cache(self, cache):
+        with self.lock:
+            self.caches.append(cache)
+
+    def _endpoint(self, url):
+        return self.endpoints[routing_key(url)[1]]
+
+    def record_request(self, url, seconds, status):
+        with self.lock:
+            self._endpoint(url).add(seconds, status)
+
+    def record_retry(self, url, reason):
+        # reason is "429", "timeout" or "error"
+        with self.lock:
+            stats = self._endpoint(url)
+            stats.retries += 1
+            if reason == "429":
+                stats.rate_limited += 1
+            elif reason == "timeout":
+                stats.timeouts += 1
+            else:
+                stats.errors += 1
+
+    def record_sleep(self, url, seconds, kind):
+        # kind is "limiter" (waiting for a rate limit slot) or "backoff" (after an exception)
+        if seconds <= 0:
+            return
+        with self.lock:
+            stats = self._endpoint(url)
+            if kind == "limiter":
+                stats.limiter_wait += seconds
+            else:
+                stats.backoff += seconds
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            with self.lock:
+                stage = self.stages.setdefault(name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0})
+                stage["calls"] += 1
+                stage["wall_s"] += wall
+                stage["cpu_s"] += cpu
+
+    def summary(self, match_store=None):
+        with self.lock:
+            endpoints = {name: stats.summary() for name, stats in sorted(self.endpoints.items())}
+            stages = {name: {"calls": s["calls"], "wall_s": round(s["wall_s"], 3), "cpu_s": round(s["cpu_s"], 3)}
+                      for name, s in self.stages.items()}
+            elapsed = time.perf_counter() - self.started
+        caches = {stats["name"]: {"hits": stats["hits"], "misses": stats["misses"],
+                                  "hit_ratio": round(stats["hit_ratio"], 3), "entries": stats["entries"]}
+                  for stats in cache_stats()}
+        if match_store is not None:
+            store = match_store.stats()
+            lookups = store["hits"] + store["misses"]
+            caches["match_store"] = {"hits": store["hits"], "misses": store["misses"],
+                                     "hit_ratio": round(store["hits"] / lookups, 3) if lookups else 0.0,
+                                     "entries": store["matches"]}
+        return {
+            "elapsed_s": round(elapsed, 3),
+            "requests": sum(e["requests"] for e in endpoints.values()),
+            "limiter_wait_s": round(sum(e["limiter_wait_s"] for e in endpoints.values()), 3),
+            "backoff_s": round(sum(e["backoff_s"] for e in endpoints.values()), 3),
+            "endpoints": endpoints,
+            "stages": stages,
+            "caches": caches,
+            "concurrency": concurrency.summary(),
+            "coalesced": inflight.stats(),
+        }
+
+    def format_summary(self, summary):
+        lines = [f"Run time: {summary['elapsed_s']:.1f}s, {summary['requests']} requests, "
+                 f"{summary['limiter_wait_s']:.1f}s waiting for the rate limiter and "
+                 f"{summary['backoff_s']:.1f}s backing off after errors (summed over all workers)"]
+        lines.append("Endpoints:")
+        for name, e in summary["endpoints"].items():
+            lines.append(f"  {name}: {e['requests']} requests, mean {e['mean_ms']} ms, p50 <= {e['p50_ms']} ms, "
+                         f"p95 <= {e['p95_ms']} ms, max {e['max_ms']} ms, {e['429']}x 429, "
+                         f"{e['5xx']}x 5xx, {e['timeouts']} timeouts, {e['errors']} errors, wait {e['limiter_wait_s']:.1f}s")
+        lines.append("Stages:")
+        for name, s in summary["stages"].items():
+            lines.append(f"  {name}: wall {s['wall_s']:.2f}s, CPU {s['cpu_s']:.2f}s")
+        lines.append("Concurrency:")
+        for region, c in summary["concurrency"]["regions"].items():
+            if c["adaptive"]:
+                lines.append(f"  {region}: {c['level']} requests in flight at the end, {c['mean_level']} on average, "
+                             f"peak {c['peak_level']} (range {c['minimum']}-{c['maximum']}, {c['increases']} increases, "
+                             f"{c['decreases']} decreases)")
+            else:
+                lines.append(f"  {region}: fixed at {c['level']} requests in flight")
+        coalesced = summary["coalesced"]
+        if coalesced["coalesced"]:
+            lines.append(f"Coalesced: {coalesced['coalesced']} fetches waited for an identical one already in flight "
+                         f"({coalesced['fetches']} sent)")
+        lines.append("Caches:")
+        for name, c in summary["caches"].items():
+            lines.append(f"  {name}: {c['hits']} hits, {c['misses']} misses ({c['hit_ratio']:.0%})")
+        return "\n".join(lines)
+
+    def write_json(self, path, summary):
+        try:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+            logger.info(f"Telemetry saved to {path}")
+            return True
+        except Exception as e:
+            logger.exception(f"Error saving telemetry to {path}")
+            return False
+
+# Shared by every thread in the process
+telemetry = Telemetry()
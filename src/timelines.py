@@ -0,0 +1,107 @@
+import codecs
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Minutes at which the player is compared with the lane opponent
+TIMELINE_MINUTES = (10, 15)
+# Read from each participant frame: gold, CS (lane minions + jungle monsters) and XP
+FRAME_VALUES = ("gold", "cs", "xp")
+# Bytes of a timeline read from the connection at a time
+TIMELINE_CHUNK_SIZE = 64 * 1024
+
+def iter_frames(raw):
+    # A match timeline is 0.5-1 MB of JSON, almost all of it in info.frames (one frame per
+    # minute, each with every event of that minute). raw is the body or an iterable of its
+    # chunks (response.iter_content); the chunks are decoded as they arrive and the frames
+    # parsed one at a time, so only the current chunk and frame are held, and a caller that
+    # stops after the minutes it needs never reads the rest of the document.
+    chunks = iter([raw] if isinstance(raw, (bytes, str)) else raw)
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+
+    def read():
+        chunk = next(chunks, None)
+        if chunk is None:
+            return None
+        return chunk if isinstance(chunk, str) else utf8.decode(chunk)
+
+    text = ""
+    while True:
+        start = text.find('"frames"')
+        if start >= 0 and text.find("[", start) >= 0:
+            text = text[text.index("[", start) + 1:]
+            break
+        if start < 0:
+            text = text[-len('"frames"'):]
+        chunk = read()
+        if chunk is None:
+            return
+        text += chunk
+    decoder = json.JSONDecoder()
+    position = 0
+    while True:
+        while position < len(text) and text[position] in " \t\r\n,":
+            position += 1
+        if position < len(text) and text[position] == "]":
+            return
+        try:
+            if position == len(text):
+                raise json.JSONDecodeError("Incomplete frame", text, position)
+            frame, position = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            # The frame continues in the next chunk
+            chunk = read()
+            if chunk is None:
+                raise
+            text = text[position:] + chunk
+            position = 0
+            continue
+        yield frame
+
+def extract_frames(raw, minutes=TIMELINE_MINUTES):
+    # {minute: {participant_id: [gold, cs, xp]}} for the minutes the game lasted. Frame n is
+    # taken at minute n (the API's frame interval is one minute).
+    last = max(minutes)
+    frames = {}
+    for index, frame in enumerate(iter_frames(raw)):
+        if index in minutes:
+            frames[str(index)] = {
+                participant_id: [values.get("totalGold", 0),
+                                 values.get("minionsKilled", 0) + values.get("jungleMinionsKilled", 0),
+                                 values.get("xp", 0)]
+                for participant_id, values in frame.get("participantFrames", {}).items()
+            }
+        if index >= last:
+            break
+    return frames
+
+def lane_differences(frames, participant_id, opponent_id):
+    # {minute: [gold, cs, xp] of the player minus those of the lane opponent}
+    differences = {}
+    for minute, participants in frames.items():
+        own = participants.get(str(participant_id))
+        other = participants.get(str(opponent_id))
+        if own is not None and other is not None:
+            differences[minute] = [a - b for a, b in zip(own, other)]
+    return differences
+
+def early_game_stats(ranked_entries, match_classification, frames_by_match):
+    # Average gold/CS/XP difference to the lane opponent at each minute, in solo and in duo
+    # games; games that ended before a minute do not count for it
+    totals = {}
+    for match_id, frames in frames_by_match.items():
+        entry = ranked_entries.get(match_id)
+        if entry is None or not frames or entry.get("opponent_id") is None:
+            continue
+        party = "duo" if match_classification.get(match_id, "").startswith("DuoQ:") else "solo"
+        for minute, differences in lane_differences(frames, entry["participant_id"], entry["opponent_id"]).items():
+            stats = totals.setdefault(party, {}).setdefault(minute, {"games": 0, **dict.fromkeys(FRAME_VALUES, 0)})
+            stats["games"] += 1
+            for name, difference in zip(FRAME_VALUES, differences):
+                stats[name] += difference
+    for minutes in totals.values():
+        for stats in minutes.values():
+            for name in FRAME_VALUES:
+                stats[name] /= stats["games"]
+    return totals
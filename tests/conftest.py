@@ -0,0 +1,20 @@
+import os
+import sys
+import json
+import pytest
+
+# The modules in src/ import each other by their flat names
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from mock_riot_api import MockRiotData, DEFAULT_MOCK_CONFIG, MOCK_PUUID_PREFIX
+from records import extract_record
+
+PUUID = MOCK_PUUID_PREFIX + "tester"
+
+@pytest.fixture
+def match_records():
+    # Records of the synthetic history benchmark.py runs against; the teammate pool is sized so that
+    # some teammates recur and both solo and duo games show up
+    data = MockRiotData(dict(DEFAULT_MOCK_CONFIG, games=80, teammate_pool=2000, challenge_fields=0))
+    match_ids = [match_id for match_id, creation, queue_id in data._history(PUUID)]
+    return [extract_record(json.loads(data.match(match_id)), PUUID, match_id) for match_id in match_ids]
@@ -0,0 +1,58 @@
+import pytest
+import cache
+from cache import BoundedCache
+
+def test_evicts_least_recently_used():
+    lru = BoundedCache("test", max_entries=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+    assert "b" not in lru
+    assert lru.get("a") == 1 and lru.get("c") == 3
+    assert lru.stats()["evictions"] == 1
+
+def test_evicts_by_size():
+    lru = BoundedCache("test", max_entries=10, max_bytes=100)
+    lru.set("a", "x", size=60)
+    lru.set("b", "y", size=30)
+    assert lru.total_bytes == 90
+    lru.set("c", "z", size=50)
+    assert "a" not in lru
+    assert lru.total_bytes == 80
+    lru.set("b", "y", size=10)
+    assert lru.total_bytes == 60
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    lru = BoundedCache("test", max_entries=10, ttl=60)
+    lru.set("a", 1)
+    now[0] += 59
+    assert lru.get("a") == 1
+    now[0] += 2
+    assert "a" not in lru
+    assert lru.get("a", "missing") == "missing"
+    assert len(lru) == 0
+    assert lru.stats()["expirations"] == 1
+
+def test_getitem_and_pop():
+    lru = BoundedCache("test", max_entries=10)
+    lru["a"] = 1
+    assert lru["a"] == 1
+    assert lru.pop("a") == 1
+    with pytest.raises(KeyError):
+        lru["a"]
+
+def test_disabled_caches_store_nothing(monkeypatch):
+    monkeypatch.setitem(cache.cache_settings, "enabled", False)
+    lru = BoundedCache("test")
+    lru.set("a", 1)
+    assert len(lru) == 0
+
+def test_configure_shrinks_existing_caches(monkeypatch):
+    monkeypatch.setitem(cache.cache_settings, "max_entries", 1024)
+    lru = BoundedCache("test")
+    lru.update({i: i for i in range(10)})
+    cache.configure_caches(max_entries=3)
+    assert sorted(lru.data) == [7, 8, 9]
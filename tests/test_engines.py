@@ -0,0 +1,56 @@
+import pytest
+import analyzer
+from teammates import teammate_index
+from rollups import rollup_index
+
+pytest.importorskip("pandas")
+
+@pytest.fixture(autouse=True)
+def engine():
+    yield
+    analyzer.set_stats_engine("python")
+    teammate_index.reset()
+    rollup_index.reset()
+
+def summarize(engine, match_records):
+    analyzer.set_stats_engine(engine)
+    teammate_index.reset()
+    rollup_index.reset()
+    results = analyzer.summarize_matches(match_records)
+    results.pop("match_records")
+    return results
+
+def assert_same(python, columnar, path="results"):
+    # Values have to match in type as well: the report formats ints and floats differently
+    if isinstance(python, dict):
+        assert isinstance(columnar, dict), path
+        assert list(python) == list(columnar), path
+        for key in python:
+            assert_same(python[key], columnar[key], f"{path}/{key}")
+    elif isinstance(python, float):
+        assert isinstance(columnar, float), path
+        assert columnar == pytest.approx(python), path
+    else:
+        assert python == columnar, path
+        assert type(python) is type(columnar), path
+
+def test_engines_agree(match_records):
+    python = summarize("python", match_records)
+    columnar = summarize("columnar", match_records)
+    assert python["duo_queue"] > 0 and python["solo_queue"] > 0
+    assert_same(python, columnar)
+
+def test_engines_agree_on_single_statistics(match_records):
+    analyzer.set_stats_engine("python")
+    champions, lanes = analyzer.analyze_champion_stats(match_records), analyzer.analyze_lane_performance(match_records)
+    analyzer.set_stats_engine("columnar")
+    assert_same(champions, analyzer.analyze_champion_stats(match_records))
+    assert_same(lanes, analyzer.analyze_lane_performance(match_records))
+
+def test_empty_lanes_have_float_win_rate(match_records):
+    for engine in ("python", "columnar"):
+        lanes = summarize(engine, match_records)["lane_stats"]
+        empty = [lane for lane, stats in lanes.items() if stats["games"] == 0]
+        assert empty
+        for lane in empty:
+            assert lanes[lane]["win_rate"] == 0.0 and isinstance(lanes[lane]["win_rate"], float)
@@ -0,0 +1,48 @@
+import os
+import journal
+from journal import FetchJournal
+
+PAGE = {"count": 100, "start": 0}
+
+def test_resume_replays_pages_and_records(tmp_path, match_records):
+    first = FetchJournal.for_players(["b", "a"], str(tmp_path))
+    first.add_page("a", PAGE, ["EUW1_2", "EUW1_1"])
+    first.add_page("a", dict(PAGE, startTime=1), ["EUW1_3"])
+    for record in match_records[:3]:
+        first.add_record("a", record)
+    first.close()
+
+    resumed = FetchJournal.for_players(["a", "b"], str(tmp_path))
+    assert resumed.path == first.path
+    assert resumed.page("a", dict(PAGE)) == ["EUW1_2", "EUW1_1"]
+    assert resumed.page("a", dict(PAGE, startTime=1)) is None
+    assert resumed.page("b", PAGE) is None
+    for record in match_records[:3]:
+        assert resumed.record("a", record.match_id).match_id == record.match_id
+    assert resumed.record("b", match_records[0].match_id) is None
+    assert resumed.resumed_pages == 1 and resumed.resumed_records == 3
+    resumed.finish()
+    assert not os.path.exists(resumed.path)
+
+def test_cut_off_last_line_is_skipped(tmp_path, match_records):
+    first = FetchJournal(str(tmp_path / "run.jsonl"))
+    first.add_record("a", match_records[0])
+    first.add_record("a", match_records[1])
+    first.close()
+    with open(first.path, encoding="utf-8") as f:
+        content = f.read()
+    with open(first.path, "w", encoding="utf-8") as f:
+        f.write(content[:-20])
+    resumed = FetchJournal(first.path)
+    assert list(resumed.records) == [("a", match_records[0].match_id)]
+    resumed.close()
+
+def test_old_pages_are_not_reused(tmp_path, monkeypatch):
+    first = FetchJournal(str(tmp_path / "run.jsonl"))
+    monkeypatch.setattr(journal.time, "time", lambda: 1000.0)
+    first.add_page("a", PAGE, ["EUW1_1"])
+    first.close()
+    monkeypatch.setattr(journal.time, "time", lambda: 1000.0 + journal.PAGE_MAX_AGE + 1)
+    resumed = FetchJournal(first.path)
+    assert resumed.page("a", PAGE) is None
+    resumed.close()
@@ -0,0 +1,103 @@
+import pytest
+import rate_limiter
+from rate_limiter import RateLimiter, RateWindow, parse_limits, routing_key, SAFETY_MARGIN
+
+MATCH_URL = "https://europe.api.riotgames.com/lol/match/v5/matches/EUW1_1"
+IDS_URL = "https://europe.api.riotgames.com/lol/match/v5/matches/by-puuid/abc/ids"
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock)
+    return clock
+
+def test_parse_limits():
+    assert parse_limits("20:1,100:120") == [(20, 1), (100, 120)]
+    assert parse_limits("") == []
+    assert parse_limits("20:1,bad") == [(20, 1)]
+
+def test_routing_key():
+    assert routing_key(MATCH_URL) == ("europe", "match-v5.match")
+    assert routing_key(IDS_URL) == ("europe", "match-v5.ids")
+    assert routing_key("http://127.0.0.1:8000/asia/lol/match/v5/matches/KR_1") == ("asia", "match-v5.match")
+
+def test_window_waits_for_oldest_request():
+    window = RateWindow(2, 10)
+    window.take(0.0)
+    window.take(4.0)
+    assert window.wait_time(5.0) == pytest.approx(5.0 + SAFETY_MARGIN)
+    assert window.wait_time(10.0) == 0.0
+    assert list(window.sent) == [4.0]
+
+def test_acquire_within_app_limits(clock):
+    limiter = RateLimiter("2:1,3:10")
+    assert limiter.try_acquire(MATCH_URL) == (0.0, clock.now)
+    assert limiter.try_acquire(MATCH_URL)[1] is not None
+    wait, sent_at = limiter.try_acquire(MATCH_URL)
+    assert sent_at is None
+    assert wait == pytest.approx(1.0 + SAFETY_MARGIN)
+    clock.now += 1.1
+    assert limiter.try_acquire(MATCH_URL)[1] is not None
+    # The 10 second window is full now
+    clock.now += 1.1
+    wait, sent_at = limiter.try_acquire(MATCH_URL)
+    assert sent_at is None
+    assert wait == pytest.approx(10.0 - 2.2 + SAFETY_MARGIN)
+
+def test_regions_have_separate_buckets(clock):
+    limiter = RateLimiter("1:1")
+    assert limiter.try_acquire(MATCH_URL)[1] is not None
+    assert limiter.try_acquire(MATCH_URL.replace("europe", "asia").replace("EUW1", "KR"))[1] is not None
+    assert limiter.try_acquire(MATCH_URL)[1] is None
+
+def test_headers_set_limits(clock):
+    limiter = RateLimiter("100:1")
+    sent_at = limiter.acquire(IDS_URL)
+    limiter.update(IDS_URL, 200, {"X-App-Rate-Limit": "50:1", "X-Method-Rate-Limit": "1:10",
+                                         "X-Method-Rate-Limit-Count": "1:10"}, sent_at)
+    assert limiter.app_buckets["europe"].limits() == [(50, 1)]
+    assert limiter.method_buckets[("europe", "match-v5.ids")].limits() == [(1, 10)]
+    wait, sent_at = limiter.try_acquire(IDS_URL)
+    assert sent_at is None
+    assert wait == pytest.approx(10.0 + SAFETY_MARGIN)
+    # Other methods only share the app limit
+    assert limiter.try_acquire(MATCH_URL)[1] is not None
+
+def test_header_counts_sync_window(clock):
+    # The server counted requests we did not send (another process using the same key)
+    limiter = RateLimiter("5:10")
+    sent_at = limiter.acquire(MATCH_URL)
+    limiter.update(MATCH_URL, 200, {"X-App-Rate-Limit": "5:10", "X-App-Rate-Limit-Count": "5:10"}, sent_at)
+    assert len(limiter.app_buckets["europe"].windows[10].sent) == 5
+    wait, sent_at = limiter.try_acquire(MATCH_URL)
+    assert sent_at is None
+    assert wait == pytest.approx(10.0 + SAFETY_MARGIN)
+
+def test_header_counts_never_drop_own_requests(clock):
+    limiter = RateLimiter("5:10")
+    sent = [limiter.acquire(MATCH_URL) for _ in range(3)]
+    limiter.update(MATCH_URL, 200, {"X-App-Rate-Limit-Count": "1:10"}, sent[0])
+    assert len(limiter.app_buckets["europe"].windows[10].sent) == 3
+
+def test_429_pauses_bucket(clock):
+    limiter = RateLimiter("100:1")
+    sent_at = limiter.acquire(MATCH_URL)
+    limiter.update(MATCH_URL, 429, {"Retry-After": "3", "X-Rate-Limit-Type": "application"}, sent_at)
+    wait, sent_at = limiter.try_acquire(IDS_URL)
+    assert sent_at is None
+    assert wait == pytest.approx(3.0)
+    clock.now += 3
+    assert limiter.try_acquire(IDS_URL)[1] is not None
+
+def test_cancelled_acquire_raises(clock):
+    limiter = RateLimiter("1:1")
+    limiter.cancel()
+    with pytest.raises(rate_limiter.RequestCancelled):
+        limiter.acquire(MATCH_URL)
@@ -0,0 +1,19 @@
+import json
+from records import MatchRecord, record_to_list, record_from_list
+
+def test_round_trip_through_json(match_records):
+    for record in match_records:
+        restored = record_from_list(json.loads(json.dumps(record_to_list(record))))
+        for name in MatchRecord.__slots__:
+            assert getattr(restored, name) == getattr(record, name), name
+        assert isinstance(restored.team_puuids, tuple)
+        assert isinstance(restored.team_names, tuple)
+        assert restored.is_ranked_solo == record.is_ranked_solo
+
+def test_older_lists_fill_missing_fields(match_records):
+    values = record_to_list(match_records[0])
+    cs_index = MatchRecord.__slots__.index("cs")
+    restored = record_from_list(values[:cs_index])
+    assert restored.match_id == match_records[0].match_id
+    assert restored.cs == 0 and restored.damage == 0 and restored.team_damage == 0
+    assert restored.opponent_id is None
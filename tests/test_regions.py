@@ -0,0 +1,45 @@
+import pytest
+from regions import (resolve_routing, match_region, platform_of_match, account_region, is_routing_value,
+                     PLATFORM_REGIONS, REGIONS, DEFAULT_PLATFORMS)
+
+@pytest.mark.parametrize("value, expected", [
+    ("euw1", ("europe", "euw1")),
+    ("NA1", ("americas", "na1")),
+    ("kr", ("asia", "kr")),
+    ("oc1", ("sea", "oc1")),
+    ("europe", ("europe", "euw1")),
+    ("americas", ("americas", "na1")),
+    ("sea", ("sea", "oc1")),
+    ("", ("europe", "euw1")),
+    ("atlantis", ("europe", "euw1")),
+])
+def test_resolve_routing(value, expected):
+    assert resolve_routing(value) == expected
+
+def test_resolve_routing_with_platform():
+    assert resolve_routing("europe", "eun1") == ("europe", "eun1")
+    # A platform of another cluster is replaced by the default one
+    assert resolve_routing("europe", "na1") == ("europe", "euw1")
+
+def test_every_platform_maps_to_a_region():
+    assert set(PLATFORM_REGIONS.values()) == set(REGIONS)
+    for region, platform in DEFAULT_PLATFORMS.items():
+        assert PLATFORM_REGIONS[platform] == region
+
+def test_match_region():
+    assert platform_of_match("EUW1_123") == "euw1"
+    assert match_region("NA1_123") == "americas"
+    assert match_region("KR_123") == "asia"
+    assert match_region("OC1_123") == "sea"
+    assert platform_of_match("XX_123") is None
+    assert match_region("XX_123", "asia") == "asia"
+    assert match_region("123") == "europe"
+
+def test_account_region():
+    assert account_region("sea") == "asia"
+    assert account_region("americas") == "americas"
+    assert account_region("unknown") == "europe"
+
+def test_is_routing_value():
+    assert is_routing_value("euw1") and is_routing_value("sea")
+    assert not is_routing_value("127.0.0.1")